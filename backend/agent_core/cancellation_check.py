@@ -0,0 +1,282 @@
+"""
+End-to-end check of turn cancellation when the client disconnects.
+
+Serves an entrypoint built like agent_invocation with Starlette/uvicorn, the
+way BedrockAgentCoreApp does. The entrypoint is cancellable_turn plus
+coalesce_events over the graph stream. A stand-in graph replaces LangGraph and
+Bedrock, which are not needed here:
+
+- a model node streams chunks from an executor thread, checking the token per
+  chunk like the chatbot node
+- a tools node calls the real tavily_search, submit_img_job and wait_img_job
+  against a local gateway stand-in
+- the model node then runs again
+
+Threads are started with the caller's context copied, as LangChain's
+run_in_executor does.
+
+The client disconnects either mid-generation or while the image job is being
+polled. The check measures how much work still runs after the disconnect
+(model chunks, gateway requests, time until the worker threads stop), with
+the previous entrypoint (no token) and the current one. It also checks the
+turn metrics.
+
+Usage (from backend/agent_core):
+    python cancellation_check.py
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from contextlib import aclosing, contextmanager
+from contextvars import copy_context
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNK_SECONDS = 0.05
+FIRST_ANSWER_CHUNKS = 30
+SECOND_ANSWER_CHUNKS = 20
+JOB_POLLS = 3  # status requests until the image job succeeds (each held LONG_POLL_SECONDS)
+LONG_POLL_SECONDS = 1
+
+work = {"active": 0, "log": [], "stopped": 0.0}  # log: (kind, monotonic time)
+work_lock = threading.Lock()
+
+
+def record(kind):
+    with work_lock:
+        work["log"].append((kind, time.monotonic()))
+
+
+@contextmanager
+def worker():
+    with work_lock:
+        work["active"] += 1
+    try:
+        yield
+    finally:
+        with work_lock:
+            work["active"] -= 1
+            work["stopped"] = time.monotonic()
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    """Tavily /tavily/search and image /generate-image/jobs stand-in"""
+    polls = {}
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.endswith("/jobs"):
+            record("image_submit")
+            job_id = f"job-{time.monotonic_ns()}"
+            GatewayHandler.polls[job_id] = 0
+            self._json(202, {"job_id": job_id, "status": "queued"})
+        else:
+            record("tavily_search")
+            time.sleep(0.2)
+            self._json(200, {"action": "search", "result": {"success": True, "data": {"results": []}}})
+
+    def do_GET(self):
+        record("image_poll")
+        job_id = self.path.split("?")[0].rsplit("/", 1)[-1]
+        GatewayHandler.polls[job_id] += 1
+        time.sleep(LONG_POLL_SECONDS)  # long poll
+        if GatewayHandler.polls[job_id] >= JOB_POLLS:
+            self._json(200, {"status": "succeeded", "result": {"image_urls": []}})
+        else:
+            self._json(200, {"status": "running", "stage": "generating", "progress": {}})
+
+    def _json(self, status, data):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def model_node(loop, queue, chunks):
+    from tools.cancellation import raise_if_cancelled
+    with worker():
+        for i in range(chunks):
+            time.sleep(CHUNK_SECONDS)  # generation time of a chunk
+            raise_if_cancelled("model")
+            record("model_chunk")
+            loop.call_soon_threadsafe(queue.put_nowait, {"message": f"token {i} "})
+
+
+def tools_node():
+    from tools import gen_img, web_search
+    with worker():
+        web_search.tavily_search("coffee market in the Dominican Republic")
+        job_id = gen_img.submit_img_job("coffee brand packaging")
+        gen_img.wait_img_job(job_id, timeout=30)
+
+
+def in_executor(fn, *args):
+    # As langchain_core.runnables.config.run_in_executor: the thread runs in a copy of the caller's context
+    return asyncio.get_running_loop().run_in_executor(None, partial(copy_context().run, fn, *args))
+
+
+async def model_stream(chunks):
+    queue = asyncio.Queue()
+    future = in_executor(model_node, asyncio.get_running_loop(), queue, chunks)
+    try:
+        for _ in range(chunks):
+            yield await queue.get()
+        await future
+    finally:
+        future.cancel()  # as LangGraph does with the node's future; the thread itself keeps running
+
+
+async def fake_graph():
+    async for event in model_stream(FIRST_ANSWER_CHUNKS):
+        yield event
+    await in_executor(tools_node)
+    async for event in model_stream(SECOND_ANSWER_CHUNKS):
+        yield event
+
+
+async def invocation(payload):
+    from tools.cancellation import cancellable_turn
+    from tools.coalesce import coalesce_events
+
+    if payload.get("before"):
+        # Previous entrypoint: nothing tells the worker threads that the caller went away
+        async for event in coalesce_events(fake_graph()):
+            yield event
+        return
+    with cancellable_turn():
+        async with aclosing(coalesce_events(fake_graph())) as events:
+            async for event in events:
+                yield event
+
+
+def build_app():
+    from starlette.applications import Starlette
+    from starlette.responses import StreamingResponse
+    from starlette.routing import Route
+
+    async def invocations(request):
+        payload = await request.json()
+
+        async def frames():
+            async for event in invocation(payload):
+                yield f"data: {json.dumps(event)}\n\n"
+        return StreamingResponse(frames(), media_type="text/event-stream")
+
+    return Starlette(routes=[Route("/invocations", invocations, methods=["POST"])])
+
+
+def open_turn(port, before=False):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    conn.request("POST", "/invocations", body=json.dumps({"prompt": "hola", "before": before}),
+                 headers={"Content-Type": "application/json"})
+    return conn, conn.getresponse()
+
+
+def run_scenario(port, before, disconnect_after_frames=None, disconnect_after_seconds=None):
+    """Disconnect mid-turn; return the work done after the disconnect"""
+    with work_lock:
+        work["log"].clear()
+    started = time.monotonic()
+    conn, response = open_turn(port, before)
+    frames = 0
+    if disconnect_after_frames:
+        for line in response:
+            frames += line.startswith(b"data: ")
+            if frames >= disconnect_after_frames:
+                break
+    else:
+        time.sleep(max(disconnect_after_seconds - (time.monotonic() - started), 0))
+    conn.sock.shutdown(socket.SHUT_RDWR)
+    conn.close()
+    disconnected = time.monotonic()
+
+    deadline = disconnected + 20
+    time.sleep(0.1)
+    while time.monotonic() < deadline:
+        with work_lock:
+            if work["active"] == 0:
+                break
+        time.sleep(0.02)
+    with work_lock:
+        after = [kind for kind, at in work["log"] if at > disconnected]
+        busy = max(work["stopped"] - disconnected, 0.0)
+    return {"model_chunks": after.count("model_chunk"),
+            "gateway_calls": len(after) - after.count("model_chunk"),
+            "busy": busy}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Turn cancellation check against a local gateway stand-in")
+    parser.parse_args()
+
+    gateway = ThreadingHTTPServer(("127.0.0.1", 0), GatewayHandler)
+    threading.Thread(target=gateway.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{gateway.server_port}"
+    os.environ["TAVILY_GATEWAY_URL"] = base_url
+    os.environ["TAVILY_HEDGE_ENABLED"] = "false"
+    os.environ["IMG_API_URL"] = f"{base_url}/generate-image"
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    import uvicorn
+    from tools import gen_img
+    from tools.cancellation import turn_metrics
+
+    gen_img.JOB_LONG_POLL_SECONDS = LONG_POLL_SECONDS
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(build_app(), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    # A complete turn first: its duration is the baseline for the time saved by cancelled turns
+    conn, response = open_turn(port)
+    response.read()
+    conn.close()
+
+    # Mid-generation: after 3 frames. Mid-tool: while the image job is being polled
+    scenarios = {"model": {"disconnect_after_frames": 3},
+                 "image job": {"disconnect_after_seconds": FIRST_ANSWER_CHUNKS * CHUNK_SECONDS + 1.5}}
+    failures = []
+    print(f"{'disconnect during':<18} {'entrypoint':<10} {'model chunks':>13} {'gateway calls':>14} "
+          f"{'threads busy':>13}   (after the disconnect)")
+    for name, disconnect in scenarios.items():
+        results = {}
+        for before in (True, False):
+            result = results[before] = run_scenario(port, before, **disconnect)
+            print(f"{name:<18} {'before' if before else 'now':<10} {result['model_chunks']:>13} "
+                  f"{result['gateway_calls']:>14} {result['busy']:>12.2f}s")
+        now, before = results[False], results[True]
+        # At most the chunk or the long-poll request that was in flight at the disconnect
+        if not (now["model_chunks"] <= 1 and now["gateway_calls"] <= 1 and now["busy"] < LONG_POLL_SECONDS + 0.5):
+            failures.append(f"{name}: the turn kept working after the disconnect")
+        if not (before["model_chunks"] + before["gateway_calls"] > now["model_chunks"] + now["gateway_calls"]):
+            failures.append(f"{name}: the previous entrypoint did not do more work (check the scenario)")
+
+    metrics = turn_metrics()
+    print("turn_metrics():", json.dumps(metrics, indent=2))
+    if metrics["cancelled"] != len(scenarios) or metrics["completed"] != 1:
+        failures.append(f"expected 1 completed and {len(scenarios)} cancelled turns, got {metrics}")
+    if not metrics["seconds_saved"] > 0:
+        failures.append("no turn time saved was estimated")
+    if not {"model", "image_job_wait"} <= set(metrics["stopped_steps"]):
+        failures.append(f"stopped steps not counted: {metrics['stopped_steps']}")
+
+    server.should_exit = True
+    gateway.shutdown()
+    for failure in failures:
+        print("  FAIL:", failure)
+    print("FAILED" if failures else "PASSED")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,149 @@
+"""
+End-to-end check of the gateway circuit breakers against a flaky local stand-in.
+
+Starts a local server that answers like the Tavily gateway (/tavily/search) and
+the image API (/generate-image/jobs) and can be switched between healthy,
+failing (503) and slow. Drives tavily_search() and submit_img_job() through
+each phase and checks the breaker goes closed -> open -> half-open -> open ->
+half-open -> closed, that open circuits fail fast without reaching the server,
+and that slow calls also open it.
+
+Usage (from backend/agent_core):
+    python circuit_breaker_check.py
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+upstream = {"mode": "up", "delay": 0.0, "requests": 0}
+upstream_lock = threading.Lock()
+
+
+class FlakyGatewayHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        with upstream_lock:
+            upstream["requests"] += 1
+            mode, delay = upstream["mode"], upstream["delay"]
+        time.sleep(delay)
+
+        if mode == "down":
+            status, data = 503, {"message": "Service Unavailable"}
+        elif self.path.endswith("/jobs"):
+            status, data = 202, {"job_id": f"job-{time.monotonic_ns()}", "status": "queued"}
+        else:
+            status, data = 200, {"action": "search", "result": {"success": True, "data": {
+                "query": body.get("query"), "results": [{"url": "https://example.com", "title": "Example"}]}}}
+
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def set_upstream(mode, delay=0.0):
+    with upstream_lock:
+        upstream.update(mode=mode, delay=delay)
+
+
+def upstream_requests():
+    with upstream_lock:
+        return upstream["requests"]
+
+
+class Check:
+    def __init__(self, name, breaker, call):
+        self.name = name
+        self.breaker = breaker
+        self.call = call  # returns True when the call succeeded
+        self.failures = []
+
+    def expect(self, condition, message):
+        print(f"  [{'ok' if condition else 'FAIL'}] {message}")
+        if not condition:
+            self.failures.append(message)
+
+    def run(self, open_seconds):
+        print(f"{self.name}:")
+        set_upstream("up")
+        self.expect(all(self.call() for _ in range(3)), "healthy gateway: calls succeed")
+        self.expect(self.breaker.state == "closed", "breaker stays closed")
+
+        set_upstream("down")
+        for _ in range(self.breaker.min_calls):
+            self.call()
+        self.expect(self.breaker.state == "open", f"opens after {self.breaker.min_calls} failed calls")
+
+        before, started = upstream_requests(), time.monotonic()
+        ok = self.call()
+        elapsed = time.monotonic() - started
+        self.expect(not ok and upstream_requests() == before and elapsed < 0.1,
+                    f"open circuit fails fast without calling the gateway ({elapsed * 1000:.1f}ms)")
+
+        time.sleep(open_seconds)
+        before = upstream_requests()
+        self.call()
+        self.expect(upstream_requests() == before + 1 and self.breaker.state == "open",
+                    "half-open probe reaches the still failing gateway and re-opens the breaker")
+
+        set_upstream("up")
+        time.sleep(open_seconds)
+        self.expect(self.call() and self.breaker.state == "closed", "probe succeeds after recovery: breaker closes")
+        self.expect(all(self.call() for _ in range(3)), "calls succeed again")
+
+        slow_call_seconds, self.breaker.slow_call_seconds = self.breaker.slow_call_seconds, 0.2
+        set_upstream("up", delay=0.3)
+        for _ in range(self.breaker.min_calls):
+            self.call()
+        self.expect(self.breaker.state == "open", "slow (but successful) calls also open the breaker")
+        self.breaker.slow_call_seconds = slow_call_seconds
+        set_upstream("up")
+        time.sleep(open_seconds)
+        self.call()
+        print(f"  metrics: {json.dumps(self.breaker.snapshot())}")
+        return self.failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Circuit breaker check with a flaky local gateway")
+    parser.add_argument("--open-seconds", type=float, default=1.0, help="breaker cool-down before a probe")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyGatewayHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    os.environ["BREAKER_OPEN_SECONDS"] = str(args.open_seconds)
+    os.environ["TAVILY_GATEWAY_URL"] = base_url
+    os.environ["TAVILY_HEDGE_ENABLED"] = "false"
+    os.environ["IMG_API_URL"] = f"{base_url}/generate-image"
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    from tools import gen_img, web_search
+    from tools.circuit_breaker import CircuitOpenError, breaker_metrics, get_breaker
+
+    def search():
+        return web_search.is_good_response(web_search.tavily_search("circuit breaker check"))
+
+    def submit_image():
+        try:
+            return bool(gen_img.submit_img_job("circuit breaker check"))
+        except (RuntimeError, CircuitOpenError):
+            return False
+
+    search()  # creates the search breaker
+    checks = [Check("tavily_search", get_breaker("tavily_search"), search),
+              Check("image_api", gen_img.breaker, submit_image)]
+    failures = [failure for check in checks for failure in check.run(args.open_seconds)]
+    print("breaker_metrics():", json.dumps(breaker_metrics(), indent=2))
+    server.shutdown()
+    print("FAILED" if failures else "PASSED")
+    sys.exit(1 if failures else 0)
@@ -5,7 +5,7 @@ from langgraph.prebuilt import ToolNode, tools_condition, InjectedState
 from langchain_core.tools import tool, InjectedToolCallId
 from langchain_core.runnables import RunnableConfig
 from langchain_core.stores import BaseStore
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage, ToolMessage
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessage, ToolMessage, message_chunk_to_message
 from langgraph.graph.message import add_messages
 from langgraph.types import Command
 from langgraph.constants import END
@@ -14,10 +14,17 @@ from typing import TypedDict, Annotated
 from langchain_aws import ChatBedrock
 from bedrock_agentcore.memory import MemoryClient
 from prompts import deep_market_agent_v1_prompt
-from dynamo_handler import add_message_to_chat
-from tools.gen_img import call_img_gateway
-from tools.web_search import tavily_search, tavily_extract
+from dynamo_handler import add_message_to_chat, get_image_record
+from tools.gen_img import (submit_images_from_prompt, collect_img_job, upgrade_image,
+                           DRAFT_TIER, FINAL_TIER, TIER_IMAGE_COUNTS)
+from tools.web_search import tavily_search, tavily_batch_search, tavily_extract, is_good_response, SEARCH_RESULT_FIELDS
 from tools.gen_pdf import ModelInput, execute_pdf_report_generation_flow
+from tools.circuit_breaker import CircuitOpenError, CIRCUIT_OPEN
+from tools.search_policy import SearchPolicy, record_search_latency
+from tools.passages import select_passages, store_pages, stored_page, read_page_text
+from tools.coalesce import coalesce_events
+from tools.cancellation import cancellable_turn, raise_if_cancelled
+from contextlib import aclosing, closing
 from dotenv import load_dotenv
 import json
 import uuid
@@ -28,6 +35,14 @@ client = MemoryClient(region_name=AWS_REGION_NAME)
 
 session = boto3.Session()
 
+
+def merge_image_jobs(left, right):
+    """Reducer for pending_image_jobs: jobs queued by parallel tool calls add up; None clears them."""
+    if right is None:
+        return []
+    return (left or []) + right
+
+
 class DeepMarketAgentState(TypedDict):
     # Messages have the type "list". The `add_messages` function
     # in the annotation defines how this state key should be updated
@@ -37,6 +52,8 @@ class DeepMarketAgentState(TypedDict):
     pdf_document_id: str
     pdf_presigned_url: str
     images: list
+    # Image jobs queued by generate_images this turn, collected when the answer is done
+    pending_image_jobs: Annotated[list, merge_image_jobs]
 
 
 def create_agent(client,
@@ -47,6 +64,9 @@ def create_agent(client,
                  temperature=0.1, system_message=deep_market_agent_v1_prompt):
     """Create and configure the LangGraph agent"""
     
+    # One agent per invocation: the turn's search budget starts now
+    search_policy = SearchPolicy()
+
     # Initialize your LLM (adjust model and parameters as needed)
     llm = ChatBedrock(
         model_id=model_id,
@@ -58,6 +78,7 @@ def create_agent(client,
 
     def pre_model_hook(state, config: RunnableConfig, *, store: BaseStore = store):
         """Hook that runs pre-LLM invocation to save the latest human message"""
+        raise_if_cancelled("node:pre_model_hook")
         actor_id = config["configurable"]["actor_id"]
         thread_id = config["configurable"]["thread_id"]
 
@@ -114,15 +135,69 @@ def create_agent(client,
         return str(memories)
     
     @tool
-    def generate_images(image_description: str, tool_call_id: Annotated[str, InjectedToolCallId]):
+    def generate_images(image_description: str,
+                        tool_call_id: Annotated[str, InjectedToolCallId],
+                        negative_text: str = "",
+                        tier: str = DRAFT_TIER):
         """Tool used to generate images based on user input about products or services ideas.
-        Always generates 3 variations of the same image description.
+        Write image_description as an image caption (max 1024 characters): subject, environment,
+        composition, materials, lighting, mood and style. Do not use negations in it.
+        Put everything that must not appear (defects, logos, text artifacts, unwanted styles) in negative_text.
+        tier: "draft" (default) quickly renders one small image for exploring ideas;
+        use "final" only when the user explicitly asks for final or high quality images (3 large variations).
+        The images render in the background while you keep working; they are attached to your
+        answer when you finish.
         Use this tool:
-        - If the user explicitly requests an image.""" 
-        result = call_img_gateway(use_case=image_description, user_id=actor_id, chat_id=session_id)  
+        - If the user explicitly requests an image."""
+        if tier not in (DRAFT_TIER, FINAL_TIER):
+            tier = DRAFT_TIER
+        try:
+            job_id = submit_images_from_prompt(prompt=image_description, negative_text=negative_text,
+                                               tier=tier, user_id=actor_id)
+        except CircuitOpenError as e:
+            return e.to_dict()
+        # Record ids assigned now, so the model can refer to the images before they exist
+        image_ids = [str(uuid.uuid4()) for _ in range(TIER_IMAGE_COUNTS[tier])]
+        content = (f"Image generation started ({tier}). image_ids: {image_ids}. "
+                   "The images will be attached to your answer; continue with the rest of it.")
+        if tier == DRAFT_TIER:
+            content += " To render final-quality variations of one, call upgrade_images with its image_id."
+        return Command(update={
+            "messages": [ToolMessage(content=content, tool_call_id=tool_call_id)],
+            "pending_image_jobs": [{"job_id": job_id, "use_case": image_description,
+                                    "tier": tier, "image_ids": image_ids}]
+        })
+
+    def collect_image_job(job):
+        return collect_img_job(job["job_id"], job["use_case"], session_id, user_id=actor_id,
+                               tier=job["tier"], image_ids=job["image_ids"])
+
+    @tool
+    def upgrade_images(image_id: str,
+                       tool_call_id: Annotated[str, InjectedToolCallId],
+                       pending_image_jobs: Annotated[list, InjectedState("pending_image_jobs")]):
+        """Tool used to render final-quality variations (3 large images) of a draft image,
+        keeping the same seed and prompt.
+        Use this tool:
+        - If the user likes a draft image and wants the final or high quality version of it."""
+        pending = next((job for job in pending_image_jobs or [] if image_id in job["image_ids"]), None)
+        if pending:
+            # A draft from this turn: wait for it (storing it again later writes the same records)
+            try:
+                collect_image_job(pending)
+            except CircuitOpenError as e:
+                return e.to_dict()
+        image_record = get_image_record(image_id)
+        if not image_record:
+            return f"Image {image_id} was not found."
+        try:
+            result = upgrade_image(image_record, user_id=actor_id, chat_id=session_id)
+        except CircuitOpenError as e:
+            return e.to_dict()
         images = result.get("images", [])
         return Command(update={
-            "messages": [ToolMessage(content="Images generated successfully.", tool_call_id=tool_call_id)],
+            "messages": [ToolMessage(content=f"Final images generated successfully. image_ids: {[img['image_id'] for img in images]}.",
+                                     tool_call_id=tool_call_id)],
             "images": images
         })
 
@@ -134,17 +209,65 @@ def create_agent(client,
         - If the user asks for information about competitors, market trends, or specific products/services.
         - If the user asks for statistics, facts, or figures that may not be in your training data."""
 
-        search_results = tavily_search(query, include_answer=True, max_results=5)
+        params = search_policy.choose(query)
+        search_results = tavily_search(query, include_answer=True, fields=SEARCH_RESULT_FIELDS, **params)
+        if is_good_response(search_results):
+            record_search_latency(params["search_depth"], search_results.get("result") or {})
+        return search_results
+
+    @tool
+    def research_web_batch(queries: list[str]):
+        """Tool used to run several web searches at once (up to 10), e.g. one per competitor, company or market.
+        Prefer it over calling research_web repeatedly when you already know all the queries.
+        Results come back in the same order as the queries."""
+
+        specs = [{"query": q, "include_answer": True, **search_policy.choose(q)} for q in queries]
+        search_results = tavily_batch_search(specs, fields=SEARCH_RESULT_FIELDS)
+        if is_good_response(search_results):
+            batch = (search_results.get("result") or {}).get("data") or {}
+            for spec, result in zip(specs, batch.get("results", [])):
+                if result.get("success"):
+                    record_search_latency(spec["search_depth"], result)
         return search_results
     
     @tool
-    def extract_urls(urls: list):
+    def extract_urls(urls: list, messages: Annotated[list, InjectedState("messages")]):
         """Tool used to extract and summarize information from a list of URLs.
+        Returns the passages of the pages most relevant to the user's current question, with their URLs;
+        use read_page to read more of a page.
         Use this tool:
         - If the user provides URLs and asks for summaries or insights from them.
         - If the user asks for detailed information about specific websites or articles you found using the research_web tool."""
         extraction_results = tavily_extract(urls)
-        return extraction_results
+        if not is_good_response(extraction_results):
+            return extraction_results
+        data = extraction_results["result"]["data"]
+        pages = [{"url": page.get("url"), "text": page.get("raw_content") or page.get("content") or ""}
+                 for page in data.get("results", [])]
+        store_pages(pages)
+        question = next((msg.content for msg in reversed(messages) if isinstance(msg, HumanMessage)), "")
+        return {
+            "passages": select_passages(pages, question if isinstance(question, str) else str(question)),
+            "pages": [{"url": page["url"], "chars": len(page["text"])} for page in pages],
+            "failed_results": data.get("failed_results", []),
+        }
+
+    @tool
+    def read_page(url: str, query: str = "", offset: int = 0):
+        """Tool used to read more of a page returned by extract_urls.
+        With a query, returns the page's passages most relevant to it;
+        without one, returns its full text in chunks starting at offset (pass next_offset to continue)."""
+        text = stored_page(url)
+        if text is None:
+            extraction_results = tavily_extract([url])
+            if not is_good_response(extraction_results):
+                return extraction_results
+            results = extraction_results["result"]["data"].get("results", [])
+            if not results:
+                return f"Could not extract {url}."
+            text = results[0].get("raw_content") or results[0].get("content") or ""
+            store_pages([{"url": url, "text": text}])
+        return read_page_text(text, url, query=query, offset=offset)
     
     @tool
     def generate_pdf_report(query: str, messages: Annotated[list, InjectedState("messages")], tool_call_id: Annotated[str, InjectedToolCallId]):
@@ -162,6 +285,8 @@ def create_agent(client,
                                            images_query_model=ModelInput(model_id="us.anthropic.claude-3-7-sonnet-20250219-v1:0", temperature=0.3),
                                            report_def_model=ModelInput(model_id="us.anthropic.claude-3-7-sonnet-20250219-v1:0", temperature=0.3))
         
+        if output.get("error") == CIRCUIT_OPEN:
+            return output
         if output:
             return Command(update={
                 "messages": [ToolMessage(content="PDF report generated successfully.", tool_call_id=tool_call_id)],
@@ -171,11 +296,28 @@ def create_agent(client,
         else:
             return {"error": "There was an error generating the PDF report."}
 
+    def collect_image_jobs(state: DeepMarketAgentState):
+        """Wait for the image jobs queued this turn and attach their images to the answer"""
+        jobs = state.get("pending_image_jobs") or []
+        if not jobs:
+            return {}
+        images = list(state.get("images") or [])
+        for job in jobs:
+            try:
+                images += collect_image_job(job).get("images", [])
+            except RuntimeError as e:
+                # The answer is already written: report the failed job and keep the other images
+                print(f"Image job {job['job_id']} failed: {e}")
+        return {"images": images, "pending_image_jobs": None}
+
     # Bind tools to the LLM
     tools = [search_chat_history,
              generate_images,
+             upgrade_images,
              research_web,
+             research_web_batch,
              extract_urls,
+             read_page,
              generate_pdf_report,
              ]
     llm_with_tools = llm.bind_tools(tools)
@@ -185,6 +327,8 @@ def create_agent(client,
     
     # Define the chatbot node
     def chatbot(state: DeepMarketAgentState):
+        # Runs again after every tool call: a cancelled turn stops here instead of calling the model
+        raise_if_cancelled("node:chatbot")
         raw_messages = state["messages"]
 
         non_system_messages = [msg for msg in raw_messages if not isinstance(msg, SystemMessage)]
@@ -192,10 +336,14 @@ def create_agent(client,
         # Always ensure SystemMessage is first
         messages = [SystemMessage(content=system_message)] + non_system_messages[-6:]  # Limit to last 6 messages for context
 
-        # Get response from model with tools bound
-        response = llm_with_tools.invoke(messages
-                                         #config={"configurable": {"actor_id": actor_id, "thread_id": session_id}}
-                                         )
+        # Get response from model with tools bound. Streamed (as astream_events does anyway)
+        # so that a cancelled turn stops the generation between chunks
+        response = None
+        with closing(llm_with_tools.stream(messages)) as chunks:
+            for chunk in chunks:
+                raise_if_cancelled("model")
+                response = chunk if response is None else response + chunk
+        response = message_chunk_to_message(response)
     
         # Append response to full message history
         return {"messages": raw_messages + [response]}
@@ -206,6 +354,7 @@ def create_agent(client,
     # Add nodes
     graph_builder.add_node("pre_model_hook", pre_model_hook)
     graph_builder.add_node("chatbot", chatbot)
+    graph_builder.add_node("collect_image_jobs", collect_image_jobs)
     graph_builder.add_node("post_model_hook", post_model_hook)
     graph_builder.add_node("tools", ToolNode(tools))
     
@@ -213,9 +362,10 @@ def create_agent(client,
     graph_builder.add_conditional_edges(
         "chatbot",
         tools_condition,
-        {"__end__": "post_model_hook",
+        {"__end__": "collect_image_jobs",
          "tools": "tools"}
     )
+    graph_builder.add_edge("collect_image_jobs", "post_model_hook")
     graph_builder.add_edge("pre_model_hook", "chatbot")
     graph_builder.add_edge("post_model_hook", END)
     graph_builder.add_edge("tools", "chatbot")
@@ -256,7 +406,8 @@ async def stream_invoke_langgraph_agent(payload, agent):
                                              "user_id": actor_id,
                                              "pdf_document_id": None,
                                              "pdf_presigned_url": None,
-                                             "images": []},
+                                             "images": [],
+                                             "pending_image_jobs": None},
                                             config={"recursion_limit": 50,
                                                     "configurable": {"actor_id": actor_id, "thread_id": session_id}}):
         if event["event"] == "on_chat_model_stream" and event["metadata"].get("langgraph_node", '') in nodes_to_stream:
@@ -290,10 +441,15 @@ app = BedrockAgentCoreApp()
 async def agent_invocation(payload):
     """Handler for agent invocation"""
     payload = json.loads(payload) if isinstance(payload, str) else payload
-    agent = create_agent(client, memory_id=payload.get("memory_id"), actor_id=payload.get("user_id"), session_id=payload.get("session_id"))
-    async for event in stream_invoke_langgraph_agent(payload=payload, agent=agent):
-        #print("Yielding event: ", event, "of type ", type(event))
-        yield event
+    # If the caller stops reading (client disconnected), the turn is cancelled: the graph
+    # stops and the node or tool running in a worker thread stops at its next check
+    with cancellable_turn():
+        agent = create_agent(client, memory_id=payload.get("memory_id"), actor_id=payload.get("user_id"), session_id=payload.get("session_id"))
+        # Token deltas are merged into larger events (by size and time) before they become SSE frames
+        async with aclosing(coalesce_events(stream_invoke_langgraph_agent(payload=payload, agent=agent))) as events:
+            async for event in events:
+                #print("Yielding event: ", event, "of type ", type(event))
+                yield event
 
 if __name__ == "__main__":
     app.run()
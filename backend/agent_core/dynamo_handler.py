@@ -1,16 +1,73 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from functools import lru_cache
 import datetime
+import random
+import time
 import uuid
 import boto3
+from boto3.dynamodb.types import TypeSerializer
 from botocore.exceptions import ClientError
 
 dynamodb = boto3.resource("dynamodb")
 client = boto3.client("dynamodb")
+serializer = TypeSerializer()
 
 MESSAGES_TABLE_NAME = "deep-market-analyzer-messages"
 IMAGES_TABLE_NAME = "deep-market-analyzer-images"
 DOCUMENTS_TABLE_NAME = "deep-market-analyzer-documents"
 
+# BatchWriteItem accepts at most 25 put/delete requests per call
+BATCH_WRITE_MAX_ITEMS = 25
+BATCH_WRITE_MAX_RETRIES = 5
+BATCH_WRITE_BACKOFF = 0.05  # seconds, doubled (with jitter) on each unprocessed-items retry
+
+
+@lru_cache(maxsize=None)
+def get_table(table_name: str):
+    """
+    DynamoDB Table resource, created once per table and reused across calls.
+    """
+    return dynamodb.Table(table_name)
+
+
+def batch_write_items(table_name: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Put many items into a table with BatchWriteItem (chunks of 25).
+    Items DynamoDB leaves unprocessed (throttling) are retried with exponential
+    backoff; a RuntimeError is raised if some are still unprocessed after
+    BATCH_WRITE_MAX_RETRIES. Returns the items as given.
+    """
+    for start in range(0, len(items), BATCH_WRITE_MAX_ITEMS):
+        chunk = items[start:start + BATCH_WRITE_MAX_ITEMS]
+        request_items = {
+            table_name: [
+                {"PutRequest": {"Item": {k: serializer.serialize(v) for k, v in item.items()}}}
+                for item in chunk
+            ]
+        }
+        for attempt in range(BATCH_WRITE_MAX_RETRIES + 1):
+            resp = client.batch_write_item(RequestItems=request_items)
+            request_items = resp.get("UnprocessedItems") or {}
+            if not request_items:
+                break
+            if attempt == BATCH_WRITE_MAX_RETRIES:
+                unprocessed = sum(len(reqs) for reqs in request_items.values())
+                raise RuntimeError(f"{unprocessed} items could not be written to {table_name}")
+            time.sleep(BATCH_WRITE_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+    return items
+
+
+def _new_record_item(record: Dict[str, Any], id_field: str) -> Dict[str, Any]:
+    """
+    Copy a record (without mutating it), generating a uuid `id_field` if missing
+    and adding created_at (UTC ISO).
+    """
+    item = record.copy()
+    if id_field not in item:
+        item[id_field] = str(uuid.uuid4())
+    created_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    return {"created_at": created_at, **item}
+
 
 def add_message_to_chat(chat_id: str, message: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -20,7 +77,7 @@ def add_message_to_chat(chat_id: str, message: Dict[str, Any]) -> Dict[str, Any]
     - Stores chat_id on the message for easy queries
     Returns the saved message dict (including message_id and created_at).
     """
-    table = dynamodb.Table(MESSAGES_TABLE_NAME)
+    table = get_table(MESSAGES_TABLE_NAME)
 
     # copy input (do not mutate caller dict)
     msg = message.copy()
@@ -52,21 +109,8 @@ def add_image_record(image_record: Dict[str, Any]) -> Dict[str, Any]:
     - Adds created_at (UTC ISO)
     Returns the saved image record dict (including image_id and created_at).
     """
-    table = dynamodb.Table(IMAGES_TABLE_NAME)
-
-    # copy input (do not mutate caller dict)
-    img = image_record.copy()
-
-    # generate id and timestamp
-    if "image_id" not in img:
-        img["image_id"] = str(uuid.uuid4())
-    created_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
-
-    # enrich the item
-    item = {
-        "created_at": created_at,
-        **img,
-    }
+    table = get_table(IMAGES_TABLE_NAME)
+    item = _new_record_item(image_record, "image_id")
 
     try:
         table.put_item(Item=item)
@@ -76,6 +120,23 @@ def add_image_record(image_record: Dict[str, Any]) -> Dict[str, Any]:
 
     return item
 
+def add_image_records(image_records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Store several image records in the IMAGES table with batched writes.
+    Same enrichment as add_image_record; returns the saved items.
+    """
+    items = [_new_record_item(record, "image_id") for record in image_records]
+    return batch_write_items(IMAGES_TABLE_NAME, items)
+
+def get_image_record(image_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch an image record from the IMAGES table by image_id.
+    Returns None if it does not exist.
+    """
+    table = get_table(IMAGES_TABLE_NAME)
+    resp = table.get_item(Key={"image_id": image_id})
+    return resp.get("Item")
+
 def add_document_record(document_record: Dict[str, Any]) -> Dict[str, Any]:
     """
     Store a document record as its own item in the DOCUMENTS table.
@@ -83,21 +144,8 @@ def add_document_record(document_record: Dict[str, Any]) -> Dict[str, Any]:
     - Adds created_at (UTC ISO)
     Returns the saved document record dict (including document_id and created_at).
     """
-    table = dynamodb.Table(DOCUMENTS_TABLE_NAME)
-
-    # copy input (do not mutate caller dict)
-    doc = document_record.copy()
-
-    # generate id and timestamp
-    if "document_id" not in doc:
-        doc["document_id"] = str(uuid.uuid4())
-    created_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
-
-    # enrich the item
-    item = {
-        "created_at": created_at,
-        **doc,
-    }
+    table = get_table(DOCUMENTS_TABLE_NAME)
+    item = _new_record_item(document_record, "document_id")
 
     try:
         table.put_item(Item=item)
@@ -0,0 +1,192 @@
+"""
+Cooperative cancellation of an agent turn.
+
+When the caller stops reading the stream (the API closed its connection), the
+runtime cancels agent_invocation and, with it, the graph's astream_events. That
+stops the graph from scheduling more nodes, but the node or tool running at
+that moment keeps going: LangGraph runs sync nodes and tools in executor
+threads, which asyncio cannot interrupt. The model would keep generating and
+the Tavily, image and PDF calls would run to completion for nobody.
+
+Each turn gets a CancelToken. The entrypoint cancels it when the consumer goes
+away, and nodes and tools check it at their step boundaries (between model
+chunks, before each gateway call, while polling image jobs) and stop with
+TurnCancelled. The token lives in a ContextVar, which LangChain copies into its
+executor threads, so helpers deep in the tools can check it without it being
+passed around.
+
+Cancelled turns, the steps they cut short and an estimate of the turn time they
+saved are counted per process. They are logged for every cancelled turn and
+exported as OpenTelemetry counters when the runtime is instrumented
+(opentelemetry-instrument).
+"""
+import asyncio
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    from opentelemetry import metrics
+except ImportError:  # running without the OpenTelemetry distro (local scripts)
+    metrics = None
+
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+DURATION_ALPHA = 0.2  # weight of the newest completed turn in the moving average
+
+
+class TurnCancelled(Exception):
+    """
+    Raised by a cancellation point once the turn was cancelled. Code that catches
+    Exception around a whole flow should re-raise it instead of reporting an error.
+    """
+
+
+class CancelToken:
+    """
+    Cancellation flag shared by the entrypoint (asyncio) and the turn's worker threads.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.reason: Optional[str] = None
+        self.cancelled_at: Optional[float] = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str) -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+
+    def raise_if_cancelled(self, step: str) -> None:
+        if self._event.is_set():
+            # Usually after the entrypoint has finished: the worker threads get here later
+            _record_stopped_step(step, self)
+            raise TurnCancelled(f"Turn cancelled ({self.reason}) before {step}")
+
+    def sleep(self, seconds: float, step: str) -> None:
+        """
+        time.sleep that returns early (raising TurnCancelled) if the turn is cancelled.
+        """
+        if self._event.wait(max(seconds, 0)):
+            self.raise_if_cancelled(step)
+
+
+_current: ContextVar[Optional[CancelToken]] = ContextVar("agent_turn_cancel_token", default=None)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current.get()
+
+
+def raise_if_cancelled(step: str) -> None:
+    """
+    Cancellation point: raise TurnCancelled if the current turn was cancelled.
+    A no-op outside a turn (local scripts, direct tool calls).
+    """
+    token = _current.get()
+    if token is not None:
+        token.raise_if_cancelled(step)
+
+
+def cancellable_sleep(seconds: float, step: str) -> None:
+    token = _current.get()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.sleep(seconds, step)
+
+
+@contextmanager
+def cancellable_turn() -> Iterator[CancelToken]:
+    """
+    Run one agent turn with a CancelToken bound to the current context.
+    Use it inside the entrypoint, before starting the graph: tasks and executor
+    threads started from here on see the token. If the caller goes away
+    (CancelledError or GeneratorExit), the token is cancelled so the turn's
+    threads stop at their next cancellation point.
+    """
+    token = CancelToken()
+    _current.set(token)
+    with _stats_lock:
+        _stats["started"] += 1
+    outcome = FAILED
+    try:
+        yield token
+        outcome = COMPLETED
+    except (asyncio.CancelledError, GeneratorExit):
+        token.cancel("the caller stopped reading the stream")
+        raise
+    except TurnCancelled:
+        token.cancel("the turn was cancelled")
+    finally:
+        if token.cancelled:
+            outcome = CANCELLED
+        _finish_turn(token, outcome)
+
+
+# Per-process counters
+_stats: Dict[str, Any] = {"started": 0, COMPLETED: 0, CANCELLED: 0, FAILED: 0,
+                          "seconds_saved": 0.0, "stopped_steps": Counter()}
+_stats_lock = threading.Lock()
+_completed_seconds: Optional[float] = None  # moving average of completed turn durations
+
+
+def _finish_turn(token: CancelToken, outcome: str) -> None:
+    global _completed_seconds
+    elapsed = time.monotonic() - token.started
+    with _stats_lock:
+        _stats[outcome] += 1
+        if outcome == COMPLETED:
+            _completed_seconds = elapsed if _completed_seconds is None else (
+                DURATION_ALPHA * elapsed + (1 - DURATION_ALPHA) * _completed_seconds)
+            return
+        if outcome != CANCELLED:
+            return
+        # Estimate: a cancelled turn would have run as long as an average completed one
+        saved = max((_completed_seconds or 0.0) - elapsed, 0.0)
+        _stats["seconds_saved"] += saved
+    print(f"[cancellation] turn cancelled after {elapsed:.1f}s ({token.reason}); "
+          f"~{saved:.0f}s of turn time saved (estimate)")
+
+
+def _record_stopped_step(step: str, token: CancelToken) -> None:
+    with _stats_lock:
+        _stats["stopped_steps"][step] += 1
+    print(f"[cancellation] stopped {step} {time.monotonic() - token.cancelled_at:.2f}s after the turn was cancelled")
+
+
+def turn_metrics() -> Dict[str, Any]:
+    """
+    Snapshot of the turn counters of this process.
+    """
+    with _stats_lock:
+        snapshot = dict(_stats)
+        snapshot["stopped_steps"] = dict(_stats["stopped_steps"])
+        snapshot["average_completed_seconds"] = _completed_seconds
+    return snapshot
+
+
+if metrics is not None:
+    _meter = metrics.get_meter("deep_market_agent.cancellation")
+    _meter.create_observable_counter(
+        "agent_turns", description="Turns by outcome (completed, cancelled, failed)",
+        callbacks=[lambda options: [metrics.Observation(turn_metrics()[outcome], {"outcome": outcome})
+                                    for outcome in (COMPLETED, CANCELLED, FAILED)]])
+    _meter.create_observable_counter(
+        "agent_turns.cancelled_steps", description="Model generations and tool calls stopped by a cancellation",
+        callbacks=[lambda options: [metrics.Observation(count, {"step": step})
+                                    for step, count in turn_metrics()["stopped_steps"].items()]])
+    _meter.create_observable_counter(
+        "agent_turns.seconds_saved", unit="s",
+        description="Estimated turn time not spent on cancelled turns",
+        callbacks=[lambda options: [metrics.Observation(turn_metrics()["seconds_saved"])]])
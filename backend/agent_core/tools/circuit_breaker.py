@@ -0,0 +1,232 @@
+"""
+Per-endpoint circuit breakers for the API Gateways the agent calls (image
+generation, PDF generation, Tavily).
+
+When a gateway is degraded every call would otherwise wait its full timeout
+(90-120s) before failing. A breaker tracks the outcome of recent calls in a
+rolling time window; once enough of them fail (errors, 5xx or calls slower than
+`slow_call_seconds`) it opens and calls fail immediately with CircuitOpenError.
+After `open_seconds` it lets a single probe call through (half-open): success
+closes it again, failure re-opens it.
+
+State lives in this process only. It is logged on every transition and exported
+as OpenTelemetry gauges when the runtime is instrumented (opentelemetry-instrument).
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from opentelemetry import metrics
+except ImportError:  # running without the OpenTelemetry distro (local scripts)
+    metrics = None
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+CIRCUIT_OPEN = "circuit_open"  # error code returned to the model
+
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "4"))  # before the failure rate is trusted
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_CALLS = 1  # concurrent probe calls while half-open
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling an endpoint whose breaker is open.
+    """
+
+    def __init__(self, endpoint: str, retry_after: float):
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        super().__init__(f"Circuit open for {endpoint}: retry after {retry_after:.0f}s")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Structured error for tool results, so the model can decide what to do next.
+        """
+        return {
+            "ok": False,
+            "error": CIRCUIT_OPEN,
+            "endpoint": self.endpoint,
+            "retry_after_seconds": math.ceil(self.retry_after),
+            "message": (f"The {self.endpoint} service is temporarily unavailable and was not called. "
+                        "Do not retry it in this turn: continue with the information you have "
+                        "and tell the user this part can be retried later."),
+        }
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker over a rolling window of call outcomes.
+    """
+
+    def __init__(self,
+                 endpoint: str,
+                 slow_call_seconds: Optional[float] = None,
+                 window_seconds: float = BREAKER_WINDOW_SECONDS,
+                 min_calls: int = BREAKER_MIN_CALLS,
+                 failure_rate: float = BREAKER_FAILURE_RATE,
+                 open_seconds: float = BREAKER_OPEN_SECONDS,
+                 half_open_calls: int = BREAKER_HALF_OPEN_CALLS):
+        self.endpoint = endpoint
+        self.slow_call_seconds = slow_call_seconds
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.window = deque()  # (finished_at, failed, duration)
+        self.totals = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+        self.lock = threading.Lock()
+
+    def _retry_after(self, now: float) -> float:
+        return max(self.opened_at + self.open_seconds - now, 1.0)
+
+    def _transition(self, state: str, now: float) -> None:
+        previous, self.state = self.state, state
+        if state == OPEN:
+            self.opened_at = now
+            self.totals["opened"] += 1
+        if state == CLOSED:
+            self.window.clear()
+        print(f"[circuit] endpoint={self.endpoint} {previous} -> {state}")
+
+    def _trim(self, now: float) -> None:
+        while self.window and now - self.window[0][0] > self.window_seconds:
+            self.window.popleft()
+
+    def _acquire(self) -> bool:
+        """
+        Admit a call or raise CircuitOpenError. Returns True for half-open probes.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN, now)
+            if self.state == CLOSED:
+                return False
+            if self.state == HALF_OPEN and self.probes_in_flight < self.half_open_calls:
+                self.probes_in_flight += 1
+                return True
+            self.totals["rejected"] += 1
+            raise CircuitOpenError(self.endpoint, self._retry_after(now))
+
+    def _record(self, failed: bool, duration: float, probe: bool, slow_call_seconds: Optional[float]) -> None:
+        slow = slow_call_seconds is not None and duration >= slow_call_seconds
+        failed = failed or slow
+        with self.lock:
+            now = time.monotonic()
+            self.totals["calls"] += 1
+            self.totals["failures"] += failed
+            self.totals["slow_calls"] += slow
+            if probe:
+                self.probes_in_flight -= 1
+                self._transition(OPEN if failed else CLOSED, now)
+                return
+            if self.state != CLOSED:
+                return  # started before the breaker opened
+            self.window.append((now, failed, duration))
+            self._trim(now)
+            failures = sum(1 for _, f, _ in self.window if f)
+            if len(self.window) >= self.min_calls and failures / len(self.window) >= self.failure_rate:
+                self._transition(OPEN, now)
+
+    def call(self,
+             fn: Callable[[], Any],
+             is_failure: Optional[Callable[[Any], bool]] = None,
+             slow_call_seconds: Optional[float] = None) -> Any:
+        """
+        Run fn() through the breaker. Exceptions, results for which is_failure()
+        is true and calls slower than slow_call_seconds (default: the breaker's)
+        count as failures; exceptions are re-raised and results returned as is.
+        """
+        probe = self._acquire()
+        if slow_call_seconds is None:
+            slow_call_seconds = self.slow_call_seconds
+        started = time.monotonic()
+        try:
+            result = fn()
+        except BaseException:
+            self._record(True, time.monotonic() - started, probe, slow_call_seconds)
+            raise
+        failed = bool(is_failure and is_failure(result))
+        self._record(failed, time.monotonic() - started, probe, slow_call_seconds)
+        return result
+
+    def raise_if_open(self) -> None:
+        """
+        Fail fast before starting expensive work that ends in a call to this endpoint.
+        Does not take a half-open probe slot.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at < self.open_seconds:
+                self.totals["rejected"] += 1
+                raise CircuitOpenError(self.endpoint, self._retry_after(now))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            now = time.monotonic()
+            self._trim(now)
+            failures = sum(1 for _, f, _ in self.window if f)
+            durations = sorted(d for _, _, d in self.window)
+            return {
+                "endpoint": self.endpoint,
+                "state": self.state,
+                "window_calls": len(self.window),
+                "window_failure_rate": round(failures / len(self.window), 3) if self.window else 0.0,
+                "window_p90_seconds": round(durations[int(len(durations) * 0.9)], 3) if durations else None,
+                "retry_after_seconds": round(self._retry_after(now), 1) if self.state == OPEN else 0,
+                **self.totals,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint: str, **config) -> CircuitBreaker:
+    """
+    Return the breaker for an endpoint, creating it with `config` on first use.
+    """
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(endpoint, **config)
+        return _breakers[endpoint]
+
+
+def breaker_metrics() -> Dict[str, Dict[str, Any]]:
+    """
+    Snapshot of every breaker, keyed by endpoint.
+    """
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.endpoint: breaker.snapshot() for breaker in breakers}
+
+
+def _observe(field: str, transform: Callable[[Any], float] = float):
+    def callback(options):
+        return [metrics.Observation(transform(snapshot[field]), {"endpoint": endpoint})
+                for endpoint, snapshot in breaker_metrics().items()]
+    return callback
+
+
+if metrics is not None:
+    _meter = metrics.get_meter("deep_market_agent.circuit_breaker")
+    _meter.create_observable_gauge("circuit_breaker.state", callbacks=[_observe("state", STATE_VALUES.get)],
+                                   description="0 closed, 1 half-open, 2 open")
+    _meter.create_observable_gauge("circuit_breaker.window_failure_rate",
+                                   callbacks=[_observe("window_failure_rate")])
+    _meter.create_observable_counter("circuit_breaker.rejected_calls", callbacks=[_observe("rejected")])
+    _meter.create_observable_counter("circuit_breaker.opened", callbacks=[_observe("opened")])
@@ -0,0 +1,118 @@
+"""
+Coalesce the agent's token deltas into fewer, larger stream events.
+
+The model streams one delta per token, and each event the entrypoint yields
+becomes its own SSE frame (and its own json.dumps) on the way to the API. The
+coalescer buffers consecutive text deltas and flushes them as one event when
+`max_bytes` are buffered or `max_delay` has passed since the first buffered
+delta, whichever comes first. The timer runs even when the model is silent, so
+no text waits longer than `max_delay`. Non-text events (documents, images)
+flush the buffer first and pass through unchanged.
+"""
+import asyncio
+import os
+from typing import Any, AsyncIterator, Dict
+
+STREAM_COALESCE_BYTES = int(os.getenv("STREAM_COALESCE_BYTES", "512"))
+STREAM_COALESCE_MS = float(os.getenv("STREAM_COALESCE_MS", "30"))  # 0 disables coalescing
+# Events waiting between the source and the consumer: with a slow consumer the
+# source waits (backpressure) instead of the whole stream piling up in memory
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "64"))
+
+
+def _text_of(event: Dict[str, Any]):
+    # Only plain text deltas are merged: {"message": "..."} with no other keys
+    if isinstance(event, dict) and len(event) == 1 and isinstance(event.get("message"), str):
+        return event["message"]
+    return None
+
+
+async def coalesce_events(events: AsyncIterator[Dict[str, Any]],
+                          max_bytes: int = STREAM_COALESCE_BYTES,
+                          max_delay_ms: float = STREAM_COALESCE_MS,
+                          max_queued: int = STREAM_QUEUE_SIZE) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield `events` with consecutive text deltas merged by size and time.
+    """
+    if max_delay_ms <= 0:
+        async for event in events:
+            yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    # One pump task per stream feeds a queue; the flush timer drops a marker in the
+    # same queue, so nothing is awaited with a timeout (no task or wait per delta).
+    # Events take at most `max_queued` places (semaphore); the timer's marker takes
+    # none, so it never waits
+    queue: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max_queued)
+
+    async def pump():
+        try:
+            async for event in events:
+                await slots.acquire()
+                queue.put_nowait(event)
+        except Exception as e:
+            queue.put_nowait(_Failure(e))
+        else:
+            queue.put_nowait(_DONE)
+
+    pump_task = asyncio.ensure_future(pump())
+    parts, size, timer, generation = [], 0, None, 0
+    try:
+        while True:
+            event = await queue.get()
+            if isinstance(event, _Flush):
+                if event.generation == generation and parts:
+                    yield _flush(parts)
+                    parts, size, timer, generation = [], 0, None, generation + 1
+                continue
+            if event is _DONE:
+                break
+            if isinstance(event, _Failure):
+                raise event.error
+            slots.release()
+
+            text = _text_of(event)
+            if text is None:
+                if parts:
+                    yield _flush(parts)
+                    parts, size, timer, generation = [], 0, _cancel(timer), generation + 1
+                yield event
+                continue
+            if not parts:
+                timer = loop.call_later(max_delay_ms / 1000, queue.put_nowait, _Flush(generation))
+            parts.append(text)
+            size += len(text.encode("utf-8"))
+            if size >= max_bytes:
+                yield _flush(parts)
+                parts, size, timer, generation = [], 0, _cancel(timer), generation + 1
+        if parts:
+            yield _flush(parts)
+    finally:
+        # Stopped early (e.g. the client went away): stop the source too
+        _cancel(timer)
+        pump_task.cancel()
+
+
+class _Flush:
+    def __init__(self, generation: int):
+        self.generation = generation
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_DONE = object()
+
+
+def _flush(parts):
+    return {"message": "".join(parts)}
+
+
+def _cancel(timer):
+    if timer is not None:
+        timer.cancel()
+    return None
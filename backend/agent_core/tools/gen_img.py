@@ -1,79 +1,242 @@
 # call_via_api_gateway.py
 import json
+import os
+import time
 import requests
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 import uuid
-from dynamo_handler import add_image_record
+from dynamo_handler import add_image_records
+from tools.circuit_breaker import get_breaker
+from tools.cancellation import raise_if_cancelled, cancellable_sleep
 
-API_URL = "https://71vfitor4i.execute-api.us-east-1.amazonaws.com/dev/generate-image"
+API_URL = os.getenv("IMG_API_URL", "https://71vfitor4i.execute-api.us-east-1.amazonaws.com/dev/generate-image")
+JOBS_URL = f"{API_URL}/jobs"
 REQUEST_TIMEOUT = 120  # seconds - image generation can take time
+SUBMIT_TIMEOUT = 15  # seconds - submitting a job only queues it
+JOB_LONG_POLL_SECONDS = 20  # server-side wait per status request (API Gateway limit is 29s)
+JOB_POLL_BACKOFF = 0.5  # initial pause when a status request returns early or fails
+JOB_POLL_MAX_BACKOFF = 4.0
 DYNAMO_TABLE_NAME = "deep-market-analyzer-images"
+DRAFT_TIER = "draft"  # one 512x512 image, for exploration
+FINAL_TIER = "final"  # three 1024x1024 variations, for reports and upgrades
+TIER_IMAGE_COUNTS = {DRAFT_TIER: 1, FINAL_TIER: 3}
 
-def call_img_gateway(use_case: str, chat_id: str, user_id: str = "default_user", ) -> Dict[str, Any]:
-    payload = {"use_case": use_case, "user_id": user_id}
-    headers = {"Content-Type": "application/json"}
+# Opens after repeated 5xx/timeouts so callers get CircuitOpenError right away
+# instead of waiting REQUEST_TIMEOUT on a degraded gateway
+breaker = get_breaker("image_api", slow_call_seconds=SUBMIT_TIMEOUT - 5)
+
+
+class ImageApiError(RuntimeError):
+    """
+    Error response from the image API, with its HTTP status and, for 400s, the
+    Lambda's error_code ("invalid_prompt" or "invalid_request").
+    """
+
+    def __init__(self, status_code: int, body: Any):
+        super().__init__(f"HTTP {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+        self.error_code = body.get("error_code") if isinstance(body, dict) else None
 
-    resp = requests.post(API_URL, headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
 
-    # Raise for 4xx/5xx with helpful body if available
+def _is_server_error(resp: requests.Response) -> bool:
+    return resp.status_code >= 500
+
+
+def _parse_api_response(resp: requests.Response) -> Dict[str, Any]:
+    """
+    Raise ImageApiError for 4xx/5xx (with the error body when available) and return the JSON body.
+    """
     try:
         resp.raise_for_status()
     except requests.HTTPError:
         # If API Gateway returned a JSON body with error details, include it in the exception
         try:
             err_json = resp.json()
-            raise RuntimeError(f"HTTP {resp.status_code}: {err_json}")
-        except Exception:
-            raise RuntimeError(f"HTTP {resp.status_code}: {resp.text}")
+        except ValueError:
+            raise ImageApiError(resp.status_code, resp.text)
+        raise ImageApiError(resp.status_code, err_json)
 
-    # Typical API Gateway Lambda proxy integration returns:
-    # { "statusCode": 200, "headers": {...}, "body": "<stringified JSON>" }
+    # Typical API Gateway Lambda proxy integration returns the body directly,
+    # but tolerate { "statusCode": 200, "headers": {...}, "body": "<stringified JSON>" }
     try:
         api_wrapper = resp.json()
     except ValueError:
-        # Fallback: maybe API returned raw JSON directly
-        try:
-            return resp.json()
-        except Exception:
-            raise RuntimeError("Failed to parse API response as JSON")
+        raise RuntimeError("Failed to parse API response as JSON")
 
-    body = api_wrapper.get("body", api_wrapper)  # if it's already the body
-    # If body is a string (common), parse it
+    body = api_wrapper.get("body", api_wrapper)
     if isinstance(body, str):
         try:
             body = json.loads(body)
         except json.JSONDecodeError:
-            # Body might be a plain string error — return wrapper for debugging
             raise RuntimeError(f"API returned non-JSON body: {body}")
+    return body
+
+
+def submit_img_job(use_case: str,
+                   user_id: str = "default_user",
+                   prompt: Optional[str] = None,
+                   negative_text: Optional[str] = None,
+                   tier: str = DRAFT_TIER,
+                   seed: Optional[int] = None) -> str:
+    """
+    Queue an image generation job and return its job id without waiting for it.
+    When `prompt` (and optionally `negative_text`) is given, the Lambda uses it
+    as the Nova Canvas prompt directly instead of composing one from `use_case`.
+    `tier` selects draft or final quality; `seed` reuses a previous generation's seed.
+    Invalid requests are rejected here with ImageApiError (status 400);
+    raises CircuitOpenError while the image API is failing.
+    """
+    raise_if_cancelled("image_job_submit")
+    payload = {"use_case": use_case, "user_id": user_id, "tier": tier}
+    if prompt:
+        payload["prompt"] = prompt
+        if negative_text:
+            payload["negativeText"] = negative_text
+    if seed is not None:
+        payload["seed"] = seed
+    headers = {"Content-Type": "application/json"}
+
+    resp = breaker.call(lambda: requests.post(JOBS_URL, headers=headers, json=payload, timeout=SUBMIT_TIMEOUT),
+                        is_failure=_is_server_error)
+    body = _parse_api_response(resp)
+    if "job_id" not in body:
+        raise RuntimeError(f"Unexpected API response shape: {body}")
+    print(f"Image job {body['job_id']} queued ({tier})")
+    return body["job_id"]
+
+
+def wait_img_job(job_id: str, timeout: float = REQUEST_TIMEOUT) -> Dict[str, Any]:
+    """
+    Wait for an image job and return its generation result (image_urls, images,
+    seed, tier, prompt...). Each status request long-polls on the server; the
+    client only backs off (exponentially) when a request returns early or fails.
+    A cancelled turn stops waiting between status requests (the job itself runs
+    to completion on the server).
+    """
+    deadline = time.monotonic() + timeout
+    backoff = JOB_POLL_BACKOFF
+    while True:
+        raise_if_cancelled("image_job_wait")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise RuntimeError(f"Image job {job_id} did not finish within {timeout}s")
+        wait = min(JOB_LONG_POLL_SECONDS, max(int(remaining), 1))
+        started = time.monotonic()
+        try:
+            resp = breaker.call(
+                lambda: requests.get(f"{JOBS_URL}/{job_id}", params={"wait": wait}, timeout=wait + SUBMIT_TIMEOUT),
+                is_failure=_is_server_error, slow_call_seconds=wait + SUBMIT_TIMEOUT - 5)
+            job = _parse_api_response(resp) if resp.status_code < 500 else None
+        except requests.RequestException as e:
+            print(f"Image job {job_id} status request failed, retrying: {e}")
+            job = None
+
+        if job is not None:
+            if job.get("status") == "succeeded":
+                return job["result"]
+            if job.get("status") == "failed":
+                raise RuntimeError(f"Invocation returned error: {job.get('error_type')}: {job.get('error')}")
+            progress = job.get("progress", {})
+            print(f"Image job {job_id}: {job.get('stage')} "
+                  f"({progress.get('images_done', 0)}/{progress.get('images_total', 0)} images)")
+            if time.monotonic() - started >= wait / 2:
+                # The server held the request: poll again right away
+                backoff = JOB_POLL_BACKOFF
+                continue
 
+        cancellable_sleep(min(backoff, max(deadline - time.monotonic(), 0)), "image_job_wait")
+        backoff = min(backoff * 2, JOB_POLL_MAX_BACKOFF)
+
+
+def collect_img_job(job_id: str,
+                    use_case: str,
+                    chat_id: str,
+                    user_id: str = "default_user",
+                    tier: str = DRAFT_TIER,
+                    image_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Wait for a submitted job and store its image records.
+    `image_ids` lets the caller pre-assign the record ids (e.g. to reference the
+    images in other work that ran while the job was generating).
+    """
+    return _store_images(wait_img_job(job_id), use_case, chat_id, user_id, tier, image_ids)
+
+
+def call_img_gateway(use_case: str,
+                     chat_id: str,
+                     user_id: str = "default_user",
+                     prompt: Optional[str] = None,
+                     negative_text: Optional[str] = None,
+                     tier: str = DRAFT_TIER,
+                     seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Generate images through the image API Gateway and store their records.
+    Submits a job and waits for it; use submit_img_job/collect_img_job directly
+    to overlap the generation with other work.
+    """
+    job_id = submit_img_job(use_case, user_id=user_id, prompt=prompt,
+                            negative_text=negative_text, tier=tier, seed=seed)
+    return collect_img_job(job_id, use_case, chat_id, user_id=user_id, tier=tier)
+
+
+def _store_images(body: Dict[str, Any],
+                  use_case: str,
+                  chat_id: str,
+                  user_id: str,
+                  tier: str,
+                  image_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Store a record per generated image and return their ids, descriptions and urls.
+    """
     # At this point body is expected to contain image_urls or error
     if "image_urls" in body:
+        records = []
         saved_images = []
-        for image_url in body["image_urls"]:
+        # Per-image details (WebP derivatives); older Lambdas only return image_urls
+        image_details = body.get("images") or [{} for _ in body["image_urls"]]
+        image_ids = list(image_ids or [])
+        for image_url, details in zip(body["image_urls"], image_details):
             image_obj = {}
-            image_obj["image_id"] = str(uuid.uuid4())
+            image_obj["image_id"] = image_ids.pop(0) if image_ids else str(uuid.uuid4())
             image_obj["chat_id"] = chat_id
             image_obj["user_id"] = user_id
             image_obj["description"] = use_case
             image_obj["s3_bucket"] = image_url.split("//")[1].split(".")[0]  # Extract bucket
-            image_obj["s3_key"] = image_url.split("//")[1].split("/", 1)[1].split("?")[0]  # Extract key  # Extract key
-            add_image_record(image_obj)
-            image_obj["presigned_url"] = image_url
-            saved_images.append(image_obj)
-            
+            image_obj["s3_key"] = image_url.split("//")[1].split("/", 1)[1].split("?")[0]  # Extract key
+            # Keep what is needed to re-render this image at another tier
+            image_obj["tier"] = body.get("tier", tier)
+            image_obj["seed"] = body.get("seed")
+            image_obj["prompt"] = body.get("prompt", "")
+            image_obj["negative_text"] = body.get("negativeText", "")
+            for derivative in ("thumbnail", "medium"):
+                if details.get(f"{derivative}_key"):
+                    image_obj[f"{derivative}_s3_key"] = details[f"{derivative}_key"]
+            records.append(image_obj)
+            saved_images.append({
+                **image_obj,
+                "presigned_url": image_url,
+                "thumbnail_url": details.get("thumbnail_url", ""),
+                "medium_url": details.get("medium_url", ""),
+            })
+
+        # One batched write for all the records
+        add_image_records(records)
         # Return ids, desc, and original presigned urls
-        final_body = {
+        return {
             "images": [
                 {
                     "image_id": img["image_id"],
                     "description": img["description"],
                     "s3_bucket": img["s3_bucket"],
                     "s3_key": img["s3_key"],
-                    "presigned_url": img["presigned_url"]
+                    "presigned_url": img["presigned_url"],
+                    "thumbnail_url": img["thumbnail_url"],
+                    "medium_url": img["medium_url"],
+                    "tier": img["tier"]
                 } for img in saved_images
             ]
         }
-        return final_body
 
     # If there is a generic error shape
     if "error" in body or "error_type" in body:
@@ -81,6 +244,67 @@ def call_img_gateway(use_case: str, chat_id: str, user_id: str = "default_user",
 
     raise RuntimeError(f"Unexpected API response shape: {body}")
 
+
+def submit_images_from_prompt(prompt: str,
+                              user_id: str = "default_user",
+                              negative_text: Optional[str] = None,
+                              tier: str = DRAFT_TIER,
+                              seed: Optional[int] = None,
+                              use_case: Optional[str] = None,
+                              compose_on_rejection: bool = True) -> str:
+    """
+    Queue a generation from an already composed prompt and return the job id.
+    If the Lambda rejects the prompt itself (error_code "invalid_prompt", e.g.
+    it contains negations) and `compose_on_rejection` is set, the job composes
+    one from the use case instead, so the caller still gets images. Other
+    errors (invalid tier or seed, server errors) are raised as they are.
+    """
+    use_case = use_case or prompt
+    try:
+        return submit_img_job(use_case, user_id=user_id, prompt=prompt,
+                              negative_text=negative_text, tier=tier, seed=seed)
+    except ImageApiError as e:
+        if not compose_on_rejection or e.error_code != "invalid_prompt":
+            raise
+        print("Precomposed prompt rejected, falling back to prompt composition:", e)
+        return submit_img_job(use_case, user_id=user_id, tier=tier, seed=seed)
+
+
+def generate_images_from_prompt(prompt: str,
+                                chat_id: str,
+                                user_id: str = "default_user",
+                                negative_text: Optional[str] = None,
+                                tier: str = DRAFT_TIER,
+                                seed: Optional[int] = None,
+                                use_case: Optional[str] = None,
+                                compose_on_rejection: bool = True) -> Dict[str, Any]:
+    """
+    Generate images from an already composed prompt and wait for them
+    (submit_images_from_prompt + collect_img_job).
+    """
+    job_id = submit_images_from_prompt(prompt, user_id=user_id, negative_text=negative_text, tier=tier,
+                                       seed=seed, use_case=use_case, compose_on_rejection=compose_on_rejection)
+    return collect_img_job(job_id, use_case or prompt, chat_id, user_id=user_id, tier=tier)
+
+
+def upgrade_image(image_record: Dict[str, Any], chat_id: str, user_id: str = "default_user") -> Dict[str, Any]:
+    """
+    Render final-quality variations of a draft image, reusing its seed and prompt.
+    Never recomposes the prompt: if it is rejected, the upgrade fails instead of
+    producing different images.
+    """
+    if not image_record.get("prompt"):
+        raise ValueError(f"Image {image_record.get('image_id')} has no stored prompt to upgrade from")
+    seed = image_record.get("seed")
+    return generate_images_from_prompt(prompt=image_record["prompt"],
+                                       chat_id=chat_id,
+                                       user_id=user_id,
+                                       negative_text=image_record.get("negative_text"),
+                                       tier=FINAL_TIER,
+                                       seed=int(seed) if seed is not None else None,
+                                       use_case=image_record.get("description"),
+                                       compose_on_rejection=False)
+
 if __name__ == "__main__":
     test_use_case = "A mobile app that helps users track their daily water intake and reminds them to stay hydrated."
 
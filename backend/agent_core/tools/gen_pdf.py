@@ -15,10 +15,14 @@ from prompts import (
     messages_extraction_v1_prompt,
     images_query_generation_v1_prompt
 )
-from tools.gen_img import call_img_gateway
+from tools.gen_img import submit_img_job, collect_img_job, FINAL_TIER, TIER_IMAGE_COUNTS, breaker as image_breaker
+from tools.circuit_breaker import CircuitOpenError, get_breaker
+from tools.cancellation import TurnCancelled, raise_if_cancelled
 from dynamo_handler import add_document_record
 
 API_URL = "https://e6znu0x2lk.execute-api.us-east-1.amazonaws.com/dev/generate-pdf"
+REQUEST_TIMEOUT = 120  # seconds
+breaker = get_breaker("pdf_api", slow_call_seconds=60)
 
 template = """
 <style>
@@ -120,6 +124,7 @@ class ModelInput(BaseModel):
     temperature: float = 0.3
 
 def call_pdf_gateway(data=None, template=template, html_content=None) -> dict:
+    raise_if_cancelled("pdf_render")
     if html_content:
         payload = {
             "html": html_content
@@ -129,7 +134,8 @@ def call_pdf_gateway(data=None, template=template, html_content=None) -> dict:
             "template": template,
             "data": data,
         }
-    resp = requests.post(API_URL, json=payload, timeout=120)
+    resp = breaker.call(lambda: requests.post(API_URL, json=payload, timeout=REQUEST_TIMEOUT),
+                        is_failure=lambda r: r.status_code >= 500)
 
     # Try JSON
     try:
@@ -185,16 +191,15 @@ def generate_image_query(info: str,
     image_query = method_chain.invoke({"report_information": info})
     return image_query
 
-def generate_images_for_report(info: str,
-                               chat_id: str,
-                               user_id: str,
-                               model_id: str = "us.anthropic.claude-3-7-sonnet-20250219-v1:0",
-                               temperature: float = 0.3) -> list:
-    "Generate images to be included in the report"
+def submit_images_for_report(info: str,
+                             user_id: str,
+                             model_id: str = "us.anthropic.claude-3-7-sonnet-20250219-v1:0",
+                             temperature: float = 0.3) -> tuple:
+    "Queue the generation of the report images, returns (query, job_id)"
     query = generate_image_query(info, model_id=model_id, temperature=temperature)
-    images = call_img_gateway(use_case=query, chat_id=chat_id, user_id=user_id)
+    job_id = submit_img_job(use_case=query, user_id=user_id, tier=FINAL_TIER)
     
-    return images
+    return query, job_id
 
 
 def generate_report_definition(info: str,
@@ -230,7 +235,9 @@ def build_final_report(report: BaseReportDefinition, images: list) -> FinalRepor
         if h.image_id:
             image_record = next((img for img in images if img["image_id"] == h.image_id), None)
             if image_record and "presigned_url" in image_record:
-                image_svg = f'<img src="{image_record["presigned_url"]}" alt="{h.image_title}" style="max-width: 400px; height: auto;" />'  
+                # The medium WebP is plenty for a 400px slot and keeps the PDF render fast
+                image_url = image_record.get("medium_url") or image_record["presigned_url"]
+                image_svg = f'<img src="{image_url}" alt="{h.image_title}" style="max-width: 400px; height: auto;" />'  
         final_highlight = FinalHighlight(
             title=h.title,
             subtitle=h.subtitle,
@@ -260,23 +267,39 @@ def execute_pdf_report_generation_flow(messages: list[AnyMessage],
     "Create a report from the messages"
 
     try:
+        # Both gateways are needed at the end: don't spend the LLM calls if either is down
+        breaker.raise_if_open()
+        image_breaker.raise_if_open()
+        # Each step is a model or gateway call: a cancelled turn stops between them
+        raise_if_cancelled("pdf_extract_info")
         info = extract_info_from_messages(messages=messages,
                                           query=query,
                                           model_id=extract_model.model_id,
                                           temperature=extract_model.temperature)
         #print("\n\nExtracted info:", info)
-        images = generate_images_for_report(info=info,
-                                            chat_id=chat_id,
-                                            user_id=user_id,
-                                            model_id=images_query_model.model_id,
-                                            temperature=images_query_model.temperature)
-        images = images.get("images", [])
-        #print("\n\nGenerated images:", images)
+        raise_if_cancelled("pdf_image_query")
+        image_query, image_job_id = submit_images_for_report(info=info,
+                                                             user_id=user_id,
+                                                             model_id=images_query_model.model_id,
+                                                             temperature=images_query_model.temperature)
+        # The model only needs ids and descriptions to place images, not the (long) URLs,
+        # so the ids are assigned up front and the report is written while the images render
+        images_for_model = [{"image_id": str(uuid.uuid4()), "description": image_query}
+                            for _ in range(TIER_IMAGE_COUNTS[FINAL_TIER])]
+        raise_if_cancelled("pdf_report_definition")
         report = generate_report_definition(info=info,
-                                            images=images,
+                                            images=images_for_model,
                                             model_id=report_def_model.model_id,
                                             temperature=report_def_model.temperature)
         #print("\n\nGenerated report definition:", report)
+        images = collect_img_job(image_job_id,
+                                 use_case=image_query,
+                                 chat_id=chat_id,
+                                 user_id=user_id,
+                                 tier=FINAL_TIER,
+                                 image_ids=[img["image_id"] for img in images_for_model])
+        images = images.get("images", [])
+        #print("\n\nGenerated images:", images)
 
         final_report = build_final_report(report=report, images=images)
         #print("\n\nFinal report with images:", final_report)
@@ -306,6 +329,11 @@ def execute_pdf_report_generation_flow(messages: list[AnyMessage],
         add_document_record(document_record)
 
         return {"document_id": document_id, "pdf_presigned_url": pdf_presigned_url}
+    except TurnCancelled:
+        raise
+    except CircuitOpenError as e:
+        print("Report generation skipped:", str(e))
+        return e.to_dict()
     except Exception as e:
         print("Error during report generation flow:", str(e))
         return {"error": str(e)}
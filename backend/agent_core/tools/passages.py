@@ -0,0 +1,211 @@
+"""
+In-process passage index over extracted web pages.
+
+Extracted pages are often tens of thousands of tokens; instead of handing the
+model their full text, pages are split into passages of ~PASSAGE_WORDS words,
+scored against the user's question with BM25 and only the best passages that
+fit in a token budget are returned. Scoring is vectorized with NumPy: the
+tokens of every passage are kept as one flat array of term ids, from which the
+term-frequency matrix of the query terms is built with a single np.add.at.
+
+The full text of recently extracted pages is kept in an LRU store so the agent
+can still read a page on demand.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+PASSAGE_WORDS = 120
+PASSAGE_TOKEN_BUDGET = int(os.getenv("PASSAGE_TOKEN_BUDGET", "3000"))
+TOKENS_PER_WORD = 1.4  # rough model tokens per word, for English and Spanish text
+BM25_K1 = 1.2
+BM25_B = 0.75
+PAGE_STORE_MAX_PAGES = 100
+PAGE_TEXT_CHUNK_CHARS = 8000  # full text is returned in chunks of this size
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+PARAGRAPH_SPLIT = re.compile(r"\n\s*\n+")
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+# Users write in English and Spanish; these carry no weight for ranking
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i in is it its me my of on or our that the their them
+they this to was we what when where which who why will with you your about can do does please tell
+al como con cual cuales de del el en es esta este esto ha hay la las lo los me mi mis para pero por que
+qué se sin sobre son su sus un una uno unos unas y o yo tu te nos cómo cuál dime quiero puedes
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text.split()) * TOKENS_PER_WORD) + 1
+
+
+def split_passages(text: str, max_words: int = PASSAGE_WORDS) -> List[str]:
+    """
+    Split text into passages of up to max_words words: short paragraphs are
+    merged, long ones are split at sentence (or, failing that, word) boundaries.
+    """
+    pieces = []
+    for paragraph in PARAGRAPH_SPLIT.split(text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if len(paragraph.split()) <= max_words:
+            pieces.append(paragraph)
+            continue
+        for sentence in SENTENCE_SPLIT.split(paragraph):
+            words = sentence.split()
+            pieces.extend(" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words))
+
+    passages, current, current_words = [], [], 0
+    for piece in pieces:
+        words = len(piece.split())
+        if current and current_words + words > max_words:
+            passages.append(" ".join(current))
+            current, current_words = [], 0
+        current.append(piece)
+        current_words += words
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+class PassageIndex:
+    """
+    BM25 index over the passages of a set of pages.
+    """
+
+    def __init__(self, pages: List[Dict[str, str]], max_words: int = PASSAGE_WORDS):
+        self.passages = []  # {"url", "position", "text"}
+        self.vocabulary = {}
+        term_ids, passage_of = [], []
+        for page in pages:
+            for position, text in enumerate(split_passages(page.get("text") or "", max_words)):
+                index = len(self.passages)
+                self.passages.append({"url": page.get("url"), "position": position, "text": text})
+                for token in tokenize(text):
+                    term_ids.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                    passage_of.append(index)
+
+        self.term_ids = np.array(term_ids, dtype=np.int64)
+        self.passage_of = np.array(passage_of, dtype=np.int64)
+        self.lengths = np.bincount(self.passage_of, minlength=len(self.passages)).astype(np.float64)
+        self.average_length = self.lengths.mean() if len(self.passages) else 0.0
+
+    def scores(self, query: str) -> np.ndarray:
+        """
+        BM25 score of every passage for the query.
+        """
+        n_passages = len(self.passages)
+        query_ids = sorted({self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary})
+        if not n_passages or not query_ids:
+            return np.zeros(n_passages)
+
+        # Column of each query term, -1 for every other term id
+        column = np.full(len(self.vocabulary), -1, dtype=np.int64)
+        column[query_ids] = np.arange(len(query_ids))
+        token_columns = column[self.term_ids]
+        matches = token_columns >= 0
+        tf = np.zeros((n_passages, len(query_ids)))
+        np.add.at(tf, (self.passage_of[matches], token_columns[matches]), 1)
+
+        df = np.count_nonzero(tf, axis=0)
+        idf = np.log1p((n_passages - df + 0.5) / (df + 0.5))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / max(self.average_length, 1.0))
+        return (tf * (BM25_K1 + 1) / (tf + norm[:, None])) @ idf
+
+    def top_passages(self, query: str, token_budget: int = PASSAGE_TOKEN_BUDGET) -> List[Dict]:
+        """
+        Best passages for the query that fit in token_budget, best first. When
+        nothing matches the query, the opening passages of each page are used.
+        """
+        scores = self.scores(query)
+        if scores.size and scores.max() > 0:
+            order = np.argsort(-scores, kind="stable")
+            order = order[scores[order] > 0]
+        else:
+            positions = np.array([p["position"] for p in self.passages])
+            order = np.argsort(positions, kind="stable")
+
+        selected, used = [], 0
+        for index in order:
+            passage = self.passages[index]
+            tokens = estimate_tokens(passage["text"])
+            if used + tokens > token_budget:
+                continue
+            used += tokens
+            selected.append({"url": passage["url"], "position": passage["position"],
+                             "score": round(float(scores[index]), 3), "text": passage["text"]})
+            if token_budget - used < PASSAGE_WORDS:
+                break
+        return selected
+
+
+def select_passages(pages: List[Dict[str, str]], question: str,
+                    token_budget: int = PASSAGE_TOKEN_BUDGET) -> List[Dict]:
+    """
+    Top passages of `pages` ([{"url", "text"}]) for `question` under token_budget.
+    """
+    return PassageIndex(pages).top_passages(question, token_budget)
+
+
+_pages: "OrderedDict[str, str]" = OrderedDict()
+_pages_lock = threading.Lock()
+
+
+def store_pages(pages: List[Dict[str, str]]) -> None:
+    """
+    Keep the full text of extracted pages for read_page_text().
+    """
+    with _pages_lock:
+        for page in pages:
+            _pages[page["url"]] = page.get("text") or ""
+            _pages.move_to_end(page["url"])
+        while len(_pages) > PAGE_STORE_MAX_PAGES:
+            _pages.popitem(last=False)
+
+
+def stored_page(url: str) -> Optional[str]:
+    with _pages_lock:
+        if url not in _pages:
+            return None
+        _pages.move_to_end(url)
+        return _pages[url]
+
+
+def read_page_text(text: str, url: str, query: str = "", offset: int = 0,
+                   token_budget: int = PASSAGE_TOKEN_BUDGET) -> Dict:
+    """
+    A page's best passages for `query`, or (without a query) a chunk of its full
+    text starting at `offset`.
+    """
+    if query:
+        return {"url": url, "passages": select_passages([{"url": url, "text": text}], query, token_budget)}
+    chunk = text[offset:offset + PAGE_TEXT_CHUNK_CHARS]
+    next_offset = offset + len(chunk)
+    return {"url": url, "offset": offset, "text": chunk, "total_chars": len(text),
+            "next_offset": next_offset if next_offset < len(text) else None}
+
+
+if __name__ == "__main__":
+    import time
+
+    words = ("market growth revenue customers pricing platform adoption energy solar battery "
+             "regulation investment startup logistics retail analytics").split()
+    rng = np.random.default_rng(7)
+    pages = [{"url": f"https://example.com/{i}",
+              "text": "\n\n".join(" ".join(rng.choice(words, 80)) for _ in range(60))} for i in range(20)]
+    started = time.perf_counter()
+    index = PassageIndex(pages)
+    built = time.perf_counter()
+    top = index.top_passages("solar battery market growth")
+    print(f"{len(index.passages)} passages, {len(index.term_ids)} tokens: "
+          f"index {1000 * (built - started):.1f}ms, query {1000 * (time.perf_counter() - built):.1f}ms, "
+          f"{len(top)} passages selected")
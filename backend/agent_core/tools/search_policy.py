@@ -0,0 +1,150 @@
+"""
+Chooses search_depth and max_results for each web search of an agent turn.
+
+- Query complexity: short fact lookups ("what is...", "precio de...") score low
+  and get fast `basic` searches; competitor, market or comparison research
+  scores high and gets `advanced` searches with more results. A single
+  competitor or market term is enough ("competitors of Notion", "competidores
+  de Notion").
+- Turn budget: an `advanced` search is only chosen while its expected latency
+  fits in a share of the time left in the turn, and the result count shrinks
+  as the turn runs out of time (fewer results also means fewer tokens to read).
+- Observed latency: the expected latency of each depth is an exponentially
+  weighted moving average of the searches this process has made, as measured
+  by the Lambda (`latency_ms`, for single and batch searches alike).
+"""
+import os
+import re
+import threading
+import time
+from typing import Dict
+
+BASIC = "basic"
+ADVANCED = "advanced"
+
+TURN_BUDGET_SECONDS = float(os.getenv("AGENT_TURN_BUDGET_SECONDS", "120"))
+SEARCH_BUDGET_SHARE = 0.25  # a single search may use at most this share of the time left
+LATENCY_PRIORS = {BASIC: 2.0, ADVANCED: 6.0}  # seconds, until searches are observed
+LATENCY_ALPHA = 0.2  # weight of the newest observation in the moving average
+ADVANCED_MIN_COMPLEXITY = 0.5
+MIN_RESULTS = 3
+MAX_RESULTS = 10
+LOW_BUDGET_SECONDS = 30  # below this, searches return MIN_RESULTS
+
+# English and Spanish: users write in both. A single competitor or market term
+# is enough for an advanced search; the broader terms need a second signal
+RESEARCH_TERMS = re.compile(
+    r"\b(competitors?|competition|competidor(es)?|competencia|markets?|mercados?|landscape|"
+    r"benchmark|swot|foda|dafo)\b",
+    re.IGNORECASE)
+DEEP_TERMS = re.compile(
+    r"\b(industry|industria|trends?|tendencias?|strateg(y|ies)|estrategias?|forecast|pronóstico|growth|"
+    r"crecimiento|pricing models?|business models?|modelos? de negocio|regulations?|regulación|"
+    r"investors?|inversores|funding|financiación|financiamiento|adoption|adopción)\b",
+    re.IGNORECASE)
+RESEARCH_TERM_WEIGHT = 0.5
+DEEP_TERM_WEIGHT = 0.3
+COMPARISON = re.compile(r"\b(vs\.?|versus|compare[ds]?|comparison|comparar|comparación|comparativa|frente a)\b",
+                        re.IGNORECASE)
+FACT_LOOKUP = re.compile(
+    r"^\s*(what is|what's|who is|who's|when (is|was|did)|where is|how much|how many|define|price of|"
+    r"qué es|que es|quién es|quien es|cuándo|cuando|dónde|donde|cuánto|cuanto|cuántos|cuantos|precio de)\b",
+    re.IGNORECASE)
+LIST_SEPARATORS = re.compile(r",|;|\band\b|\by\b", re.IGNORECASE)
+
+_latency_ewma: Dict[str, float] = dict(LATENCY_PRIORS)
+_latency_lock = threading.Lock()
+
+
+def query_complexity(query: str) -> float:
+    """
+    Score a search query from 0 (simple fact lookup) to 1 (deep research).
+    """
+    words = query.split()
+    score = 0.0
+    if len(words) > 8:
+        score += 0.2
+    if len(words) > 16:
+        score += 0.2
+    terms = (len(RESEARCH_TERMS.findall(query)) * RESEARCH_TERM_WEIGHT
+             + len(DEEP_TERMS.findall(query)) * DEEP_TERM_WEIGHT)
+    score += min(terms, 0.6)
+    if COMPARISON.search(query):
+        score += 0.3
+    if len(LIST_SEPARATORS.findall(query)) >= 2:  # several companies/markets at once
+        score += 0.2
+    if FACT_LOOKUP.search(query):
+        score -= 0.4
+    return min(max(score, 0.0), 1.0)
+
+
+def record_latency(search_depth: str, seconds: float) -> None:
+    """
+    Feed the observed latency of a successful search into the depth's average.
+    """
+    with _latency_lock:
+        previous = _latency_ewma.get(search_depth, seconds)
+        _latency_ewma[search_depth] = (1 - LATENCY_ALPHA) * previous + LATENCY_ALPHA * seconds
+
+
+def record_search_latency(search_depth: str, result: Dict) -> None:
+    """
+    Record the latency the Lambda reports for a successful search result (the
+    "result" of a single search, or one entry of a batch), so single and batch
+    searches feed the same kind of sample. Cache hits are skipped: they say
+    nothing about Tavily's latency.
+    """
+    cache = result.get("cache") or {}
+    if "latency_ms" in result and not cache.get("hit"):
+        record_latency(search_depth, result["latency_ms"] / 1000)
+
+
+def expected_latency(search_depth: str) -> float:
+    with _latency_lock:
+        return _latency_ewma[search_depth]
+
+
+class SearchPolicy:
+    """
+    Search parameter policy for one agent turn; the turn budget starts when it is created.
+    """
+
+    def __init__(self, budget_seconds: float = TURN_BUDGET_SECONDS):
+        self.deadline = time.monotonic() + budget_seconds
+
+    def remaining(self) -> float:
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def choose(self, query: str) -> Dict:
+        """
+        Return {"search_depth", "max_results"} for a query.
+        """
+        complexity = query_complexity(query)
+        remaining = self.remaining()
+        search_depth = BASIC
+        if complexity >= ADVANCED_MIN_COMPLEXITY:
+            if expected_latency(ADVANCED) <= remaining * SEARCH_BUDGET_SHARE:
+                search_depth = ADVANCED
+            else:
+                print(f"[search-policy] {remaining:.0f}s left in the turn: advanced search downgraded to basic")
+
+        if remaining < LOW_BUDGET_SECONDS:
+            max_results = MIN_RESULTS
+        else:
+            max_results = MIN_RESULTS + round(complexity * (MAX_RESULTS - MIN_RESULTS))
+        print(f"[search-policy] complexity={complexity:.2f} depth={search_depth} max_results={max_results} "
+              f"remaining={remaining:.0f}s")
+        return {"search_depth": search_depth, "max_results": max_results}
+
+
+if __name__ == "__main__":
+    policy = SearchPolicy()
+    for q in ["What is the population of Spain?",
+              "precio de bitcoin hoy",
+              "deep competitor analysis of Notion",
+              "competitors of Notion",
+              "competidores de Notion",
+              "AI document summarization SaaS competitors, pricing models and market size",
+              "Comparativa Notion vs Confluence vs Coda para equipos pequeños",
+              "tendencias del mercado de bebidas energéticas en Latinoamérica 2025"]:
+        print(q, "->", policy.choose(q))
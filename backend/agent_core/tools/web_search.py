@@ -1,15 +1,52 @@
 import json
 import requests
 import os
-from typing import Any, Dict, Optional
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Any, Callable, Dict, Optional
+from tools.circuit_breaker import CircuitOpenError, get_breaker
+from tools.cancellation import raise_if_cancelled
 
 # ---- API Gateway endpoints ----
-API_SEARCH = "https://knfgymajqd.execute-api.us-east-1.amazonaws.com/dev/tavily/search"
-API_EXTRACT = "https://knfgymajqd.execute-api.us-east-1.amazonaws.com/dev/tavily/extract"
-API_CRAWL = "https://knfgymajqd.execute-api.us-east-1.amazonaws.com/dev/tavily/crawl"
-API_MAP = "https://knfgymajqd.execute-api.us-east-1.amazonaws.com/dev/tavily/map"
+API_BASE = os.environ.get("TAVILY_GATEWAY_URL", "https://knfgymajqd.execute-api.us-east-1.amazonaws.com/dev")
+API_SEARCH = f"{API_BASE}/tavily/search"
+API_EXTRACT = f"{API_BASE}/tavily/extract"
+API_CRAWL = f"{API_BASE}/tavily/crawl"
+API_MAP = f"{API_BASE}/tavily/map"
+API_BATCH_SEARCH = f"{API_BASE}/tavily/batch_search"
+
+MAX_BATCH_SEARCHES = 10
+# Per-result keys the agent actually reads from search results
+SEARCH_RESULT_FIELDS = ["title", "url", "content", "score", "published_date"]
+MAX_EXTRACT_URLS = 50  # the Lambda splits them into concurrent chunks of 10
 
 DEFAULT_TIMEOUT = int(os.environ.get("TAVILY_TIMEOUT", "90"))  # segundos
+# Calls slower than this count as failures for the endpoint's circuit breaker
+# (API Gateway cuts the integration at 29s anyway)
+BREAKER_SLOW_CALL_SECONDS = 25
+# Statuses that mean Tavily or the gateway is down. The Lambda answers upstream
+# client errors (bad query, invalid key, throttling) with 4xx and its own bugs
+# with 500, and neither says anything about the endpoint's health
+BREAKER_FAILURE_STATUSES = {502, 503, 504}
+
+# ---- Hedging ----
+# A search/extract call still running after the p90 latency observed for it gets
+# a duplicate request and the first good response wins; HEDGE_MAX_RATE caps the
+# share of hedged calls to bound the extra Tavily spend.
+HEDGE_ENABLED = os.environ.get("TAVILY_HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_MAX_RATE = float(os.environ.get("TAVILY_HEDGE_MAX_RATE", "0.1"))
+HEDGE_DEFAULT_DELAY = 8.0  # segundos, until HEDGE_MIN_SAMPLES latencies are known
+HEDGE_MIN_DELAY = 1.0
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+_latencies: Dict[str, deque] = {}
+_hedge_window: deque = deque(maxlen=LATENCY_WINDOW)
+_hedge_lock = threading.Lock()
+_hedge_executor = ThreadPoolExecutor(max_workers=8)
 
 # ---- Helpers ----
 def _parse_gateway_response(resp: requests.Response) -> Any:
@@ -39,12 +76,35 @@ def _parse_gateway_response(resp: requests.Response) -> Any:
     return parsed
 
 
+def _with_shaping(payload: Dict, fields: Optional[list], max_content_length: Optional[int]) -> Dict:
+    """
+    Add the optional server-side projection (`fields` kept per result) and
+    content cap (`max_content_length` characters) to a payload.
+    """
+    if fields:
+        payload["fields"] = fields
+    if max_content_length:
+        payload["max_content_length"] = max_content_length
+    return payload
+
+
 def _post_json(url: str, payload: Dict, timeout: int = DEFAULT_TIMEOUT) -> Any:
     """
     Post simple with JSON payload and return parsed response.
+    Responses come gzip-compressed (requests decompresses them transparently).
+    Each endpoint has its own circuit breaker: while it is open the call is not
+    made and a {"ok": False, "error": "circuit_open", ...} result is returned.
+    Raises TurnCancelled instead of calling Tavily for a cancelled turn.
     """
+    endpoint = url.rstrip('/').rsplit('/', 1)[-1]
+    raise_if_cancelled(f"tavily_{endpoint}")
+    breaker = get_breaker(f"tavily_{endpoint}", slow_call_seconds=BREAKER_SLOW_CALL_SECONDS)
     try:
-        resp = requests.post(url, json=payload, timeout=timeout)
+        resp = breaker.call(
+            lambda: requests.post(url, json=payload, timeout=timeout, headers={"Accept-Encoding": "gzip"}),
+            is_failure=lambda r: r.status_code in BREAKER_FAILURE_STATUSES)
+    except CircuitOpenError as e:
+        return e.to_dict()
     except requests.RequestException as e:
         return {"ok": False, "error": "request_exception", "message": str(e)}
 
@@ -55,24 +115,18 @@ def _post_json(url: str, payload: Dict, timeout: int = DEFAULT_TIMEOUT) -> Any:
     return parsed
 
 
-def tavily_search(query: str,
-                  search_depth: str = "basic",
-                  max_results: int = 5,
-                  include_images: bool = False,
-                  include_answer: bool = False,
-                  include_raw_content: bool = False,
-                  include_domains: Optional[list] = None,
-                  exclude_domains: Optional[list] = None,
-                  topic: str = "general",
-                  api_url: str = API_SEARCH) -> Any:
+def _search_payload(query: str,
+                    search_depth: str = "basic",
+                    max_results: int = 5,
+                    include_images: bool = False,
+                    include_answer: bool = False,
+                    include_raw_content: bool = False,
+                    include_domains: Optional[list] = None,
+                    exclude_domains: Optional[list] = None,
+                    topic: str = "general") -> Dict:
     """
-    Calls the /tavily/search (POST) endpoint.
-    Minimum parameters: query.
+    Normalize and validate search parameters into the Lambda payload.
     """
-    if not query:
-        return {"ok": False, "error": "missing_query"}
-
-    # Normalize and validate parameters
     if search_depth not in ("basic", "advanced"):
         search_depth = "basic"
     if max_results < 1:
@@ -80,7 +134,7 @@ def tavily_search(query: str,
     if max_results > 20:
         max_results = 20
 
-    payload = {
+    return {
         "query": query,
         "search_depth": search_depth,
         "max_results": max_results,
@@ -91,21 +145,170 @@ def tavily_search(query: str,
         "exclude_domains": exclude_domains or [],
         "topic": topic
     }
-    return _post_json(api_url, payload)
+
+
+def is_good_response(parsed: Any) -> bool:
+    """
+    Whether a parsed gateway response is a usable result (not a transport or
+    Lambda error).
+    """
+    if not isinstance(parsed, dict):
+        return False
+    if parsed.get("ok") is False or "error" in parsed:
+        return False
+    result = parsed.get("result")
+    return not (isinstance(result, dict) and result.get("success") is False)
+
+
+def _record_latency(kind: str, seconds: float) -> None:
+    with _hedge_lock:
+        _latencies.setdefault(kind, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+
+def _hedge_delay(kind: str) -> float:
+    """
+    Seconds to wait before hedging a call: the p90 latency observed for its kind.
+    """
+    with _hedge_lock:
+        samples = sorted(_latencies.get(kind, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return max(samples[int(len(samples) * 0.9) - 1], HEDGE_MIN_DELAY)
+
+
+def _take_hedge_slot(hedge: bool) -> bool:
+    """
+    Record a call in the hedge-rate window; returns whether it may be hedged
+    (when asked) without exceeding HEDGE_MAX_RATE.
+    """
+    with _hedge_lock:
+        allowed = hedge and sum(_hedge_window) + 1 <= HEDGE_MAX_RATE * max(len(_hedge_window) + 1, 1 / HEDGE_MAX_RATE)
+        _hedge_window.append(allowed)
+        return allowed
+
+
+def _hedged(kind: str, call: Callable[[], Any], hedge: Optional[bool] = None) -> Any:
+    """
+    Run call() and, if it is still running after _hedge_delay(kind), a duplicate
+    of it; return the first good response (or the last one if none is good).
+    The slower request cannot be interrupted mid-flight: it finishes in the
+    background and its response is discarded.
+    """
+    if not (HEDGE_ENABLED if hedge is None else hedge):
+        return call()
+
+    def submit():
+        started = time.monotonic()
+        # In the turn's context, so the call still sees its cancellation token
+        future = _hedge_executor.submit(copy_context().run, call)
+        future.add_done_callback(
+            lambda f: f.exception() is None and is_good_response(f.result())
+            and _record_latency(kind, time.monotonic() - started))
+        return future
+
+    delay = _hedge_delay(kind)
+    primary = submit()
+    done, _ = wait([primary], timeout=delay)
+    pending = [primary]
+    if not done and _take_hedge_slot(True):
+        print(f"[hedge] {kind} still running after {delay:.2f}s, sending a duplicate request")
+        pending.append(submit())
+    elif done:
+        _take_hedge_slot(False)
+
+    response = None
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            response = future.result()
+            if is_good_response(response):
+                for other in pending:
+                    other.cancel()
+                return response
+    return response
+
+
+def tavily_search(query: str,
+                  search_depth: str = "basic",
+                  max_results: int = 5,
+                  include_images: bool = False,
+                  include_answer: bool = False,
+                  include_raw_content: bool = False,
+                  include_domains: Optional[list] = None,
+                  exclude_domains: Optional[list] = None,
+                  topic: str = "general",
+                  fields: Optional[list] = None,
+                  max_content_length: Optional[int] = None,
+                  hedge: Optional[bool] = None,
+                  api_url: str = API_SEARCH) -> Any:
+    """
+    Calls the /tavily/search (POST) endpoint.
+    Minimum parameters: query.
+    `fields` keeps only those keys of each result; `max_content_length` caps
+    their content (both applied by the Lambda to shrink the response).
+    `hedge` overrides TAVILY_HEDGE_ENABLED for this call.
+    """
+    if not query:
+        return {"ok": False, "error": "missing_query"}
+
+    payload = _search_payload(query, search_depth, max_results, include_images, include_answer,
+                              include_raw_content, include_domains, exclude_domains, topic)
+    payload = _with_shaping(payload, fields, max_content_length)
+    return _hedged(f"search:{payload['search_depth']}", lambda: _post_json(api_url, payload), hedge)
+
+
+def tavily_batch_search(searches: list,
+                        max_concurrency: Optional[int] = None,
+                        fields: Optional[list] = None,
+                        max_content_length: Optional[int] = None,
+                        api_url: str = API_BATCH_SEARCH) -> Any:
+    """
+    Calls the /tavily/batch_search endpoint: up to 10 searches in one round trip,
+    run concurrently by the Lambda. Each spec is a query string or a dict with
+    the tavily_search parameters. Results come back in input order, each with
+    its own success/error.
+    """
+    if not isinstance(searches, list) or len(searches) == 0:
+        return {"ok": False, "error": "missing_searches"}
+    if len(searches) > MAX_BATCH_SEARCHES:
+        return {"ok": False, "error": "too_many_searches", "max_allowed": MAX_BATCH_SEARCHES}
+
+    specs = []
+    for spec in searches:
+        if isinstance(spec, str):
+            spec = {"query": spec}
+        if not isinstance(spec, dict) or not spec.get("query"):
+            return {"ok": False, "error": "missing_query"}
+        try:
+            specs.append(_search_payload(**spec))
+        except TypeError as e:
+            return {"ok": False, "error": "invalid_search", "message": str(e)}
+
+    payload = {"searches": specs}
+    if max_concurrency:
+        payload["max_concurrency"] = max_concurrency
+    return _post_json(api_url, _with_shaping(payload, fields, max_content_length))
 
 
 def tavily_extract(urls: list,
+                   fields: Optional[list] = None,
+                   max_content_length: Optional[int] = None,
+                   hedge: Optional[bool] = None,
                    api_url: str = API_EXTRACT) -> Any:
     """
-    Calls the /tavily/extract endpoint with up to 10 URLs.
+    Calls the /tavily/extract endpoint with up to 50 URLs (duplicates are
+    extracted once; lists over 10 are extracted in concurrent chunks).
+    `hedge` overrides TAVILY_HEDGE_ENABLED for this call.
     """
     if not isinstance(urls, list) or len(urls) == 0:
         return {"ok": False, "error": "missing_urls"}
-    if len(urls) > 10:
-        return {"ok": False, "error": "too_many_urls", "max_allowed": 10}
+    urls = list(dict.fromkeys(urls))
+    if len(urls) > MAX_EXTRACT_URLS:
+        return {"ok": False, "error": "too_many_urls", "max_allowed": MAX_EXTRACT_URLS}
 
-    payload = {"urls": urls}
-    return _post_json(api_url, payload)
+    payload = _with_shaping({"urls": urls}, fields, max_content_length)
+    return _hedged("extract", lambda: _post_json(api_url, payload), hedge)
 
 
 def tavily_crawl(url: str,
@@ -113,6 +316,8 @@ def tavily_crawl(url: str,
                  max_pages: int = 10,
                  include_subdomains: bool = False,
                  exclude_patterns: Optional[list] = None,
+                 fields: Optional[list] = None,
+                 max_content_length: Optional[int] = None,
                  api_url: str = API_CRAWL) -> Any:
     """
     Calls the /tavily/crawl endpoint.
@@ -139,7 +344,7 @@ def tavily_crawl(url: str,
         "include_subdomains": bool(include_subdomains),
         "exclude_patterns": exclude_patterns or []
     }
-    return _post_json(api_url, payload)
+    return _post_json(api_url, _with_shaping(payload, fields, max_content_length))
 
 
 def tavily_map(query: str,
@@ -147,6 +352,8 @@ def tavily_map(query: str,
                max_results: int = 5,
                include_domains: Optional[list] = None,
                exclude_domains: Optional[list] = None,
+               fields: Optional[list] = None,
+               max_content_length: Optional[int] = None,
                api_url: str = API_MAP) -> Any:
     """
     Calls the /tavily/map endpoint to get a concept map for the query.
@@ -164,7 +371,7 @@ def tavily_map(query: str,
         "include_domains": include_domains or [],
         "exclude_domains": exclude_domains or []
     }
-    return _post_json(api_url, payload)
+    return _post_json(api_url, _with_shaping(payload, fields, max_content_length))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+"""
+Comprueba que el cliente compartido de Bedrock AgentCore reutiliza conexiones.
+
+Levanta un endpoint local que responde como InvokeAgentRuntime (un stream
+text/event-stream con keep-alive) y lo invoca --requests veces:
+
+- como antes: un boto3.client('bedrock-agentcore') nuevo por mensaje
+- con app.api.v1.agent.invoke_agent (cliente de app.agentcore)
+
+e imprime cuántas conexiones TCP abrió cada variante y la latencia media.
+Sale con código 1 si el cliente compartido abre más de una conexión.
+
+Uso (desde backend/lambda_api):
+    python agentcore_client_check.py --requests 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+stub = {"connections": 0, "requests": 0}
+stub_lock = threading.Lock()
+
+
+class StubAgentCoreHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # Headers and body go out in separate writes: without this, Nagle + delayed ACK
+    # add ~40ms to every response on a reused connection
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with stub_lock:
+            stub["connections"] += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with stub_lock:
+            stub["requests"] += 1
+        events = [{"message": "Hola"}, {"message": ", soy el agente."}, {"message": "", "data": {}}]
+        body = "".join(f"data: {json.dumps(event)}\n\n" for event in events).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def reset_stub():
+    with stub_lock:
+        stub.update(connections=0, requests=0)
+
+
+def read_stream(response):
+    # Same read pattern as invoke_agent, so only client/connection setup differs
+    from app.sse import iter_sse_events
+    return list(iter_sse_events(response["response"]))
+
+
+def per_request_clients(requests, endpoint_url, agent_arn):
+    """Comportamiento anterior: un cliente nuevo por mensaje"""
+    import boto3
+    for i in range(requests):
+        client = boto3.client("bedrock-agentcore", endpoint_url=endpoint_url)
+        read_stream(client.invoke_agent_runtime(agentRuntimeArn=agent_arn,
+                                                runtimeSessionId=f"check-session-{i:033d}",
+                                                payload=b"{}"))
+
+
+def shared_client(requests):
+    from app.api.v1.agent import invoke_agent  # imported before measuring, see __main__
+
+    async def run():
+        for i in range(requests):
+            async for _ in invoke_agent(prompt="hola", session_id=f"check-session-{i:033d}",
+                                        user_id="check", memory_id="check"):
+                pass
+    asyncio.run(run())
+
+
+def measure(name, fn, requests):
+    reset_stub()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    with stub_lock:
+        connections, served = stub["connections"], stub["requests"]
+    print(f"{name:<22} requests={served:<4} connections={connections:<4} "
+          f"avg={elapsed / requests * 1000:.1f}ms/request")
+    return connections
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AgentCore client connection reuse check")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAgentCoreHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint_url = f"http://127.0.0.1:{server.server_port}"
+    agent_arn = "arn:aws:bedrock-agentcore:us-east-1:000000000000:runtime/check-agent"
+
+    os.environ["AGENTCORE_ENDPOINT_URL"] = endpoint_url
+    os.environ["ENVIRONMENT"] = "development"
+    os.environ["ARN_BEDROCK_AGENTCORE"] = agent_arn
+    os.environ.setdefault("AWS_REGION", "us-east-1")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "check")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "check")
+
+    import app.api.v1.agent  # noqa: F401 - keep FastAPI's import time out of the measurement
+
+    measure("client per request", lambda: per_request_clients(args.requests, endpoint_url, agent_arn), args.requests)
+    connections = measure("shared client", lambda: shared_client(args.requests), args.requests)
+    server.shutdown()
+    print("PASSED" if connections == 1 else "FAILED: the shared client opened more than one connection")
+    sys.exit(0 if connections == 1 else 1)
@@ -0,0 +1,49 @@
+"""
+Cliente de Bedrock AgentCore compartido por todo el proceso.
+
+Crear un cliente boto3 por mensaje paga en cada petición la construcción del
+cliente, la resolución del endpoint y un handshake TLS nuevo. Este módulo crea
+uno solo en el primer uso y lo reutiliza; boto3 permite usar un cliente desde
+varios hilos, y su pool de conexiones mantiene vivas las conexiones HTTPS.
+
+No depende de config.py para poder usarse también desde backend/utils.
+"""
+import os
+import threading
+import boto3
+from botocore.config import Config as BotocoreConfig
+
+AGENTCORE_REGION = os.getenv("AWS_REGION", "us-east-1")
+# Solo para pruebas contra un endpoint local (agentcore_client_check.py)
+AGENTCORE_ENDPOINT_URL = os.getenv("AGENTCORE_ENDPOINT_URL")
+
+AGENTCORE_CONNECT_TIMEOUT = 5  # segundos
+# Tiempo máximo sin recibir datos del stream: mientras el agente ejecuta
+# herramientas (imágenes, PDF) puede pasar más de un minuto sin eventos
+AGENTCORE_READ_TIMEOUT = int(os.getenv("AGENTCORE_READ_TIMEOUT", "300"))
+AGENTCORE_MAX_POOL_CONNECTIONS = int(os.getenv("AGENTCORE_MAX_POOL_CONNECTIONS", "10"))
+AGENTCORE_MAX_ATTEMPTS = 3  # solo reintenta la petición inicial, nunca un stream ya empezado
+
+AGENTCORE_CLIENT_CONFIG = BotocoreConfig(
+    region_name=AGENTCORE_REGION,
+    connect_timeout=AGENTCORE_CONNECT_TIMEOUT,
+    read_timeout=AGENTCORE_READ_TIMEOUT,
+    max_pool_connections=AGENTCORE_MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    retries={"max_attempts": AGENTCORE_MAX_ATTEMPTS, "mode": "adaptive"},
+)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_agentcore_client():
+    """Cliente 'bedrock-agentcore' del proceso, creado en el primer uso"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client("bedrock-agentcore",
+                                       config=AGENTCORE_CLIENT_CONFIG,
+                                       endpoint_url=AGENTCORE_ENDPOINT_URL)
+    return _client
@@ -1,71 +1,144 @@
-import boto3
 import os
 import uuid
+import asyncio
 import datetime
 import json
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Header, Query
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from app.models import MessageRequest, MessageResponse
 from app.dynamo import (
-    chats_table,
-    messages_table
+    get_chats_table,
+    get_messages_table
 )
-from config import Config
-
-config = Config()
+from app.agentcore import get_agentcore_client
+from app.sse import iter_sse_events, format_sse
+from app.stream_bridge import iterate_in_thread
+from app.coalesce import coalesce_events
+from app.turns import turns, get_turn_log, parse_event_id, ReplayExpired
+from config import get_config
 
 
 router = APIRouter()
 
+_background_tasks = set()
+
+def _abort_stream(body):
+    """Cut a read that is blocked waiting for the agent (called from the event loop)."""
+    raw = getattr(body, "_raw_stream", None)
+    try:
+        # urllib3 2.x: shutdown() wakes up a recv() blocked in another thread
+        raw.shutdown()
+    except Exception:
+        pass
+    body.close()
+
+
 async def invoke_agent(prompt: str,
                  session_id: str,
                  user_id: str,
                  memory_id: str,
-                 agent_arn:str = config.ARN_BEDROCK_AGENTCORE):
+                 agent_arn:str = None):
     
     """Invoke the Bedrock AgentCore agent with the given prompt."""
-    # Initialize the AgentCore client
-    agent_core_client = boto3.client('bedrock-agentcore')
+    agent_arn = agent_arn or get_config().ARN_BEDROCK_AGENTCORE
+    # Shared AgentCore client (reuses its connections across requests)
+    agent_core_client = get_agentcore_client()
     
     # Prepare the payload
     payload = json.dumps({"prompt": prompt,
                           "session_id": session_id,
                           "user_id": user_id,
                           "memory_id": memory_id}).encode()
-    
-    # Invoke the agent
-    response = agent_core_client.invoke_agent_runtime(
-        agentRuntimeArn=agent_arn,
-        runtimeSessionId=session_id,
-        payload=payload
-    )
-    print("Agent invoked, processing response...")
+    # Response body being read, so it can be closed if the client disconnects
+    stream = {}
 
-    
-    # Process and print the response
-    if "text/event-stream" in response.get("contentType", ""):
-        print("Streaming response received")
-        for line in response["response"].iter_lines(chunk_size=1):
-            # print(f"Raw line: {line}")
-            if line:
-                line = line.decode("utf-8")
-                # print(f"Received line: {line}")
-                if line.startswith("data: "):
-                    line = line[6:]
-                    yield json.loads(line)
-    else:
-        print("Non-streaming response received")
-        try:
-            events = []
-            for event in response.get("response", []):
-                events.append(event)
-        except Exception as e:
-            events = [f"Error reading EventStream: {e}"]
+    def read_events():
+        # Runs in a worker thread: both the invocation and the reads block
+        response = agent_core_client.invoke_agent_runtime(
+            agentRuntimeArn=agent_arn,
+            runtimeSessionId=session_id,
+            payload=payload
+        )
+        print("Agent invoked, processing response...")
+        stream["body"] = response["response"]
+
+        # Process and print the response
+        if "text/event-stream" in response.get("contentType", ""):
+            print("Streaming response received")
+            # Incremental parser: reads whatever has arrived (not one byte per read)
+            # and yields each event as soon as its frame is complete
+            try:
+                for event in iter_sse_events(response["response"]):
+                    yield json.loads(event.data)
+            except GeneratorExit:
+                # Consumer gone before the end: don't leave the connection half read
+                response["response"].close()
+                raise
+        else:
+            print("Non-streaming response received")
+            try:
+                events = []
+                for event in response.get("response", []):
+                    events.append(event)
+            except Exception as e:
+                events = [f"Error reading EventStream: {e}"]
+
+    def cancel():
+        if "body" in stream:
+            print(f"Client went away, closing agent stream for session {session_id}")
+            _abort_stream(stream["body"])
+
+    # Bounded queue between the reader thread and the event loop
+    async for event in iterate_in_thread(read_events, on_cancel=cancel):
+        yield event
+
+
+async def _create_chat(chats_table, chat_id: str, chat_name: str, user_id: str):
+    """Store a new chat without blocking the event loop."""
+    now = datetime.datetime.now().isoformat()
+    await asyncio.to_thread(chats_table.put_item, Item={
+        "chat_id": chat_id,
+        "chat_name": chat_name or "New Chat",
+        "user_id": user_id,
+        "created_at": now,
+        # Sort key of user_id-updated_at-index: chats without it are not listed
+        "updated_at": now
+    })
+
+
+async def _touch_chat(chats_table, chat_id: str):
+    """Move an existing chat to the top of its user's history (updated_at = now)."""
+    try:
+        await asyncio.to_thread(
+            chats_table.update_item,
+            Key={"chat_id": chat_id},
+            UpdateExpression="SET updated_at = :updated",
+            ConditionExpression="attribute_exists(chat_id)",
+            ExpressionAttributeValues={":updated": datetime.datetime.now().isoformat()}
+        )
+    except Exception as e:
+        # Not fatal for the turn (e.g. the chat was deleted)
+        print(f"Could not update chat {chat_id}: {e}")
+
+
+def _save_chat(chats_table, request: MessageRequest, chat_id: str, user_id: str):
+    """Create the chat if chat_id was not provided, otherwise bump its updated_at (concurrently with the agent)."""
+    if not request.chat_id:
+        return asyncio.create_task(_create_chat(chats_table, chat_id, request.chat_name, user_id))
+    if chats_table is not None:
+        # Not awaited by the turn: the history order can lag behind the answer
+        touch = asyncio.create_task(_touch_chat(chats_table, chat_id))
+        _background_tasks.add(touch)  # keep a reference until it finishes
+        touch.add_done_callback(_background_tasks.discard)
+    return None
 
 
 @router.post("/message_with_bot", response_model=MessageResponse)
 async def message_with_bot(request: MessageRequest):
     """Handle a message request and interact with the Bedrock AgentCore agent."""
+    chats_table = get_chats_table()
     print(f"Received request: {request} on the date {datetime.datetime.now().isoformat()}")
 
     if not request.query:
@@ -75,14 +148,8 @@ async def message_with_bot(request: MessageRequest):
     chat_id = request.chat_id or str(uuid.uuid4())
     user_id = request.user_id or "default_user"
     
-    # Create a new chat if chat_id was not provided
-    if not request.chat_id:
-        chats_table.put_item(Item={
-            "chat_id": chat_id,
-            "chat_name": request.chat_name or "New Chat",
-            "user_id": user_id,
-            "created_at": datetime.datetime.now().isoformat()
-        })
+    # Create a new chat if chat_id was not provided (concurrently with the agent)
+    create_chat = _save_chat(chats_table, request, chat_id, user_id)
     
     # # Store the user's message
     # messages_table.put_item(Item={
@@ -101,7 +168,7 @@ async def message_with_bot(request: MessageRequest):
             prompt=request.query,
             session_id=chat_id,
             user_id=user_id,
-            memory_id=config.MEMORY_ID_BEDROCK_AGENT_CORE
+            memory_id=get_config().MEMORY_ID_BEDROCK_AGENT_CORE
         ):
             # Process event - can be string or dict
             if isinstance(evt, str):
@@ -116,6 +183,9 @@ async def message_with_bot(request: MessageRequest):
             if chunk:
                 response_text += chunk
         
+        if create_chat:
+            await create_chat
+
         if not response_text:
             response_text = "No response from agent."
         
@@ -138,6 +208,10 @@ async def message_with_bot(request: MessageRequest):
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error invoking agent: {str(e)}")
+    finally:
+        # Stop waiting for the chat write; it still completes in its thread
+        if create_chat and not create_chat.done():
+            create_chat.cancel()
 
 
 def _parse_event(evt):
@@ -152,12 +226,26 @@ def _parse_event(evt):
 def _create_sse_message(msg_type: str, **data):
     """Create a Server-Sent Event message."""
     payload = {'type': msg_type, **data}
-    return f"data: {json.dumps(payload)}\n\n"
+    return format_sse(payload)
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+    "Content-Type": "text/event-stream; charset=utf-8"
+}
+
+
+def _sse_response(frames, background=None):
+    return StreamingResponse(frames, media_type="text/event-stream; charset=utf-8", headers=SSE_HEADERS,
+                             background=background)
 
 
 @router.post("/message_with_bot_stream")
 async def message_with_bot_stream(request: MessageRequest):
     """Handle a message request and stream the response in real-time chunks."""
+    chats_table = get_chats_table()
     print(f"Received streaming request: {request} on the date {datetime.datetime.now().isoformat()}")
 
     if not request.query:
@@ -167,58 +255,80 @@ async def message_with_bot_stream(request: MessageRequest):
     chat_id = request.chat_id or str(uuid.uuid4())
     user_id = request.user_id or "default_user"
     
-    # Create a new chat if chat_id was not provided
-    if not request.chat_id:
-        chats_table.put_item(Item={
-            "chat_id": chat_id,
-            "chat_name": request.chat_name or "New Chat",
-            "user_id": user_id,
-            "created_at": datetime.datetime.now().isoformat()
-        })
+    # Create a new chat if chat_id was not provided (concurrently with the agent)
+    create_chat = _save_chat(chats_table, request, chat_id, user_id)
     
-    async def event_generator():
-        """Generate Server-Sent Events with the agent's response chunks."""
+    async def run_turn(turn):
+        """Run the agent and publish its events to the turn (ids for Last-Event-ID resumes)."""
         try:
             # Send initial metadata
-            yield _create_sse_message('metadata', chat_id=chat_id, user_id=user_id)
+            turn.publish({'type': 'metadata', 'chat_id': chat_id, 'user_id': user_id, 'turn_id': turn.turn_id})
             
-            # Stream the agent's response
-            async for evt in invoke_agent(
+            # Stream the agent's response, text chunks merged by size and time into fewer frames
+            async for evt in coalesce_events(invoke_agent(
                 prompt=request.query,
                 session_id=chat_id,
                 user_id=user_id,
-                memory_id=config.MEMORY_ID_BEDROCK_AGENT_CORE
-            ):
+                memory_id=get_config().MEMORY_ID_BEDROCK_AGENT_CORE
+            )):
                 evt_dict = _parse_event(evt)
                 if not evt_dict:
                     continue
                 
                 chunk = evt_dict.get("message", "")
                 chunk_data = evt_dict.get("data", {})
+                document_id = images = None
                 if chunk_data:
                     document_id = chunk_data.get("document_id", None)
                     images = chunk_data.get("images", None)
                 if chunk:
-                    yield _create_sse_message('text', content=chunk)
+                    turn.publish({'type': 'text', 'content': chunk})
                 elif document_id:
-                    yield _create_sse_message('document', document=chunk_data)
+                    turn.publish({'type': 'document', 'document': chunk_data})
                 elif images:
-                    yield _create_sse_message('images', images=images)
+                    turn.publish({'type': 'images', 'images': images})
+
 
+            if create_chat:
+                await create_chat
 
             # Send completion signal
-            yield _create_sse_message('done', chat_id=chat_id)
+            turn.publish({'type': 'done', 'chat_id': chat_id})
             
         except Exception as e:
-            yield _create_sse_message('error', message=str(e))
+            turn.publish({'type': 'error', 'message': str(e)})
+        finally:
+            # Stop waiting for the chat write; it still completes in its thread
+            if create_chat and not create_chat.done():
+                create_chat.cancel()
     
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream; charset=utf-8",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-            "Content-Type": "text/event-stream; charset=utf-8"
-        }
-    )
+    # The turn runs on its own: if this connection drops, the client resumes it
+    # with /message_with_bot_stream/resume instead of running the agent again.
+    # The request stays open until the turn settles, even after a disconnect:
+    # on Lambda the invocation ends with it and the environment is frozen
+    turn = turns.start(chat_id, run_turn)
+    return _sse_response(turn.subscribe(), background=BackgroundTask(turn.settled))
+
+
+@router.get("/message_with_bot_stream/resume")
+async def resume_message_stream(last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+                                last_event_id_param: Optional[str] = Query(None, alias="last_event_id")):
+    """Resume a dropped stream after the last event received (replayed, then live; no new agent run)."""
+    try:
+        turn_id, seq = parse_event_id(last_event_id or last_event_id_param)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID (<turn_id>:<seq>) is required")
+
+    turn = turns.get(turn_id)
+    if turn:
+        try:
+            turn.frames_after(seq)
+        except ReplayExpired as e:
+            raise HTTPException(status_code=410, detail=str(e))
+        return _sse_response(turn.subscribe(seq))
+
+    # The turn may be running (or have run) on another instance
+    log = get_turn_log()
+    if log and await log.exists(turn_id):
+        return _sse_response(log.follow(turn_id, seq))
+    raise HTTPException(status_code=404, detail="Turn not found or expired")
@@ -1,14 +1,20 @@
 import boto3
 from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer
+from concurrent.futures import ThreadPoolExecutor
 import os
 import uuid
 import datetime
-from fastapi import APIRouter, HTTPException
-from app.models import Chat, ChatMessage
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.models import Chat, ChatPage
 from app.dynamo import (
-    chats_table,
-    messages_table
+    get_client,
+    get_chats_table,
+    get_messages_table
 )
+from app.pagination import PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor
+from app.api.v1.messages import get_latest_messages
 
 
 router = APIRouter()
@@ -21,43 +27,105 @@ ERROR_GET_CHAT = "Error al obtener el chat"
 ERROR_CREATE_CHAT = "Error al crear el chat"
 ERROR_DELETE_CHAT = "Error al eliminar el chat"
 MSG_CHAT_DELETED = "Chat eliminado exitosamente"
+ERROR_INVALID_CURSOR = "Cursor de paginación inválido"
 
-@router.get("", response_model=list[Chat], tags=["chats"])
-def get_chats():
-    """Obtener todos los chats (sin mensajes)"""
+# Solo los atributos que usa Chat (los mensajes se piden aparte)
+CHAT_PROJECTION = "chat_id, chat_name, user_id, created_at, updated_at"
+# Índice de los chats de un usuario ordenados por actividad (RANGE updated_at)
+USER_CHATS_INDEX = "user_id-updated_at-index"
+
+# Segmentos del scan paralelo del listado completo (uno por hilo)
+CHATS_SCAN_SEGMENTS = int(os.getenv("CHATS_SCAN_SEGMENTS", "4"))
+_scan_pool = ThreadPoolExecutor(max_workers=CHATS_SCAN_SEGMENTS)
+_deserializer = TypeDeserializer()
+
+
+def _scan_segment(table_name: str, segment: int, limit: int, start_key: dict):
+    # Cliente de bajo nivel: a diferencia del recurso, es seguro entre hilos
+    params = {
+        "TableName": table_name,
+        "Segment": segment,
+        "TotalSegments": CHATS_SCAN_SEGMENTS,
+        "Limit": limit,
+        "ProjectionExpression": CHAT_PROJECTION,
+    }
+    if start_key:
+        params["ExclusiveStartKey"] = start_key
+    response = get_client("dynamodb").scan(**params)
+    items = [{k: _deserializer.deserialize(v) for k, v in item.items()} for item in response.get("Items", [])]
+    return items, response.get("LastEvaluatedKey")
+
+
+def _decode_scan_cursor(cursor: Optional[str]) -> list:
+    """Posición de cada segmento: {} sin empezar, clave donde seguir, None terminado"""
+    if not cursor:
+        return [{} for _ in range(CHATS_SCAN_SEGMENTS)]
+    try:
+        positions = decode_cursor(cursor)
+    except ValueError:
+        positions = None
+    if (not isinstance(positions, list) or len(positions) != CHATS_SCAN_SEGMENTS
+            or not all(p is None or isinstance(p, dict) for p in positions)):
+        raise HTTPException(status_code=400, detail=ERROR_INVALID_CURSOR)
+    return positions
+
+
+@router.get("", response_model=ChatPage, tags=["chats"])
+def get_chats(limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """
+    Obtener todos los chats (sin mensajes), paginados con `limit` y `cursor`.
+    La tabla se recorre con un scan paralelo de CHATS_SCAN_SEGMENTS segmentos;
+    cada página reparte `limit` entre los segmentos que no han terminado.
+    El orden no está definido: para el historial de un usuario usar /user/{user_id}.
+    """
+    chats_table = get_chats_table()
     if chats_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
-    
+    positions = _decode_scan_cursor(cursor)
+
     try:
-        response = chats_table.scan()
-        # No cargar mensajes aquí, solo los metadatos del chat
+        active = [segment for segment, position in enumerate(positions) if position is not None]
+        share, extra = divmod(limit, len(active)) if active else (0, 0)
+        futures = {}
+        for i, segment in enumerate(active):
+            segment_limit = share + (1 if i < extra else 0)
+            if segment_limit:
+                futures[segment] = _scan_pool.submit(
+                    _scan_segment, chats_table.name, segment, segment_limit, positions[segment])
+
         chats = []
-        for item in response.get("Items", []):
-            # Agregar messages vacío o campo count
-            item["messages"] = []
-            chats.append(Chat(**item))
-        return chats
+        for segment, future in futures.items():
+            items, last_key = future.result()
+            positions[segment] = last_key
+            chats.extend(Chat(**item) for item in items)
+
+        next_cursor = encode_cursor(positions) if any(p is not None for p in positions) else None
+        return ChatPage(items=chats, next_cursor=next_cursor)
     except Exception as e:
         print(f"{ERROR_GET_CHATS}: {e}")
         raise HTTPException(status_code=500, detail=ERROR_GET_CHATS)
     
 @router.get("/{chat_id}", response_model=Chat, tags=["chats"])
-def get_chat(chat_id: str):
-    """Obtener un chat por su ID"""
+def get_chat(chat_id: str,
+             include_messages: bool = False,
+             messages_limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    """
+    Obtener un chat por su ID. Sin mensajes salvo con `include_messages`: en ese
+    caso incluye los últimos `messages_limit` y `messages_next_cursor` para
+    pedir los anteriores en /messages/chat/{chat_id}.
+    """
+    chats_table = get_chats_table()
+    messages_table = get_messages_table()
     if chats_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
     try:
-        response = chats_table.get_item(Key={"chat_id": chat_id})
+        response = chats_table.get_item(Key={"chat_id": chat_id}, ProjectionExpression=CHAT_PROJECTION)
         item = response.get("Item")
         if item:
-            if messages_table:
-                msg_response = messages_table.query(
-                    IndexName="chat_id-index",
-                    KeyConditionExpression=Key('chat_id').eq(chat_id)
-                )
-                # print(msg_response.get("Items", []))
-                messages = [ChatMessage(**msg) for msg in msg_response.get("Items", [])]
-                item["messages"] = messages
+            if include_messages and messages_table:
+                page = get_latest_messages(messages_table, chat_id, messages_limit)
+                item["messages"] = page.items
+                item["messages_next_cursor"] = page.next_cursor
             return Chat(**item)
         raise HTTPException(status_code=404, detail=ERROR_CHAT_NOT_FOUND)
     except HTTPException:
@@ -66,29 +134,47 @@ def get_chat(chat_id: str):
         print(f"{ERROR_GET_CHAT}: {e}")
         raise HTTPException(status_code=500, detail=ERROR_GET_CHAT)
     
-@router.get("/user/{user_id}", response_model=list[Chat], tags=["chats"])
-def get_chats_by_user(user_id: str):
-    """Obtener todos los chats de un usuario específico (sin mensajes)"""
+@router.get("/user/{user_id}", response_model=ChatPage, tags=["chats"])
+def get_chats_by_user(user_id: str,
+                      limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                      cursor: Optional[str] = None):
+    """
+    Obtener los chats de un usuario (sin mensajes), del más reciente al más
+    antiguo por updated_at. Cada página es una sola consulta de `limit` chats al
+    índice; `next_cursor` pide la siguiente.
+    """
+    chats_table = get_chats_table()
     if chats_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
-    
     try:
-        response = chats_table.query(
-            IndexName="user_id-index",
-            KeyConditionExpression=Key('user_id').eq(user_id)
-        )
-        chats = []
-        for item in response.get("Items", []):
-            # No cargar mensajes aquí, solo los metadatos del chat
-            item["messages"] = []
-            chats.append(Chat(**item))
-        return chats
+        start_key = decode_cursor(cursor)
+    except ValueError:
+        start_key = None
+    # El cursor tiene que venir de una página de este mismo usuario
+    if cursor and not (isinstance(start_key, dict) and start_key.get("user_id") == user_id):
+        raise HTTPException(status_code=400, detail=ERROR_INVALID_CURSOR)
+
+    try:
+        params = {
+            "IndexName": USER_CHATS_INDEX,
+            "KeyConditionExpression": Key('user_id').eq(user_id),
+            "ScanIndexForward": False,
+            "Limit": limit,
+            "ProjectionExpression": CHAT_PROJECTION,
+        }
+        if start_key:
+            params["ExclusiveStartKey"] = start_key
+        response = chats_table.query(**params)
+        # No cargar mensajes aquí, solo los metadatos del chat
+        chats = [Chat(**item) for item in response.get("Items", [])]
+        return ChatPage(items=chats, next_cursor=encode_cursor(response.get("LastEvaluatedKey")))
     except Exception as e:
         print(f"{ERROR_GET_CHATS}: {e}")
         raise HTTPException(status_code=500, detail=ERROR_GET_CHATS)
 
 @router.post("", response_model=Chat, tags=["chats"])
 def create_chat(chat_name: str, user_id: str):
+    chats_table = get_chats_table()
     if chats_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
 
@@ -109,6 +195,7 @@ def create_chat(chat_name: str, user_id: str):
     
 @router.delete("/{chat_id}", tags=["chats"])
 def delete_chat(chat_id: str):
+    chats_table = get_chats_table()
     if chats_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
     try:
@@ -122,6 +209,7 @@ def delete_chat(chat_id: str):
 @router.patch("/{chat_id}", response_model=Chat, tags=["chats"])
 def update_chat_name(chat_id: str, chat_name: str):
     """Actualizar el nombre de un chat"""
+    chats_table = get_chats_table()
     if chats_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
     
@@ -5,10 +5,11 @@ import uuid
 import datetime
 from typing import Optional
 from fastapi import APIRouter, HTTPException
-from config import config
+from config import get_config
 from app.models import Document
 from app.dynamo import (
-    documents_table
+    get_client,
+    get_documents_table
 )
 
 
@@ -17,17 +18,12 @@ router = APIRouter()
 PRESIGNED_URL_EXPIRATION = 3600  # 1 hora
 
 
-# Cliente S3 para generar presigned URLs
-s3_client = boto3.client('s3')
-S3_BUCKET = config.S3_BUCKET_NAME
-
-
 def generate_presigned_url(s3_key: str) -> Optional[str]:
     """Genera un presigned URL para un archivo en S3"""
     try:
-        url = s3_client.generate_presigned_url(
+        url = get_client('s3').generate_presigned_url(
             'get_object',
-            Params={'Bucket': S3_BUCKET, 'Key': s3_key},
+            Params={'Bucket': get_config().S3_BUCKET_NAME, 'Key': s3_key},
             ExpiresIn=PRESIGNED_URL_EXPIRATION
         )
         # print(f"Presigned URL generado para {s3_key}: {url}")
@@ -56,6 +52,7 @@ MSG_DOCUMENT_DELETED = "Documento eliminado exitosamente"
 @router.get("/chat/{chat_id}", response_model=list[Document], tags=["documents"])
 def get_documents(chat_id: str):
     """Obtener documentos por ID de chat"""
+    documents_table = get_documents_table()
     if documents_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
     try:
@@ -76,6 +73,7 @@ def get_documents(chat_id: str):
 @router.get('/{document_id}', response_model=Document, tags=["documents"])
 def get_document(document_id: str):
     """Obtener un documento por ID"""
+    documents_table = get_documents_table()
     if documents_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
     try:
@@ -96,6 +94,7 @@ def get_document(document_id: str):
 @router.get('/user/{user_id}', response_model=list[Document], tags=["documents"])
 def get_documents_by_user(user_id: str):
     """Obtener documentos por ID de usuario"""
+    documents_table = get_documents_table()
     if documents_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
     try:
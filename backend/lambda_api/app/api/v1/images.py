@@ -7,20 +7,19 @@ from typing import Optional
 from fastapi import APIRouter, HTTPException
 from app.models import Image
 from app.dynamo import (
-    images_table
+    get_client,
+    get_images_table
 )
 
 router = APIRouter()
 
-# Cliente S3 para generar presigned URLs
-s3_client = boto3.client('s3')
 PRESIGNED_URL_EXPIRATION = 3600  # 1 hora
 
 
 def generate_presigned_url(s3_bucket: str, s3_key: str) -> Optional[str]:
     """Genera un presigned URL para una imagen en S3"""
     try:
-        url = s3_client.generate_presigned_url(
+        url = get_client('s3').generate_presigned_url(
             'get_object',
             Params={'Bucket': s3_bucket, 'Key': s3_key},
             ExpiresIn=PRESIGNED_URL_EXPIRATION
@@ -33,7 +32,7 @@ def generate_presigned_url(s3_bucket: str, s3_key: str) -> Optional[str]:
 
 
 def add_presigned_url_to_image(image_dict: dict) -> dict:
-    """Agrega un presigned URL fresco a la imagen"""
+    """Agrega presigned URLs frescos a la imagen y a sus derivados WebP"""
     if image_dict.get('s3_bucket') and image_dict.get('s3_key'):
         presigned_url = generate_presigned_url(
             image_dict['s3_bucket'], 
@@ -41,6 +40,12 @@ def add_presigned_url_to_image(image_dict: dict) -> dict:
         )
         if presigned_url:
             image_dict['image_presigned_url'] = presigned_url
+        for derivative in ('thumbnail', 'medium'):
+            derivative_key = image_dict.get(f'{derivative}_s3_key')
+            if derivative_key:
+                derivative_url = generate_presigned_url(image_dict['s3_bucket'], derivative_key)
+                if derivative_url:
+                    image_dict[f'{derivative}_presigned_url'] = derivative_url
     return image_dict
 
 # Constantes de mensajes de error
@@ -54,6 +59,7 @@ MSG_DOCUMENT_DELETED = "Imagen eliminada exitosamente"
 @router.get("/chat/{chat_id}", response_model=list[Image], tags=["images"])
 def get_images_by_chat(chat_id: str):
     """Obtener imágenes por ID de chat"""
+    images_table = get_images_table()
     if images_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
     try:
@@ -74,6 +80,7 @@ def get_images_by_chat(chat_id: str):
 @router.get('/{image_id}', response_model=Image, tags=["images"])
 def get_image_by_id(image_id: str):
     """Obtener una imagen por su ID"""
+    images_table = get_images_table()
     if images_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
     try:
@@ -94,6 +101,7 @@ def get_image_by_id(image_id: str):
 @router.get('/user/{user_id}', response_model=list[Image], tags=["images"])
 def get_images_by_user(user_id: str):
     """Obtener imágenes por ID de usuario"""
+    images_table = get_images_table()
     if images_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
     try:
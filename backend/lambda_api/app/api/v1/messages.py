@@ -1,13 +1,16 @@
 import boto3
+from boto3.dynamodb.conditions import Key
 import os
 import uuid
 import datetime
-from fastapi import APIRouter, HTTPException
-from app.models import Chat, ChatMessage
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.models import Chat, ChatMessage, MessagePage
 from app.dynamo import (
-    chats_table,
-    messages_table
+    get_chats_table,
+    get_messages_table
 )
+from app.pagination import PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor
 
 
 router = APIRouter()
@@ -18,21 +21,56 @@ ERROR_GET_MESSAGES = "Error al obtener los mensajes"
 ERROR_CREATE_MESSAGE = "Error al crear el mensaje"
 ERROR_VERIFY_CHAT = "Error al verificar el chat"
 ERROR_CHAT_NOT_FOUND = "Chat no encontrado"
+ERROR_INVALID_CURSOR = "Cursor de paginación inválido"
 
+# Mensajes de un chat ordenados por fecha (RANGE created_at)
+CHAT_MESSAGES_INDEX = "chat_id-created_at-index"
 
-@router.get("/chat/{chat_id}", response_model=list[ChatMessage], tags=["messages"])
-def get_messages_by_chat(chat_id: str):
-    """Obtener todos los mensajes de un chat específico"""
+
+def get_latest_messages(messages_table, chat_id: str, limit: int, cursor: Optional[str] = None) -> MessagePage:
+    """
+    Ventana de `limit` mensajes de un chat: los más recientes, o los anteriores
+    al cursor. Es una sola consulta al índice, del más nuevo hacia atrás, así
+    que abrir un chat largo lee siempre lo mismo. Devuelve los mensajes en orden
+    cronológico y el cursor de los anteriores (None si no hay más).
+    """
+    try:
+        start_key = decode_cursor(cursor)
+    except ValueError:
+        start_key = None
+    # El cursor tiene que venir de una página de este mismo chat
+    if cursor and not (isinstance(start_key, dict) and start_key.get("chat_id") == chat_id):
+        raise HTTPException(status_code=400, detail=ERROR_INVALID_CURSOR)
+
+    params = {
+        "IndexName": CHAT_MESSAGES_INDEX,
+        "KeyConditionExpression": Key('chat_id').eq(chat_id),
+        "ScanIndexForward": False,
+        "Limit": limit,
+    }
+    if start_key:
+        params["ExclusiveStartKey"] = start_key
+    response = messages_table.query(**params)
+    messages = [ChatMessage(**msg) for msg in reversed(response.get("Items", []))]
+    return MessagePage(items=messages, next_cursor=encode_cursor(response.get("LastEvaluatedKey")))
+
+
+@router.get("/chat/{chat_id}", response_model=MessagePage, tags=["messages"])
+def get_messages_by_chat(chat_id: str,
+                         limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                         cursor: Optional[str] = None):
+    """
+    Obtener los últimos `limit` mensajes de un chat (en orden cronológico).
+    Con el `next_cursor` de la respuesta se piden los anteriores.
+    """
+    messages_table = get_messages_table()
     if messages_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
     
     try:
-        response = messages_table.query(
-            IndexName="chat_id-index",
-            KeyConditionExpression=boto3.dynamodb.conditions.Key('chat_id').eq(chat_id)
-        )
-        messages = [ChatMessage(**msg) for msg in response.get("Items", [])]
-        return messages
+        return get_latest_messages(messages_table, chat_id, limit, cursor)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"{ERROR_GET_MESSAGES}: {e}")
         raise HTTPException(status_code=500, detail=ERROR_GET_MESSAGES)
@@ -40,6 +78,8 @@ def get_messages_by_chat(chat_id: str):
 @router.post('', response_model=ChatMessage, tags=["messages"])
 def add_new_message(message: ChatMessage):
     """Crear un nuevo mensaje"""
+    chats_table = get_chats_table()
+    messages_table = get_messages_table()
     if messages_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
 
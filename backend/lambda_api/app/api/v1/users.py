@@ -4,7 +4,7 @@ import uuid
 import datetime
 from fastapi import APIRouter, HTTPException
 from app.models import User
-from app.dynamo import (users_table, dynamodb)
+from app.dynamo import (get_users_table, get_dynamodb)
 
 router = APIRouter(
     prefix="/users",
@@ -24,6 +24,7 @@ MSG_USER_DELETED = "Usuario eliminado correctamente"
 @router.get('', tags=["users"])
 async def get_users():
     """Obtener todos los usuarios"""
+    users_table = get_users_table()
     if users_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
     try:
@@ -36,6 +37,7 @@ async def get_users():
 @router.get("/{user_id}", tags=["users"])
 async def get_user(user_id: str):
     """Obtener un usuario por ID"""
+    users_table = get_users_table()
     if users_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
     try:
@@ -53,6 +55,7 @@ async def get_user(user_id: str):
 @router.post("/users", tags=["users"])
 async def create_user(name: str, email: str):
     """Crear un nuevo usuario"""
+    users_table = get_users_table()
     if users_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
 
@@ -72,6 +75,7 @@ async def create_user(name: str, email: str):
 @router.delete("/{user_id}", tags=["users"])
 async def delete_user(user_id: str):
     """Eliminar un usuario por ID"""
+    users_table = get_users_table()
     if users_table is None:
         raise HTTPException(status_code=500, detail=ERROR_TABLE_NOT_CONFIGURED)
     try:
@@ -82,7 +86,7 @@ async def delete_user(user_id: str):
         if response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 200:
             return {"message": MSG_USER_DELETED}
         raise HTTPException(status_code=404, detail=ERROR_USER_NOT_FOUND)
-    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+    except get_dynamodb().meta.client.exceptions.ConditionalCheckFailedException:
         raise HTTPException(status_code=404, detail=ERROR_USER_NOT_FOUND)
     except Exception as e:
         print(f"{ERROR_DELETE_USER}: {e}")
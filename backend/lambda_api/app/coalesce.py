@@ -0,0 +1,116 @@
+"""
+Agrupa los fragmentos de texto del agente en menos frames SSE, por tamaño y tiempo.
+
+Cada evento de texto que llega de AgentCore se convertía en su propio frame
+`data: {...}\\n\\n` (con su json.dumps) hacia el navegador. `coalesce_events`
+junta los fragmentos de texto consecutivos y los entrega como un solo evento
+cuando hay `max_bytes` acumulados o pasaron `max_delay_ms` desde el primero,
+lo que ocurra antes. El temporizador corre aunque no lleguen más fragmentos,
+así que ningún texto espera más de `max_delay_ms`. Los eventos que no son
+texto (documentos, imágenes) vacían el buffer y pasan sin cambios.
+"""
+import asyncio
+import os
+from typing import Any, AsyncIterator, Dict
+
+STREAM_COALESCE_BYTES = int(os.getenv("STREAM_COALESCE_BYTES", "512"))
+STREAM_COALESCE_MS = float(os.getenv("STREAM_COALESCE_MS", "30"))  # 0 desactiva el agrupado
+# Eventos en espera entre el origen y el consumidor: con un consumidor lento el
+# origen espera (y con él la cola acotada de stream_bridge) en lugar de acumular
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "64"))
+
+
+def _text_of(event: Dict[str, Any]):
+    # Solo se agrupan fragmentos de texto: {"message": "..."} sin otras claves
+    if isinstance(event, dict) and len(event) == 1 and isinstance(event.get("message"), str):
+        return event["message"]
+    return None
+
+
+async def coalesce_events(events: AsyncIterator[Dict[str, Any]],
+                          max_bytes: int = STREAM_COALESCE_BYTES,
+                          max_delay_ms: float = STREAM_COALESCE_MS,
+                          max_queued: int = STREAM_QUEUE_SIZE) -> AsyncIterator[Dict[str, Any]]:
+    """Entregar `events` con los fragmentos de texto consecutivos agrupados"""
+    if max_delay_ms <= 0:
+        async for event in events:
+            yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    # Una sola tarea por stream llena la cola y el temporizador deja una marca en la
+    # misma cola: no se espera nada con timeout (ni tarea ni wait por fragmento).
+    # Los eventos ocupan como mucho `max_queued` plazas (semáforo); la
+    # marca del temporizador no ocupa plaza, así que nunca espera
+    queue: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max_queued)
+
+    async def pump():
+        try:
+            async for event in events:
+                await slots.acquire()
+                queue.put_nowait(event)
+        except Exception as e:
+            queue.put_nowait(_Failure(e))
+        else:
+            queue.put_nowait(_DONE)
+
+    pump_task = asyncio.ensure_future(pump())
+    parts, size, timer, generation = [], 0, None, 0
+    try:
+        while True:
+            event = await queue.get()
+            if isinstance(event, _Flush):
+                if event.generation == generation and parts:
+                    yield _flush(parts)
+                    parts, size, timer, generation = [], 0, None, generation + 1
+                continue
+            if event is _DONE:
+                break
+            if isinstance(event, _Failure):
+                raise event.error
+            slots.release()
+
+            text = _text_of(event)
+            if text is None:
+                if parts:
+                    yield _flush(parts)
+                    parts, size, timer, generation = [], 0, _cancel(timer), generation + 1
+                yield event
+                continue
+            if not parts:
+                timer = loop.call_later(max_delay_ms / 1000, queue.put_nowait, _Flush(generation))
+            parts.append(text)
+            size += len(text.encode("utf-8"))
+            if size >= max_bytes:
+                yield _flush(parts)
+                parts, size, timer, generation = [], 0, _cancel(timer), generation + 1
+        if parts:
+            yield _flush(parts)
+    finally:
+        # Se cortó antes de terminar (p. ej. el cliente se desconectó): detener también el origen
+        _cancel(timer)
+        pump_task.cancel()
+
+
+class _Flush:
+    def __init__(self, generation: int):
+        self.generation = generation
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_DONE = object()
+
+
+def _flush(parts):
+    return {"message": "".join(parts)}
+
+
+def _cancel(timer):
+    if timer is not None:
+        timer.cancel()
+    return None
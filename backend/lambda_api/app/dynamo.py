@@ -1,17 +1,58 @@
 """
 Configuración de DynamoDB usando la configuración centralizada.
 Este módulo carga los secretos desde AWS Secrets Manager (producción) o .env (desarrollo).
+
+El recurso, los clientes y las tablas se crean en el primer uso y se reutilizan
+(no al importar), para que el arranque en frío de la Lambda no los pague todos
+antes de atender la primera petición.
 """
+from functools import lru_cache
 import boto3
-from config import config
-
-# Obtener el recurso de DynamoDB
-dynamodb = boto3.resource('dynamodb', region_name=config.aws_region)
-
-# Inicializar las tablas (pueden ser None si no están configuradas)
-chats_table = dynamodb.Table(config.DYNAMO_CHATS_TABLE_NAME) if config.DYNAMO_CHATS_TABLE_NAME else None
-users_table = dynamodb.Table(config.DYNAMO_USERS_TABLE_NAME) if config.DYNAMO_USERS_TABLE_NAME else None
-usernames_table = dynamodb.Table(config.DYNAMO_USERNAMES_TABLE_NAME) if config.DYNAMO_USERNAMES_TABLE_NAME else None
-messages_table = dynamodb.Table(config.DYNAMO_MESSAGES_TABLE_NAME) if config.DYNAMO_MESSAGES_TABLE_NAME else None
-documents_table = dynamodb.Table(config.DYNAMO_DOCUMENTS_TABLE_NAME) if config.DYNAMO_DOCUMENTS_TABLE_NAME else None
-images_table = dynamodb.Table(config.DYNAMO_IMAGES_TABLE_NAME) if config.DYNAMO_IMAGES_TABLE_NAME else None
\ No newline at end of file
+from config import get_config
+
+
+@lru_cache(maxsize=None)
+def get_dynamodb():
+    """Recurso de DynamoDB"""
+    return boto3.resource('dynamodb', region_name=get_config().aws_region)
+
+
+@lru_cache(maxsize=None)
+def get_client(service_name: str):
+    """Cliente boto3 compartido por servicio (p. ej. 's3')"""
+    return boto3.client(service_name, region_name=get_config().aws_region)
+
+
+@lru_cache(maxsize=None)
+def _get_table(config_key: str):
+    # Puede ser None si la tabla no está configurada
+    table_name = getattr(get_config(), config_key, None)
+    return get_dynamodb().Table(table_name) if table_name else None
+
+
+def get_chats_table():
+    return _get_table("DYNAMO_CHATS_TABLE_NAME")
+
+
+def get_users_table():
+    return _get_table("DYNAMO_USERS_TABLE_NAME")
+
+
+def get_usernames_table():
+    return _get_table("DYNAMO_USERNAMES_TABLE_NAME")
+
+
+def get_messages_table():
+    return _get_table("DYNAMO_MESSAGES_TABLE_NAME")
+
+
+def get_documents_table():
+    return _get_table("DYNAMO_DOCUMENTS_TABLE_NAME")
+
+
+def get_images_table():
+    return _get_table("DYNAMO_IMAGES_TABLE_NAME")
+
+
+def get_stream_events_table():
+    return _get_table("DYNAMO_STREAM_EVENTS_TABLE_NAME")
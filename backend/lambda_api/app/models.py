@@ -36,6 +36,18 @@ class Chat(BaseModel):
     messages: Optional[List[ChatMessage]] = Field(default_factory=list)
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
+    # Con include_messages: cursor de los mensajes anteriores a los incluidos
+    messages_next_cursor: Optional[str] = None
+
+class ChatPage(BaseModel):
+    items: List[Chat]
+    # Cursor de la página siguiente (None en la última página)
+    next_cursor: Optional[str] = None
+
+class MessagePage(BaseModel):
+    # En orden cronológico; next_cursor pide los mensajes anteriores
+    items: List[ChatMessage]
+    next_cursor: Optional[str] = None
 
 class User(BaseModel):
     user_id: str
@@ -51,6 +63,11 @@ class Image(BaseModel):
     description: Optional[str] = None
     created_at: str
     image_presigned_url: Optional[str] = None
+    # WebP derivatives for galleries (thumbnail) and previews/reports (medium)
+    thumbnail_s3_key: Optional[str] = None
+    medium_s3_key: Optional[str] = None
+    thumbnail_presigned_url: Optional[str] = None
+    medium_presigned_url: Optional[str] = None
 
 
 class MessageRequest(BaseModel):
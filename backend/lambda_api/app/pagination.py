@@ -0,0 +1,43 @@
+"""
+Cursores opacos para paginar consultas de DynamoDB.
+
+El cursor es la posición de DynamoDB donde terminó la página (LastEvaluatedKey
+o, en un scan segmentado, una por segmento) serializada en JSON y codificada en
+base64 url-safe. El cliente no lo interpreta: lo devuelve tal cual para pedir
+la página siguiente, y `next_cursor` es null en la última página.
+"""
+import base64
+import binascii
+import json
+import os
+from decimal import Decimal
+from typing import Any, Optional
+
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "20"))
+MAX_PAGE_SIZE = 100
+
+
+def _json_default(value):
+    # Las claves numéricas de boto3 llegan como Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(position: Any) -> Optional[str]:
+    """Posición de DynamoDB -> cursor (None si no hay más páginas)"""
+    if not position:
+        return None
+    raw = json.dumps(position, separators=(",", ":"), default=_json_default).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Any:
+    """Cursor -> posición de DynamoDB; ValueError si el cursor no es válido"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return json.loads(raw, parse_int=Decimal, parse_float=Decimal)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
@@ -0,0 +1,112 @@
+"""
+Parser incremental de Server-Sent Events para los streams de AgentCore.
+
+Lee el stream en bloques grandes pero sin esperar a llenarlos: `read1()`
+devuelve lo que ya llegó por la red (hasta READ_CHUNK_SIZE bytes), así que un
+evento se entrega en cuanto su frame está completo en el buffer. Sigue el
+formato de la especificación de SSE:
+
+- líneas terminadas en \\n, \\r\\n o \\r
+- varios campos `data:` en un mismo evento se unen con \\n
+- comentarios (líneas que empiezan con `:`) ignorados
+- campos `event`, `id` y `retry`
+"""
+import json
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class SSEEvent(NamedTuple):
+    data: str
+    event: str = "message"
+    id: Optional[str] = None
+    retry: Optional[int] = None
+
+
+class SSEParser:
+    """Convierte bytes del stream, en trozos de cualquier tamaño, en eventos completos"""
+
+    def __init__(self):
+        self._buffer = b""
+        self._data: List[str] = []
+        self._event = ""
+        self._last_event_id: Optional[str] = None
+        self._retry: Optional[int] = None
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """Agregar bytes al buffer y devolver los eventos que ya están completos"""
+        buffer = self._buffer + chunk if self._buffer else chunk
+        end = max(buffer.rfind(b"\n"), buffer.rfind(b"\r"))
+        # Un \r al final puede ser la primera mitad de \r\n: esperar al siguiente trozo
+        if end == len(buffer) - 1 and buffer.endswith(b"\r"):
+            end = max(buffer.rfind(b"\n", 0, end), buffer.rfind(b"\r", 0, end))
+        if end < 0:
+            self._buffer = buffer
+            return []
+        self._buffer = buffer[end + 1:]
+        return self._process_lines(buffer[:end + 1].splitlines())
+
+    def close(self) -> List[SSEEvent]:
+        """Fin del stream: procesar lo pendiente y entregar el último evento aunque no termine en línea vacía"""
+        lines = self._buffer.splitlines() + [b""]
+        self._buffer = b""
+        return self._process_lines(lines)
+
+    def _process_lines(self, lines: List[bytes]) -> List[SSEEvent]:
+        events = []
+        for line in lines:
+            if not line:
+                if self._data:
+                    events.append(SSEEvent("\n".join(self._data), self._event or "message",
+                                           self._last_event_id, self._retry))
+                self._data = []
+                self._event = ""
+                continue
+            if line[0] == 58:  # b":" -> comentario
+                continue
+            field, _, value = line.partition(b":")
+            if value[:1] == b" ":
+                value = value[1:]
+            if field == b"data":
+                self._data.append(value.decode("utf-8"))
+            elif field == b"event":
+                self._event = value.decode("utf-8")
+            elif field == b"id":
+                if b"\0" not in value:
+                    self._last_event_id = value.decode("utf-8")
+            elif field == b"retry":
+                if value.isdigit():
+                    self._retry = int(value)
+        return events
+
+
+def _chunk_reader(stream, chunk_size: int) -> Callable[[], bytes]:
+    """
+    Función que devuelve el siguiente bloque disponible del stream. Para un
+    StreamingBody de botocore usa read1() de la respuesta urllib3 que envuelve.
+    """
+    raw = getattr(stream, "_raw_stream", stream)
+    read1 = getattr(raw, "read1", None)
+    if read1 is not None:
+        return lambda: read1(chunk_size)
+    # Sin lecturas parciales, leer de a un byte es la única forma de no bloquear
+    return lambda: stream.read(1)
+
+
+def iter_sse_events(stream, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[SSEEvent]:
+    """Iterar los eventos de un stream SSE a medida que llegan"""
+    parser = SSEParser()
+    read = _chunk_reader(stream, chunk_size)
+    while True:
+        chunk = read()
+        if not chunk:
+            break
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def format_sse(payload: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    """Frame SSE con `payload` como JSON y, si se indica, su `id` (para Last-Event-ID)"""
+    frame = f"data: {json.dumps(payload)}\n\n"
+    return f"id: {event_id}\n{frame}" if event_id is not None else frame
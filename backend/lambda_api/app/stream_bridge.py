@@ -0,0 +1,107 @@
+"""
+Puente entre iteradores bloqueantes (streams de boto3) y el event loop de FastAPI.
+
+Consumir un StreamingBody dentro de una corrutina bloquea el event loop: mientras
+un stream espera datos del agente, ninguna otra petición del worker avanza.
+`iterate_in_thread` consume el iterador en un hilo propio y pasa los elementos
+por un asyncio.Queue acotado:
+
+- backpressure: si el cliente lee más lento de lo que llega el stream, el hilo
+  espera a que haya espacio en la cola en lugar de acumular en memoria
+- cancelación: si el consumidor deja de iterar (p. ej. el cliente se
+  desconectó y Starlette cancela la respuesta), el hilo se detiene y se llama
+  a `on_cancel` para cortar la lectura que esté bloqueada
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+from typing import AsyncIterator, Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "64"))
+# Cada cuánto revisa el hilo si el consumidor canceló mientras espera espacio en la cola
+PUT_POLL_SECONDS = 0.5
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+async def iterate_in_thread(make_iterator: Callable[[], Iterator[T]],
+                            on_cancel: Optional[Callable[[], None]] = None,
+                            maxsize: int = STREAM_QUEUE_SIZE) -> AsyncIterator[T]:
+    """
+    Iterar `make_iterator()` en un hilo propio sin bloquear el event loop.
+
+    Un hilo por stream y no el executor por defecto (asyncio.to_thread): los
+    streams del agente duran minutos y agotarían sus pocos workers.
+    Las excepciones del iterador se relanzan en el consumidor.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        # Bloquea el hilo mientras la cola está llena; False si el consumidor se fue.
+        # Se espera siempre al mismo put: cancelarlo y reintentar podía entregar
+        # el elemento dos veces si ya estaba en la cola al cancelar
+        try:
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        except RuntimeError:  # el event loop ya se cerró
+            return False
+        while not stopped.is_set() and not loop.is_closed():
+            try:
+                future.result(timeout=PUT_POLL_SECONDS)
+                return True
+            except concurrent.futures.TimeoutError:
+                continue
+            except concurrent.futures.CancelledError:
+                return False
+        # El consumidor ya no lee: da igual si el elemento llegó a la cola
+        future.cancel()
+        return False
+
+    def produce():
+        iterator = None
+        try:
+            iterator = make_iterator()
+            for item in iterator:
+                if not put(item):
+                    return
+        except BaseException as e:
+            if not stopped.is_set():
+                put(_Failure(e))
+            return
+        finally:
+            # Cerrar el generador si se abandona a mitad (libera su conexión)
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+        put(_DONE)
+
+    threading.Thread(target=produce, name="stream-bridge", daemon=True).start()
+
+    finished = False
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                finished = True
+                return
+            if isinstance(item, _Failure):
+                finished = True
+                raise item.error
+            yield item
+    finally:
+        if not finished:
+            stopped.set()
+            if on_cancel is not None:
+                try:
+                    on_cancel()
+                except Exception as e:
+                    print(f"[stream-bridge] on_cancel failed: {e}")
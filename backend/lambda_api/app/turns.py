@@ -0,0 +1,332 @@
+"""
+Turnos del agente desacoplados de la conexión HTTP, para reanudar streams SSE.
+
+Cada mensaje a message_with_bot_stream inicia un turno que corre en su propia
+tarea y publica sus eventos con ids monótonos (`<turn_id>:<seq>`) en un buffer
+acotado. La respuesta HTTP solo se suscribe al turno: si la conexión se cae, el
+navegador vuelve con `Last-Event-ID` y recibe los eventos que se perdió y luego
+los nuevos, sin volver a ejecutar el agente.
+
+- Si nadie está suscrito durante STREAM_RESUME_GRACE_SECONDS, el turno se
+  cancela (el cliente no volvió) y se corta el stream de AgentCore; el agente
+  ve cerrarse la conexión y detiene su propio trabajo. `turns.stats` cuenta los
+  turnos por resultado.
+- Con DYNAMO_STREAM_EVENTS_TABLE_NAME configurada, los eventos también se
+  escriben en DynamoDB: en Lambda la reconexión puede llegar a otra instancia,
+  que sigue el turno leyendo la tabla y lo mantiene vivo renovando una marca
+  (`watched_until`) que la instancia de origen consulta antes de cancelar.
+- En Lambda la invocación termina con la petición y el entorno se congela: la
+  petición que inicia el turno no termina hasta `Turn.settled()` (el turno
+  acabó o se abandonó), aunque su cliente se haya desconectado. Si no, el turno
+  dejaría de leer AgentCore y de escribir la tabla, y la otra instancia
+  seguiría una tabla parada.
+"""
+import asyncio
+import itertools
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from decimal import Decimal
+from functools import lru_cache
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from boto3.dynamodb.conditions import Key
+
+from app.sse import format_sse
+
+STREAM_REPLAY_EVENTS = int(os.getenv("STREAM_REPLAY_EVENTS", "2000"))  # por turno
+STREAM_REPLAY_TURNS = int(os.getenv("STREAM_REPLAY_TURNS", "200"))  # turnos terminados que se conservan
+STREAM_REPLAY_TTL_SECONDS = int(os.getenv("STREAM_REPLAY_TTL_SECONDS", "900"))
+STREAM_RESUME_GRACE_SECONDS = float(os.getenv("STREAM_RESUME_GRACE_SECONDS", "30"))
+STREAM_REPLAY_POLL_SECONDS = float(os.getenv("STREAM_REPLAY_POLL_SECONDS", "0.5"))
+# Cada cuánto renueva la marca `watched_until` una instancia que sigue el turno
+STREAM_WATCH_TOUCH_SECONDS = STREAM_RESUME_GRACE_SECONDS / 3
+# Sin eventos nuevos en la tabla durante este tiempo, la instancia de origen se da por perdida
+STREAM_RESUME_IDLE_SECONDS = float(os.getenv("STREAM_RESUME_IDLE_SECONDS", "300"))
+
+FINAL_EVENT_TYPES = ("done", "error")
+
+
+class ReplayExpired(Exception):
+    """Los eventos pedidos ya no están en el buffer"""
+
+
+def format_event_id(turn_id: str, seq: int) -> str:
+    return f"{turn_id}:{seq}"
+
+
+def parse_event_id(value: str) -> Tuple[str, int]:
+    """`<turn_id>:<seq>` -> (turn_id, seq); ValueError si no tiene ese formato"""
+    turn_id, _, seq = (value or "").strip().rpartition(":")
+    if not turn_id:
+        raise ValueError(f"Invalid event id: {value!r}")
+    return turn_id, int(seq)
+
+
+class Turn:
+    """Un turno del agente y el buffer de sus últimos eventos"""
+
+    def __init__(self, turn_id: str, chat_id: str, log: Optional["DynamoTurnLog"] = None):
+        self.turn_id = turn_id
+        self.chat_id = chat_id
+        self.started = time.monotonic()
+        self.events: deque = deque(maxlen=STREAM_REPLAY_EVENTS)  # (seq, frame)
+        self.last_seq = 0
+        self.done = False
+        self.final_type: Optional[str] = None  # "done" o "error"
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+        self._grace = None
+        self._abandoning = None
+        self._log = log
+
+    def publish(self, payload: dict):
+        """Agregar un evento al buffer y despertar a los suscriptores"""
+        if self.done:
+            return
+        self.last_seq += 1
+        frame = format_sse(payload, event_id=format_event_id(self.turn_id, self.last_seq))
+        self.events.append((self.last_seq, frame))
+        final = payload.get("type") in FINAL_EVENT_TYPES
+        if self._log:
+            self._log.append(self.turn_id, self.last_seq, frame, final)
+        if final:
+            self.final_type = payload["type"]
+            self._finish()
+        self._wake()
+
+    def frames_after(self, seq: int) -> List[str]:
+        """Frames con id posterior a `seq`; ReplayExpired si alguno ya salió del buffer"""
+        if seq >= self.last_seq:
+            return []
+        first = self.events[0][0] if self.events else self.last_seq + 1
+        if seq + 1 < first:
+            raise ReplayExpired(f"Events after {seq} of turn {self.turn_id} are no longer buffered")
+        return [frame for _, frame in itertools.islice(self.events, seq + 1 - first, None)]
+
+    async def subscribe(self, after_seq: int = 0) -> AsyncIterator[str]:
+        """Frames desde `after_seq` (los del buffer y luego los nuevos) hasta el final del turno"""
+        self._attach()
+        try:
+            while True:
+                changed = self._changed
+                frames = self.frames_after(after_seq)
+                for frame in frames:
+                    yield frame
+                after_seq += len(frames)
+                if self.done and after_seq >= self.last_seq:
+                    return
+                if not frames:
+                    await changed.wait()
+        finally:
+            self._detach()
+
+    async def settled(self):
+        """
+        Esperar a que el turno termine o se abandone, y a que sus eventos estén
+        escritos en la tabla. Cancelar la espera no cancela el turno.
+        """
+        if self.task:
+            await asyncio.wait({self.task})
+        if self._log:
+            await self._log.flush()
+
+    def cancel(self):
+        if self.task and not self.task.done():
+            print(f"Cancelling abandoned turn {self.turn_id} of chat {self.chat_id}")
+            self.task.cancel()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _finish(self):
+        self.done = True
+        self.finished_at = time.monotonic()
+        if self._grace:
+            self._grace.cancel()
+            self._grace = None
+
+    def _attach(self):
+        self.subscribers += 1
+        if self._grace:
+            self._grace.cancel()
+            self._grace = None
+
+    def _detach(self):
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.done:
+            self._grace = asyncio.get_running_loop().call_later(STREAM_RESUME_GRACE_SECONDS, self._abandon)
+
+    def _abandon(self):
+        self._grace = None
+        if self.done or self.subscribers:
+            return
+        if self._log:
+            self._abandoning = asyncio.ensure_future(self._abandon_unless_watched())
+        else:
+            self.cancel()
+
+    async def _abandon_unless_watched(self):
+        # Otra instancia puede estar siguiendo el turno desde la tabla
+        try:
+            watched = await self._log.watched(self.turn_id)
+        except Exception as e:
+            print(f"[turns] could not read the watch mark of {self.turn_id}: {e}")
+            watched = False
+        if self.done or self.subscribers:
+            return
+        if watched:
+            self._grace = asyncio.get_running_loop().call_later(STREAM_RESUME_GRACE_SECONDS, self._abandon)
+        else:
+            self.cancel()
+
+
+class TurnRegistry:
+    """Turnos de este proceso: en curso y terminados recientes (para reanudar)"""
+
+    def __init__(self):
+        self._turns: "OrderedDict[str, Turn]" = OrderedDict()
+        self.stats = {"started": 0, "completed": 0, "cancelled": 0, "failed": 0}
+
+    def start(self, chat_id: str, produce: Callable[[Turn], Awaitable[None]]) -> Turn:
+        """Crear un turno y ejecutar `produce(turn)` en segundo plano"""
+        self._evict()
+        turn = Turn(uuid.uuid4().hex, chat_id, log=get_turn_log())
+        self._turns[turn.turn_id] = turn
+        turn.task = asyncio.ensure_future(self._run(turn, produce))
+        self.stats["started"] += 1
+        return turn
+
+    def get(self, turn_id: str) -> Optional[Turn]:
+        return self._turns.get(turn_id)
+
+    async def _run(self, turn: Turn, produce: Callable[[Turn], Awaitable[None]]):
+        outcome = "completed"
+        try:
+            await produce(turn)
+            if turn.final_type == "error":
+                outcome = "failed"
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            turn.publish({"type": "error", "message": "Turn cancelled: the client did not reconnect"})
+        except Exception as e:
+            outcome = "failed"
+            turn.publish({"type": "error", "message": str(e)})
+        finally:
+            self.stats[outcome] += 1
+            if outcome == "cancelled":
+                print(f"[turns] turn {turn.turn_id} cancelled after {time.monotonic() - turn.started:.1f}s "
+                      f"and {turn.last_seq} events; cancelled {self.stats['cancelled']} of "
+                      f"{self.stats['started']} turns")
+            if not turn.done:
+                turn._finish()
+                turn._wake()
+
+    def _evict(self):
+        # Solo turnos terminados: vencidos, y los más antiguos por encima de STREAM_REPLAY_TURNS
+        now = time.monotonic()
+        finished = [t for t in self._turns.values() if t.done]
+        expired = [t for t in finished if now - t.finished_at > STREAM_REPLAY_TTL_SECONDS]
+        oldest = finished[:max(0, len(finished) - STREAM_REPLAY_TURNS)]
+        for turn in expired + oldest:
+            self._turns.pop(turn.turn_id, None)
+
+
+class DynamoTurnLog:
+    """Copia de los eventos en DynamoDB (clave turn_id + seq, con TTL en expires_at)"""
+
+    def __init__(self, table):
+        self.table = table
+        self._writes = set()
+
+    def append(self, turn_id: str, seq: int, frame: str, final: bool):
+        # Sin bloquear el turno; quien lee solo avanza por seq consecutivos
+        item = {"turn_id": turn_id, "seq": seq, "frame": frame, "final": final,
+                "expires_at": int(time.time()) + STREAM_REPLAY_TTL_SECONDS}
+        write = asyncio.ensure_future(asyncio.to_thread(self.table.put_item, Item=item))
+        self._writes.add(write)
+        write.add_done_callback(self._write_done)
+
+    async def flush(self):
+        """Esperar a las escrituras en vuelo"""
+        if self._writes:
+            await asyncio.wait(set(self._writes))
+
+    def _write_done(self, write):
+        self._writes.discard(write)
+        if not write.cancelled() and write.exception():
+            print(f"[turns] could not store a stream event: {write.exception()}")
+
+    async def read_after(self, turn_id: str, seq: int) -> Tuple[List[Tuple[int, str]], bool]:
+        """Frames consecutivos después de `seq` y si el último es el final del turno"""
+        def query():
+            items, kwargs = [], {"KeyConditionExpression": Key("turn_id").eq(turn_id) & Key("seq").gt(seq)}
+            while True:
+                response = self.table.query(**kwargs)
+                items += response.get("Items", [])
+                if "LastEvaluatedKey" not in response:
+                    return items
+                kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+        frames, final = [], False
+        for item in await asyncio.to_thread(query):
+            if int(item["seq"]) != seq + len(frames) + 1:
+                break  # escritura anterior aún en vuelo: se leerá en la próxima consulta
+            frames.append((int(item["seq"]), item["frame"]))
+            final = bool(item.get("final"))
+        return frames, final
+
+    async def exists(self, turn_id: str) -> bool:
+        # El primer evento (metadata) es seq 1
+        response = await asyncio.to_thread(self.table.get_item, Key={"turn_id": turn_id, "seq": 1})
+        return "Item" in response
+
+    async def touch(self, turn_id: str):
+        """Marcar el turno como seguido desde otra instancia (seq 0 no es un evento)"""
+        await asyncio.to_thread(self.table.put_item, Item={
+            "turn_id": turn_id, "seq": 0,
+            # Con decimales y con margen de una renovación: la marca no caduca
+            # entre dos renovaciones aunque el origen la consulte justo antes
+            "watched_until": Decimal(str(round(
+                time.time() + STREAM_RESUME_GRACE_SECONDS + STREAM_WATCH_TOUCH_SECONDS, 3))),
+            "expires_at": int(time.time()) + STREAM_REPLAY_TTL_SECONDS})
+
+    async def watched(self, turn_id: str) -> bool:
+        response = await asyncio.to_thread(self.table.get_item, Key={"turn_id": turn_id, "seq": 0})
+        return float(response.get("Item", {}).get("watched_until", 0)) > time.time()
+
+    async def follow(self, turn_id: str, after_seq: int) -> AsyncIterator[str]:
+        """Seguir desde la tabla un turno que corre en otra instancia"""
+        last_event, last_touch = time.monotonic(), 0.0
+        while True:
+            now = time.monotonic()
+            if now - last_touch > STREAM_WATCH_TOUCH_SECONDS:
+                await self.touch(turn_id)
+                last_touch = now
+            frames, final = await self.read_after(turn_id, after_seq)
+            for seq, frame in frames:
+                yield frame
+                after_seq = seq
+            if final:
+                return
+            if frames:
+                last_event = now
+            elif now - last_event > STREAM_RESUME_IDLE_SECONDS:
+                yield format_sse({"type": "error", "message": "The agent turn stopped sending events"})
+                return
+            await asyncio.sleep(STREAM_REPLAY_POLL_SECONDS)
+
+
+@lru_cache(maxsize=None)
+def get_turn_log() -> Optional[DynamoTurnLog]:
+    """Log en DynamoDB si DYNAMO_STREAM_EVENTS_TABLE_NAME está configurada"""
+    from app.dynamo import get_stream_events_table
+    table = get_stream_events_table()
+    return DynamoTurnLog(table) if table is not None else None
+
+
+turns = TurnRegistry()
@@ -0,0 +1,198 @@
+"""
+Comprueba la paginación de chats contra una tabla en memoria que se comporta
+como DynamoDB (Limit, ExclusiveStartKey/LastEvaluatedKey, ProjectionExpression,
+índice user_id-updated_at-index y scan segmentado):
+
+1. /chats/user/{user_id}: las páginas recorren todos los chats del usuario, del
+   más reciente al más antiguo, sin huecos ni duplicados, y cada página lee
+   como mucho `limit` items, tenga el usuario 25 chats o 2000
+2. la proyección deja fuera los atributos que Chat no usa
+3. cursores mal formados o de otro usuario: 400
+4. /chats: el scan paralelo devuelve cada chat una vez, con los segmentos
+   leídos a la vez y páginas de como mucho `limit` chats
+
+Uso (desde backend/lambda_api):
+    python chats_pagination_check.py
+"""
+import argparse
+import datetime
+import os
+import sys
+import threading
+import time
+import uuid
+import zlib
+
+from boto3.dynamodb.types import TypeSerializer
+
+SCAN_DELAY = 0.05  # latencia de cada petición Scan
+_serializer = TypeSerializer()
+
+
+class MemoryChatsTable:
+    """Recurso Table de la tabla de chats (query al índice de usuario)"""
+
+    def __init__(self):
+        self.name = "chats-check"
+        self.items = []
+        self.read = 0  # items leídos por la última query
+        self.lock = threading.Lock()
+
+    def query(self, IndexName, KeyConditionExpression, ScanIndexForward=True, Limit=None,
+              ProjectionExpression=None, ExclusiveStartKey=None):
+        assert IndexName == "user_id-updated_at-index", IndexName
+        _, user_id = KeyConditionExpression.get_expression()["values"]
+        items = sorted((i for i in self.items if i["user_id"] == user_id and "updated_at" in i),
+                       key=lambda i: (i["updated_at"], i["chat_id"]), reverse=not ScanIndexForward)
+        start = 0
+        if ExclusiveStartKey:
+            start = next(n for n, i in enumerate(items) if i["chat_id"] == ExclusiveStartKey["chat_id"]) + 1
+        page = items[start:start + Limit] if Limit else items[start:]
+        self.read = len(page)
+        response = {"Items": [project(i, ProjectionExpression) for i in page]}
+        if Limit and start + Limit < len(items):
+            last = page[-1]
+            response["LastEvaluatedKey"] = {k: last[k] for k in ("chat_id", "user_id", "updated_at")}
+        return response
+
+
+class MemoryDynamoClient:
+    """Cliente de bajo nivel: Scan segmentado sobre la misma tabla"""
+
+    def __init__(self, table):
+        self.table = table
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def scan(self, TableName, Segment, TotalSegments, Limit, ProjectionExpression, ExclusiveStartKey=None):
+        with self.table.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(SCAN_DELAY)
+        items = sorted((i for i in self.table.items
+                        if zlib.crc32(i["chat_id"].encode()) % TotalSegments == Segment),
+                       key=lambda i: i["chat_id"])
+        if ExclusiveStartKey:
+            items = [i for i in items if i["chat_id"] > ExclusiveStartKey["chat_id"]["S"]]
+        page = items[:Limit]
+        response = {"Items": [{k: _serializer.serialize(v) for k, v in project(i, ProjectionExpression).items()}
+                              for i in page]}
+        if len(items) > Limit:
+            response["LastEvaluatedKey"] = {"chat_id": {"S": page[-1]["chat_id"]}}
+        with self.table.lock:
+            self.in_flight -= 1
+        return response
+
+
+def project(item, projection):
+    fields = [f.strip() for f in projection.split(",")]
+    return {f: item[f] for f in fields if f in item}
+
+
+def add_chats(table, user_id, count):
+    start = datetime.datetime(2025, 1, 1)
+    for n in range(count):
+        at = (start + datetime.timedelta(minutes=n)).isoformat()
+        table.items.append({"chat_id": str(uuid.uuid4()), "user_id": user_id, "chat_name": f"{user_id} {n}",
+                            "created_at": at, "updated_at": at, "notes": "x" * 2000})
+
+
+class Check:
+    def __init__(self, chats, table, client):
+        self.chats = chats
+        self.table = table
+        self.client = client
+        self.failures = 0
+
+    def expect(self, ok, message):
+        print(f"{'ok  ' if ok else 'FAIL'} {message}")
+        self.failures += not ok
+
+    def expect_status(self, call, status, message):
+        from fastapi import HTTPException
+        try:
+            call()
+            code = 200
+        except HTTPException as e:
+            code = e.status_code
+        self.expect(code == status, f"{message} -> {code}")
+
+    def user_pages(self, user_id, limit):
+        pages, cursor = [], None
+        while True:
+            page = self.chats.get_chats_by_user(user_id, limit=limit, cursor=cursor)
+            pages.append((page, self.table.read))
+            cursor = page.next_cursor
+            if cursor is None:
+                return pages
+
+    def run(self, limit):
+        # 1. Historial de un usuario
+        for user_id, count in (("small", 25), ("large", 2000)):
+            pages = self.user_pages(user_id, limit)
+            chats = [chat for page, _ in pages for chat in page.items]
+            expected = sorted((i for i in self.table.items if i["user_id"] == user_id),
+                              key=lambda i: i["updated_at"], reverse=True)
+            self.expect([c.chat_id for c in chats] == [i["chat_id"] for i in expected],
+                        f"{user_id}: {len(pages)} pages list all {count} chats, newest first, once each")
+            self.expect(max(read for _, read in pages) <= limit,
+                        f"{user_id}: each page reads at most {limit} items (first page: {pages[0][1]})")
+
+        # 2. Proyección
+        page = self.chats.get_chats_by_user("small", limit=limit, cursor=None)
+        self.expect(all(not hasattr(c, "notes") and c.messages == [] for c in page.items),
+                    "the projection leaves out attributes Chat does not use")
+
+        # 3. Cursores inválidos
+        other_user = self.chats.get_chats_by_user("small", limit=5, cursor=None).next_cursor
+        self.expect_status(lambda: self.chats.get_chats_by_user("large", limit=5, cursor=other_user), 400,
+                           "a cursor from another user's listing")
+        self.expect_status(lambda: self.chats.get_chats_by_user("large", limit=5, cursor="no-es-un-cursor"), 400,
+                           "a malformed cursor")
+        self.expect_status(lambda: self.chats.get_chats(limit=5, cursor=other_user), 400,
+                           "a user listing cursor on /chats")
+
+        # 4. Listado completo con scan paralelo
+        seen, cursor, sizes, page_seconds = [], None, [], []
+        while True:
+            started = time.perf_counter()
+            page = self.chats.get_chats(limit=limit * 5, cursor=cursor)
+            page_seconds.append(time.perf_counter() - started)
+            seen.extend(c.chat_id for c in page.items)
+            sizes.append(len(page.items))
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.expect(sorted(seen) == sorted(i["chat_id"] for i in self.table.items),
+                    f"/chats: {len(sizes)} pages list all {len(self.table.items)} chats once each")
+        self.expect(max(sizes) <= limit * 5, f"/chats: pages of at most {limit * 5} chats (largest: {max(sizes)})")
+        segments = self.chats.CHATS_SCAN_SEGMENTS
+        self.expect(self.client.max_in_flight == segments,
+                    f"/chats: {self.client.max_in_flight} of {segments} segments scanned at the same time")
+        slowest = max(page_seconds)
+        self.expect(slowest < SCAN_DELAY * 2,
+                    f"/chats: slowest page {slowest * 1000:.0f}ms (one Scan takes {SCAN_DELAY * 1000:.0f}ms)")
+        return self.failures == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat listing pagination check against an in-memory table")
+    parser.add_argument("--limit", type=int, default=20, help="page size")
+    args = parser.parse_args()
+
+    os.environ["ENVIRONMENT"] = "development"
+    for key, value in {"AWS_REGION": "us-east-1", "AWS_DEFAULT_REGION": "us-east-1"}.items():
+        os.environ.setdefault(key, value)
+
+    from app.api.v1 import chats
+
+    table = MemoryChatsTable()
+    client = MemoryDynamoClient(table)
+    add_chats(table, "small", 25)
+    add_chats(table, "large", 2000)
+    chats.get_chats_table = lambda: table
+    chats.get_client = lambda service_name: client
+
+    ok = Check(chats, table, client).run(args.limit)
+    print("PASSED" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,149 @@
+"""
+Benchmark del agrupado de fragmentos de texto en los dos saltos del stream:
+
+    modelo (un delta por token)
+      -> agent_core: coalesce_events + frame SSE (como BedrockAgentCoreApp)
+      -> lambda_api: SSEParser + json.loads + coalesce_events + _create_sse_message
+      -> navegador
+
+Todo corre en proceso (sin red), con --tokens deltas de 1 a 8 caracteres cada
+--token-ms ms. Compara sin agrupado (cada delta es un frame en ambos saltos)
+con el agrupado por --bytes / --ms, e imprime frames por salto, frames/s,
+CPU total y el retraso añadido a cada token (desde que el modelo lo emite
+hasta que sale en un frame hacia el navegador).
+
+También comprueba la contrapresión de cada salto: con un consumidor lento, el
+agrupador no lee del origen más de STREAM_QUEUE_SIZE eventos por delante.
+
+Uso (desde backend/lambda_api):
+    python coalesce_bench.py
+    python coalesce_bench.py --tokens 5000 --token-ms 0     # ráfaga: solo CPU
+    python coalesce_bench.py --bytes 256 --ms 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agent_core"))
+os.environ.setdefault("ENVIRONMENT", "development")
+
+from tools.coalesce import coalesce_events as agent_coalesce_events  # noqa: E402
+from app.coalesce import coalesce_events as api_coalesce_events  # noqa: E402
+from app.sse import SSEParser  # noqa: E402
+from app.api.v1.agent import _create_sse_message  # noqa: E402
+
+WORDS = ("el mercado de café en República Dominicana crece con márgenes estables y "
+         "competidores locales según los reportes").split()
+
+
+def make_tokens(count, seed=3):
+    rng = random.Random(seed)
+    tokens = []
+    while len(tokens) < count:
+        word = rng.choice(WORDS) + " "
+        # Los deltas del modelo suelen ser trozos de palabra
+        while word and len(tokens) < count:
+            cut = rng.randint(1, 8)
+            tokens.append(word[:cut])
+            word = word[cut:]
+    return tokens
+
+
+async def run_pipeline(tokens, token_ms, max_bytes, max_ms):
+    emitted = []  # (posición final del token en el texto, instante de emisión)
+    frames = {"agent": 0, "api": 0}
+
+    async def model():
+        offset = 0
+        for token in tokens:
+            if token_ms:
+                await asyncio.sleep(token_ms / 1000)
+            offset += len(token)
+            emitted.append((offset, time.perf_counter()))
+            yield {"message": token}
+
+    async def agent_core_hop():
+        async for event in agent_coalesce_events(model(), max_bytes, max_ms):
+            frames["agent"] += 1
+            yield f"data: {json.dumps(event)}\n\n".encode("utf-8")
+
+    async def api_events():
+        parser = SSEParser()
+        async for chunk in agent_core_hop():
+            for event in parser.feed(chunk):
+                yield json.loads(event.data)
+
+    delays, delivered, next_token = [], 0, 0
+    cpu_started, started = time.process_time(), time.perf_counter()
+    async for event in api_coalesce_events(api_events(), max_bytes, max_ms):
+        _create_sse_message("text", content=event["message"])
+        frames["api"] += 1
+        delivered += len(event["message"])
+        now = time.perf_counter()
+        while next_token < len(emitted) and emitted[next_token][0] <= delivered:
+            delays.append(now - emitted[next_token][1])
+            next_token += 1
+    return {"frames": frames, "cpu": time.process_time() - cpu_started,
+            "wall": time.perf_counter() - started, "delays": delays}
+
+
+async def read_ahead(coalesce, events=200, max_queued=8):
+    """Máximo de eventos leídos del origen y aún no entregados, con un consumidor lento"""
+    produced, consumed, ahead = 0, 0, 0
+
+    async def source():
+        nonlocal produced
+        for i in range(events):
+            produced += 1
+            yield {"data": {"images": [i]}}  # no es texto: pasa uno a uno
+
+    async for _ in coalesce(source(), 512, 30, max_queued):
+        consumed += 1
+        ahead = max(ahead, produced - consumed)
+        await asyncio.sleep(0.001)
+    return ahead
+
+
+def report(name, result, tokens):
+    delays = sorted(result["delays"])
+    p99 = delays[int(len(delays) * 0.99)]
+    frames = result["frames"]
+    print(f"{name:<22} frames agent={frames['agent']:<6} api={frames['api']:<6} "
+          f"api frames/s={frames['api'] / result['wall']:>8.0f}  cpu={result['cpu'] * 1000:>7.0f}ms "
+          f"({result['cpu'] / len(tokens) * 1e6:>5.1f}us/token)  added delay "
+          f"p50={statistics.median(delays) * 1000:>5.1f}ms p99={p99 * 1000:>5.1f}ms max={delays[-1] * 1000:>5.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Token coalescing benchmark (agent_core and lambda_api hops)")
+    parser.add_argument("--tokens", type=int, default=3000)
+    parser.add_argument("--token-ms", type=float, default=2, help="ms between model deltas (0 = burst)")
+    parser.add_argument("--bytes", type=int, default=512, help="flush after this many buffered bytes")
+    parser.add_argument("--ms", type=float, default=30, help="flush this long after the first buffered delta")
+    args = parser.parse_args()
+
+    tokens = make_tokens(args.tokens)
+    print(f"{len(tokens)} deltas, {sum(map(len, tokens))} characters, one every {args.token_ms}ms\n")
+    off = asyncio.run(run_pipeline(tokens, args.token_ms, args.bytes, 0))
+    on = asyncio.run(run_pipeline(tokens, args.token_ms, args.bytes, args.ms))
+    report("per token", off, tokens)
+    report(f"{args.bytes}B / {args.ms:g}ms", on, tokens)
+
+    print(f"\nframes to the browser: {off['frames']['api'] / on['frames']['api']:.0f}x fewer, "
+          f"CPU: {off['cpu'] / on['cpu']:.1f}x less")
+    queued = 8
+    ahead = {name: asyncio.run(read_ahead(coalesce, max_queued=queued))
+             for name, coalesce in (("agent", agent_coalesce_events), ("api", api_coalesce_events))}
+    print(f"slow consumer, queue of {queued}: read ahead of the consumer agent={ahead['agent']} api={ahead['api']}")
+    max_delay = max(on["delays"])
+    # Cada salto puede retener un texto hasta --ms (más el tiempo de planificación)
+    ok = on["frames"]["api"] < off["frames"]["api"] and max_delay < 2 * args.ms / 1000 + 0.05
+    # La cola, más el evento que el origen tiene en la mano esperando plaza
+    ok = ok and max(ahead.values()) <= queued + 1
+    print("PASSED" if ok else "FAILED: coalescing did not reduce frames, added too much delay or read ahead unbounded")
+    sys.exit(0 if ok else 1)
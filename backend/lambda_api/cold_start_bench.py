@@ -0,0 +1,131 @@
+"""
+Benchmark de arranque en frío de la Lambda FastAPI.
+
+Cada medición corre en un proceso Python nuevo (como un arranque en frío):
+
+- import de cada módulo (config, app.dynamo y cada router de app/api/v1): tiempo
+  total y tiempo propio (con fastapi, pydantic, boto3 y mangum ya importados)
+- init completo (import main) y primera petición GET /health a través de Mangum
+- con --importtime, los imports más lentos de `import main` (python -X importtime)
+
+Uso (desde backend/lambda_api):
+    python cold_start_bench.py --runs 5
+    python cold_start_bench.py --importtime --top 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = [
+    "config",
+    "app.dynamo",
+    "app.models",
+    "app.api.v1.chats",
+    "app.api.v1.users",
+    "app.api.v1.messages",
+    "app.api.v1.documents",
+    "app.api.v1.images",
+    "app.api.v1.agent",
+    "app.api.v1.api",
+    "main",
+]
+# Dependencias que todo router paga igual; el tiempo "propio" se mide sin ellas
+BASELINE_IMPORTS = "import fastapi, pydantic, boto3, mangum"
+
+IMPORT_SNIPPET = """
+import time
+{preload}
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+FIRST_REQUEST_SNIPPET = """
+import json, time
+started = time.perf_counter()
+import main
+init = time.perf_counter() - started
+event = {
+    "version": "2.0", "routeKey": "$default", "rawPath": "/health", "rawQueryString": "",
+    "headers": {"host": "localhost"},
+    "requestContext": {"http": {"method": "GET", "path": "/health", "sourceIp": "127.0.0.1", "protocol": "HTTP/1.1"},
+                       "stage": "$default"},
+    "isBase64Encoded": False,
+}
+class Context:
+    aws_request_id = "cold-start-bench"
+started = time.perf_counter()
+response = main.handler(event, Context())
+request = time.perf_counter() - started
+print(json.dumps({"init": init, "first_request": request, "status": response["statusCode"]}))
+"""
+
+
+def bench_env():
+    env = dict(os.environ)
+    # Sin Secrets Manager ni red: el benchmark mide el código, no AWS
+    env.setdefault("ENVIRONMENT", "development")
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    return env
+
+
+def run_python(code, *flags):
+    result = subprocess.run([sys.executable, *flags, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=bench_env())
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "error")
+    return result
+
+
+def time_import(module, preload=""):
+    return float(run_python(IMPORT_SNIPPET.format(module=module, preload=preload)).stdout.strip())
+
+
+def import_table(runs):
+    print(f"{'module':<24}{'total ms':>12}{'own ms':>12}   (median of {runs} fresh processes)")
+    for module in MODULES:
+        try:
+            total = statistics.median(time_import(module) for _ in range(runs))
+            own = statistics.median(time_import(module, BASELINE_IMPORTS) for _ in range(runs))
+        except RuntimeError as e:
+            print(f"{module:<24}  error: {e}")
+            continue
+        print(f"{module:<24}{total * 1000:>12.1f}{own * 1000:>12.1f}")
+
+
+def first_request(runs):
+    samples = [json.loads(run_python(FIRST_REQUEST_SNIPPET).stdout.strip().splitlines()[-1]) for _ in range(runs)]
+    init = statistics.median(s["init"] for s in samples)
+    request = statistics.median(s["first_request"] for s in samples)
+    print(f"\ninit (import main): {init * 1000:.1f}ms, first GET /health: {request * 1000:.1f}ms "
+          f"(status {samples[-1]['status']})")
+
+
+def slowest_imports(top):
+    stderr = run_python("import main", "-X", "importtime").stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # import time:     self [us] |  cumulative | imported package
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    print("\nslowest imports of `import main` (cumulative):")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:>9.1f}ms  (self {self_us / 1000:>7.1f}ms)  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for the FastAPI Lambda")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--importtime", action="store_true", help="show the slowest imports of main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    import_table(args.runs)
+    first_request(args.runs)
+    if args.importtime:
+        slowest_imports(args.top)
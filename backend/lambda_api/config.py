@@ -1,5 +1,8 @@
 import os
 import json
+import time
+from functools import lru_cache
+from typing import Optional
 import boto3
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
@@ -7,6 +10,11 @@ from dotenv import load_dotenv
 # Cargar variables de entorno locales (para desarrollo)
 load_dotenv()
 
+# Cache del secret en /tmp: sobrevive a reinicios del proceso dentro del mismo
+# entorno de ejecución de Lambda y evita repetir la llamada a Secrets Manager
+SECRETS_CACHE_DIR = os.getenv("SECRETS_CACHE_DIR", "/tmp")
+SECRETS_CACHE_TTL_SECONDS = int(os.getenv("SECRETS_CACHE_TTL_SECONDS", "300"))
+
 
 class Config:
     """
@@ -30,44 +38,74 @@ class Config:
         else:
             self._load_from_env()
     
+    def _secrets_cache_path(self) -> str:
+        return os.path.join(SECRETS_CACHE_DIR, f"secret-{self.secret_name}.json")
+    
+    def _read_cached_secret(self) -> Optional[dict]:
+        """Leer el secret de /tmp si existe y no ha expirado (SECRETS_CACHE_TTL_SECONDS)"""
+        path = self._secrets_cache_path()
+        try:
+            if time.time() - os.path.getmtime(path) > SECRETS_CACHE_TTL_SECONDS:
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write_cached_secret(self, secret: dict):
+        """Guardar el secret en /tmp (solo legible por el proceso)"""
+        path = self._secrets_cache_path()
+        try:
+            tmp_path = f"{path}.{os.getpid()}"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(secret, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el secret en cache: {e}")
+    
     def _load_from_secrets_manager(self):
-        """Cargar secretos desde AWS Secrets Manager"""
+        """Cargar secretos desde AWS Secrets Manager (o desde la cache en /tmp)"""
         try:
-            # Crear cliente de Secrets Manager
-            session = boto3.session.Session()
-            client = session.client(
-                service_name='secretsmanager',
-                region_name=self.aws_region
-            )
+            secret = self._read_cached_secret()
+            source = "cache /tmp"
+            if secret is None:
+                # Crear cliente de Secrets Manager
+                session = boto3.session.Session()
+                client = session.client(
+                    service_name='secretsmanager',
+                    region_name=self.aws_region
+                )
+                
+                # Obtener el secret
+                get_secret_value_response = client.get_secret_value(
+                    SecretId=self.secret_name
+                )
+                if 'SecretString' not in get_secret_value_response:
+                    raise ValueError("Secret no contiene SecretString")
+                secret = json.loads(get_secret_value_response['SecretString'])
+                self._write_cached_secret(secret)
+                source = "AWS Secrets Manager"
             
-            # Obtener el secret
-            get_secret_value_response = client.get_secret_value(
-                SecretId=self.secret_name
-            )
+            # Asignar valores a las propiedades
+            self.DYNAMO_CHATS_TABLE_NAME = secret.get('DYNAMO_CHATS_TABLE_NAME')
+            self.DYNAMO_USERS_TABLE_NAME = secret.get('DYNAMO_USERS_TABLE_NAME')
+            self.DYNAMO_USERNAMES_TABLE_NAME = secret.get('DYNAMO_USERNAMES_TABLE_NAME')
+            self.DYNAMO_MESSAGES_TABLE_NAME = secret.get('DYNAMO_MESSAGES_TABLE_NAME')
+            self.DYNAMO_DOCUMENTS_TABLE_NAME = secret.get('DYNAMO_DOCUMENTS_TABLE_NAME')
+            self.MEMORY_ID_BEDROCK_AGENT_CORE = secret.get('MEMORY_ID_BEDROCK_AGENT_CORE')
+            self.ARN_BEDROCK_AGENTCORE = secret.get('ARN_BEDROCK_AGENTCORE')
+            self.DYNAMO_IMAGES_TABLE_NAME = secret.get('DYNAMO_IMAGES_TABLE_NAME')
+            # Opcional: eventos de los streams para reanudarlos desde otra instancia
+            self.DYNAMO_STREAM_EVENTS_TABLE_NAME = secret.get('DYNAMO_STREAM_EVENTS_TABLE_NAME')
+            self.S3_BUCKET_NAME = secret.get('S3_BUCKET_NAME')
+            
+            # Puedes agregar más secretos aquí
+            # self.DATABASE_URL = secret.get('DATABASE_URL')
+            # self.API_KEY = secret.get('API_KEY')
+            
+            print(f"✅ Secretos cargados desde {source}: {self.secret_name}")
             
-            # Parsear el secret (JSON)
-            if 'SecretString' in get_secret_value_response:
-                secret = json.loads(get_secret_value_response['SecretString'])
-                
-                # Asignar valores a las propiedades
-                self.DYNAMO_CHATS_TABLE_NAME = secret.get('DYNAMO_CHATS_TABLE_NAME')
-                self.DYNAMO_USERS_TABLE_NAME = secret.get('DYNAMO_USERS_TABLE_NAME')
-                self.DYNAMO_USERNAMES_TABLE_NAME = secret.get('DYNAMO_USERNAMES_TABLE_NAME')
-                self.DYNAMO_MESSAGES_TABLE_NAME = secret.get('DYNAMO_MESSAGES_TABLE_NAME')
-                self.DYNAMO_DOCUMENTS_TABLE_NAME = secret.get('DYNAMO_DOCUMENTS_TABLE_NAME')
-                self.MEMORY_ID_BEDROCK_AGENT_CORE = secret.get('MEMORY_ID_BEDROCK_AGENT_CORE')
-                self.ARN_BEDROCK_AGENTCORE = secret.get('ARN_BEDROCK_AGENTCORE')
-                self.DYNAMO_IMAGES_TABLE_NAME = secret.get('DYNAMO_IMAGES_TABLE_NAME')
-                self.S3_BUCKET_NAME = secret.get('S3_BUCKET_NAME')
-                
-                # Puedes agregar más secretos aquí
-                # self.DATABASE_URL = secret.get('DATABASE_URL')
-                # self.API_KEY = secret.get('API_KEY')
-                
-                print(f"✅ Secretos cargados desde AWS Secrets Manager: {self.secret_name}")
-            else:
-                raise ValueError("Secret no contiene SecretString")
-                
         except Exception as e:
             raise Exception(f"Error inesperado al cargar secretos: {str(e)}")
     
@@ -81,11 +119,24 @@ class Config:
         self.DYNAMO_DOCUMENTS_TABLE_NAME = os.getenv("DYNAMO_DOCUMENTS_TABLE_NAME")
         self.MEMORY_ID_BEDROCK_AGENT_CORE = os.getenv("MEMORY_ID_BEDROCK_AGENT_CORE")
         self.DYNAMO_IMAGES_TABLE_NAME = os.getenv("DYNAMO_IMAGES_TABLE_NAME")
+        self.DYNAMO_STREAM_EVENTS_TABLE_NAME = os.getenv("DYNAMO_STREAM_EVENTS_TABLE_NAME")
         self.ARN_BEDROCK_AGENTCORE = os.getenv("ARN_BEDROCK_AGENTCORE")
         self.S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
         
         print(f"📝 Configuración cargada desde variables de entorno (.env)")
 
 
-# Instancia global de configuración
-config = Config()
+@lru_cache(maxsize=None)
+def get_config() -> Config:
+    """
+    Configuración global, creada en el primer uso (no al importar) para no
+    pagar la llamada a Secrets Manager durante el arranque en frío.
+    """
+    return Config()
+
+
+def __getattr__(name):
+    # Compatibilidad con `from config import config`
+    if name == "config":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,151 @@
+"""
+Comprueba la ventana de mensajes contra una tabla en memoria que se comporta
+como DynamoDB (índice chat_id-created_at-index, Limit, ExclusiveStartKey y
+unidades de lectura por tamaño de los items):
+
+1. /messages/chat/{chat_id} devuelve los últimos `limit` mensajes en orden
+   cronológico, y con los cursores se recorre hacia atrás todo el chat sin
+   huecos ni duplicados
+2. abrir un chat lee lo mismo tenga 50 mensajes o 5000 (antes: todo el chat)
+3. /chats/{chat_id} no lee mensajes salvo con include_messages, y el cursor
+   que devuelve sirve en /messages/chat/{chat_id}
+4. cursores mal formados o de otro chat: 400
+
+Uso (desde backend/lambda_api):
+    python messages_window_check.py
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import sys
+import uuid
+
+from chats_pagination_check import Check, project
+
+READ_UNIT_BYTES = 4096  # una unidad de lectura: 2 lecturas eventualmente consistentes de hasta 4 KB
+
+
+def read_units(items):
+    size = sum(len(json.dumps(item)) for item in items)
+    return math.ceil(size / READ_UNIT_BYTES) / 2
+
+
+class MemoryMessagesTable:
+    """Recurso Table de la tabla de mensajes (query al índice de chat)"""
+
+    def __init__(self):
+        self.items = []
+        self.queries = 0
+        self.units = 0.0  # unidades de lectura de la última query
+
+    def query(self, IndexName, KeyConditionExpression, ScanIndexForward=True, Limit=None, ExclusiveStartKey=None):
+        _, chat_id = KeyConditionExpression.get_expression()["values"]
+        items = [i for i in self.items if i["chat_id"] == chat_id]
+        if IndexName == "chat_id-created_at-index":
+            items.sort(key=lambda i: (i["created_at"], i["message_id"]), reverse=not ScanIndexForward)
+        start = 0
+        if ExclusiveStartKey:
+            start = next(n for n, i in enumerate(items) if i["message_id"] == ExclusiveStartKey["message_id"]) + 1
+        page = items[start:start + Limit] if Limit else items[start:]
+        self.queries += 1
+        self.units = read_units(page)
+        response = {"Items": [dict(i) for i in page]}
+        if Limit and start + Limit < len(items):
+            last = page[-1]
+            response["LastEvaluatedKey"] = {k: last[k] for k in ("message_id", "chat_id", "created_at")}
+        return response
+
+
+class MemoryChatsTable:
+    def __init__(self, chat_ids):
+        self.items = {chat_id: {"chat_id": chat_id, "chat_name": chat_id, "user_id": "check"} for chat_id in chat_ids}
+
+    def get_item(self, Key, ProjectionExpression=None):
+        item = self.items.get(Key["chat_id"])
+        return {"Item": project(item, ProjectionExpression)} if item else {}
+
+
+def add_messages(table, chat_id, count):
+    start = datetime.datetime(2025, 1, 1)
+    for n in range(count):
+        table.items.append({"message_id": str(uuid.uuid4()), "chat_id": chat_id,
+                            "created_at": (start + datetime.timedelta(seconds=n)).isoformat(),
+                            "sender": "USER" if n % 2 == 0 else "AI", "content": f"message {n} " + "x" * 1000})
+
+
+class WindowCheck(Check):
+    def __init__(self, messages, chats, table):
+        self.messages = messages
+        self.chats = chats
+        self.table = table
+        self.failures = 0
+
+    def run(self, limit, sizes):
+        for chat_id, count in sizes.items():
+            expected = [i for i in self.table.items if i["chat_id"] == chat_id]
+            expected.sort(key=lambda i: i["created_at"])
+
+            # 1. Últimos mensajes y páginas hacia atrás
+            page = self.messages.get_messages_by_chat(chat_id, limit=limit, cursor=None)
+            opening_units = self.table.units
+            self.expect([m.message_id for m in page.items] == [i["message_id"] for i in expected[-limit:]],
+                        f"{chat_id}: the first page is the latest {min(limit, count)} messages, oldest first")
+            history, pages = list(page.items), 1
+            while page.next_cursor:
+                page = self.messages.get_messages_by_chat(chat_id, limit=limit, cursor=page.next_cursor)
+                history = list(page.items) + history
+                pages += 1
+            self.expect([m.message_id for m in history] == [i["message_id"] for i in expected],
+                        f"{chat_id}: {pages} pages back to the first message, none missing or repeated")
+
+            # 2. Coste de abrir el chat
+            before = read_units(expected)
+            self.expect(opening_units <= read_units(expected[-limit:]),
+                        f"{chat_id}: opening it reads {opening_units:g} read units (whole chat: {before:g})")
+
+        # 3. /chats/{chat_id}
+        chat_id = next(iter(sizes))
+        queries = self.table.queries
+        chat = self.chats.get_chat(chat_id, include_messages=False, messages_limit=limit)
+        self.expect(self.table.queries == queries and chat.messages == [],
+                    "get_chat does not read messages unless include_messages")
+        chat = self.chats.get_chat(chat_id, include_messages=True, messages_limit=limit)
+        older = self.messages.get_messages_by_chat(chat_id, limit=limit, cursor=chat.messages_next_cursor)
+        expected = sorted((i for i in self.table.items if i["chat_id"] == chat_id), key=lambda i: i["created_at"])
+        self.expect([m.message_id for m in older.items + chat.messages] ==
+                    [i["message_id"] for i in expected[-2 * limit:]],
+                    f"include_messages embeds the latest {len(chat.messages)} and its cursor pages back")
+
+        # 4. Cursores inválidos
+        other_chat = self.messages.get_messages_by_chat(chat_id, limit=5, cursor=None).next_cursor
+        self.expect_status(lambda: self.messages.get_messages_by_chat("long", limit=5, cursor=other_chat), 400,
+                           "a cursor from another chat")
+        self.expect_status(lambda: self.messages.get_messages_by_chat("long", limit=5, cursor="no-es-un-cursor"), 400,
+                           "a malformed cursor")
+        return self.failures == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Message window check against an in-memory table")
+    parser.add_argument("--limit", type=int, default=20, help="messages per page")
+    args = parser.parse_args()
+
+    os.environ["ENVIRONMENT"] = "development"
+    for key, value in {"AWS_REGION": "us-east-1", "AWS_DEFAULT_REGION": "us-east-1"}.items():
+        os.environ.setdefault(key, value)
+
+    from app.api.v1 import chats, messages
+
+    sizes = {"short": 50, "long": 5000}
+    table = MemoryMessagesTable()
+    for chat_id, count in sizes.items():
+        add_messages(table, chat_id, count)
+    messages.get_messages_table = lambda: table
+    chats.get_messages_table = lambda: table
+    chats.get_chats_table = lambda: MemoryChatsTable(sizes)
+
+    ok = WindowCheck(messages, chats, table).run(args.limit, sizes)
+    print("PASSED" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,199 @@
+"""
+Microbenchmark del parser SSE de app/sse.py frente a la lectura anterior.
+
+- CPU por evento sobre un stream grabado de varios MB (por defecto uno
+  sintético con la forma de los eventos de AgentCore: fragmentos de texto,
+  comentarios keep-alive, ids y algunos eventos grandes), leyendo un
+  StreamingBody de botocore como en invoke_agent:
+    * antes: iter_lines(chunk_size=1) + json.loads de cada línea `data: `
+    * ahora: iter_sse_events(...) + json.loads(event.data)
+- latencia de entrega: un escritor envía cada frame en dos mitades por un pipe;
+  se mide cuánto tarda en salir cada evento desde que llega su último byte
+  (read1 no espera a llenar el bloque; read(64KB) sí)
+- corrección: el mismo stream partido en todos los tamaños de trozo da los
+  mismos eventos, incluyendo data multilínea, \\r\\n, comentarios e ids
+
+Uso (desde backend/lambda_api):
+    python sse_bench.py --megabytes 4
+    python sse_bench.py --stream captura.sse        # stream real grabado
+    python sse_bench.py --megabytes 4 --save captura.sse
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+from botocore.response import StreamingBody
+
+from app.sse import READ_CHUNK_SIZE, SSEParser, iter_sse_events
+
+WORDS = ("el mercado de café en República Dominicana crece un 12% anual, con "
+         "competidores locales y márgenes estables según los últimos reportes").split()
+
+
+def build_stream(megabytes, seed=7):
+    """Stream con la forma del de AgentCore: casi todo fragmentos pequeños de texto"""
+    rng = random.Random(seed)
+    frames, size, n = [], 0, 0
+    while size < megabytes * 1024 * 1024:
+        n += 1
+        roll = rng.random()
+        if roll < 0.002:
+            # Resultado de herramienta grande (p. ej. una imagen en base64)
+            event = {"message": "", "data": {"image": "A" * rng.randint(20_000, 80_000)}}
+        elif roll < 0.05:
+            event = {"message": "", "data": {"tool": "research_web", "results": [
+                {"title": " ".join(rng.choices(WORDS, k=8)), "url": f"https://example.com/{n}"}
+                for _ in range(5)]}}
+        else:
+            event = {"message": " ".join(rng.choices(WORDS, k=rng.randint(1, 4)))}
+        frame = f"id: {n}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        if n % 50 == 0:
+            frame = ": keep-alive\n\n" + frame
+        encoded = frame.encode("utf-8")
+        frames.append(encoded)
+        size += len(encoded)
+    return b"".join(frames)
+
+
+def read_before(body):
+    """Lectura anterior de invoke_agent"""
+    for line in body.iter_lines(chunk_size=1):
+        if line:
+            line = line.decode("utf-8")
+            if line.startswith("data: "):
+                yield json.loads(line[6:])
+
+
+def read_now(body):
+    for event in iter_sse_events(body):
+        yield json.loads(event.data)
+
+
+def streaming_body(data):
+    return StreamingBody(io.BytesIO(data), len(data))
+
+
+def cpu_per_event(name, reader, data, runs):
+    samples, count = [], 0
+    for _ in range(runs):
+        body = streaming_body(data)
+        started = time.process_time()
+        count = sum(1 for _ in reader(body))
+        samples.append(time.process_time() - started)
+    cpu = statistics.median(samples)
+    print(f"{name:<34} events={count:<7} cpu={cpu * 1000:>9.1f}ms  "
+          f"{cpu / count * 1e6:>7.2f}us/event  {len(data) / cpu / 1e6:>7.1f}MB/s")
+    return cpu / count
+
+
+def delivery_delays(read_events, frames, gap):
+    """Segundos entre el último byte de cada frame y la entrega de su evento"""
+    read_fd, write_fd = os.pipe()
+    sent = []
+
+    def writer():
+        with os.fdopen(write_fd, "wb", buffering=0) as pipe:
+            for frame in frames:
+                half = len(frame) // 2
+                pipe.write(frame[:half])
+                time.sleep(gap / 2)
+                sent.append(time.perf_counter())
+                pipe.write(frame[half:])
+                time.sleep(gap / 2)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    delays = []
+    with os.fdopen(read_fd, "rb") as pipe:
+        for i, _ in enumerate(read_events(StreamingBody(pipe, None))):
+            delays.append(time.perf_counter() - sent[i])
+    thread.join()
+    return delays
+
+
+def latency(events, gap):
+    frames = [f"data: {json.dumps({'message': f'token {i}'})}\n\n".encode() for i in range(events)]
+    readers = [
+        ("before: iter_lines(chunk_size=1)", read_before),
+        ("now: iter_sse_events (read1)", read_now),
+        (f"naive: read({READ_CHUNK_SIZE // 1024}KB) blocks",
+         lambda body: (e.data for e in _blocking_events(body))),
+    ]
+    print(f"\ndelivery delay after a frame's last byte ({events} frames, {gap * 1000:.0f}ms apart):")
+    for name, reader in readers:
+        delays = delivery_delays(reader, frames, gap)
+        print(f"  {name:<34} median={statistics.median(delays) * 1000:>7.2f}ms  max={max(delays) * 1000:>7.2f}ms")
+
+
+def _blocking_events(body):
+    # Contraejemplo: read(n) espera a tener n bytes, así que nada sale hasta el final
+    parser = SSEParser()
+    while True:
+        chunk = body.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def check_chunking():
+    sample = (b": comment\r\nid: 1\r\ndata: {\"message\": \"hola\"}\r\n\r\n"
+              b"event: result\nid: 2\ndata: {\"a\":\ndata: 1}\n\n"
+              b"retry: 500\rdata: {\"message\": \"\xc3\xb1and\xc3\xba\"}\r\r"
+              b"data: {\"message\": \"sin cierre\"}")
+    expected = None
+    for size in range(1, len(sample) + 1):
+        parser = SSEParser()
+        events = []
+        for i in range(0, len(sample), size):
+            events += parser.feed(sample[i:i + size])
+        events += parser.close()
+        if expected is None:
+            expected = events
+        elif events != expected:
+            return False
+    return [json.loads(e.data) for e in expected] == [
+        {"message": "hola"}, {"a": 1}, {"message": "ñandú"}, {"message": "sin cierre"}] \
+        and [e.id for e in expected] == ["1", "2", "2", "2"] and expected[1].event == "result"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SSE parser microbenchmark")
+    parser.add_argument("--megabytes", type=float, default=4, help="size of the synthetic stream")
+    parser.add_argument("--stream", help="recorded SSE stream to replay instead of the synthetic one")
+    parser.add_argument("--save", help="write the synthetic stream to this file")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency-events", type=int, default=40)
+    args = parser.parse_args()
+
+    if args.stream:
+        with open(args.stream, "rb") as f:
+            data = f.read()
+    else:
+        data = build_stream(args.megabytes)
+        if args.save:
+            with open(args.save, "wb") as f:
+                f.write(data)
+    print(f"stream: {len(data) / 1024 / 1024:.1f}MB ({args.stream or 'synthetic'})\n")
+
+    # Una sola pasada: con eventos grandes la lectura anterior tarda minutos
+    before = cpu_per_event("before: iter_lines(chunk_size=1)", read_before, data, 1)
+    now = cpu_per_event("now: iter_sse_events", read_now, data, args.runs)
+    print(f"\nCPU per event: {before / now:.1f}x less")
+
+    latency(args.latency_events, gap=0.01)
+
+    # Menos de 1MB para no repetir la pasada lenta completa
+    data = data[:data.rfind(b"\n\n", 0, 1024 * 1024) + 2]
+    same = list(read_before(streaming_body(data))) == list(read_now(streaming_body(data)))
+    chunking = check_chunking()
+    print(f"\nsame events as before: {same}; chunk-size independent (multi-line, CRLF, comments, ids): {chunking}")
+    ok = same and chunking
+    print("PASSED" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
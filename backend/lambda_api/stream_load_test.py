@@ -0,0 +1,244 @@
+"""
+Prueba de carga del endpoint /api/v1/agent/message_with_bot_stream.
+
+Levanta la app con uvicorn (un solo worker, un solo event loop) contra un
+stub local de InvokeAgentRuntime que emite --events eventos separados por
+--delay segundos, y una tabla de chats cuyo put_item tarda --put-delay
+(latencia de DynamoDB). Abre --streams chats nuevos a la vez y mide:
+
+- tiempo total de todos los streams frente a uno solo: si no se serializan,
+  la relación se mantiene cerca de 1 (antes crecía con el número de streams)
+- tiempo hasta el primer fragmento de texto: la creación del chat ya no lo retrasa
+- desconexión: un cliente que cierra a mitad de stream (y no reconecta) hace
+  que se cierre también la conexión con el agente
+- consumidor lento: con la cola llena durante más de PUT_POLL_SECONDS, cada
+  elemento llega una sola vez y en orden
+
+Con --before usa la implementación anterior (lectura bloqueante dentro del
+event loop y put_item antes de invocar al agente) para comparar.
+
+Uso (desde backend/lambda_api):
+    python stream_load_test.py --streams 10
+    python stream_load_test.py --streams 10 --before
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+stub = {"events": 10, "delay": 0.1, "aborted": 0, "requests": 0}
+stub_lock = threading.Lock()
+
+
+class StubAgentCoreHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with stub_lock:
+            stub["requests"] += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i in range(stub["events"]):
+                time.sleep(stub["delay"])
+                self._chunk(f"data: {json.dumps({'message': f'token {i} '})}\n\n".encode())
+            self._chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            with stub_lock:
+                stub["aborted"] += 1
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SlowChatsTable:
+    """put_item con la latencia de DynamoDB"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.items = []
+
+    def put_item(self, Item):
+        time.sleep(self.delay)
+        self.items.append(Item)
+
+
+def use_previous_implementation(agent):
+    """Lectura bloqueante en el event loop y put_item síncrono, como antes"""
+    from app.agentcore import get_agentcore_client
+    from app.sse import iter_sse_events
+
+    async def invoke_agent(prompt, session_id, user_id, memory_id, agent_arn=None):
+        response = get_agentcore_client().invoke_agent_runtime(
+            agentRuntimeArn=agent_arn or os.environ["ARN_BEDROCK_AGENTCORE"],
+            runtimeSessionId=session_id, payload=b"{}")
+        for event in iter_sse_events(response["response"]):
+            yield json.loads(event.data)
+
+    async def create_chat(chats_table, chat_id, chat_name, user_id):
+        chats_table.put_item(Item={"chat_id": chat_id, "chat_name": chat_name, "user_id": user_id})
+
+    agent.invoke_agent = invoke_agent
+    agent._create_chat = create_chat
+
+
+def open_stream(port, user):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    body = json.dumps({"query": "analiza el mercado", "user_id": user})
+    conn.request("POST", "/api/v1/agent/message_with_bot_stream", body=body,
+                 headers={"Content-Type": "application/json"})
+    return conn, conn.getresponse()
+
+
+def run_stream(port, user):
+    started = time.perf_counter()
+    conn, response = open_stream(port, user)
+    first_text, types = None, []
+    for line in response:
+        if line.startswith(b"data: "):
+            event = json.loads(line[6:])
+            types.append(event["type"])
+            if event["type"] == "text" and first_text is None:
+                first_text = time.perf_counter() - started
+    conn.close()
+    return {"first_text": first_text, "total": time.perf_counter() - started, "done": types[-1:] == ["done"]}
+
+
+def run_concurrent(port, streams):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=streams) as pool:
+        results = list(pool.map(lambda i: run_stream(port, f"load-{i}"), range(streams)))
+    return time.perf_counter() - started, results
+
+
+def disconnect_check(port):
+    """Cerrar el cliente tras el primer texto; devuelve si el stub vio cortarse el stream"""
+    with stub_lock:
+        stub["aborted"] = 0
+    conn, response = open_stream(port, "disconnect")
+    for line in response:
+        if line.startswith(b"data: ") and json.loads(line[6:])["type"] == "text":
+            break
+    conn.sock.shutdown(socket.SHUT_RDWR)
+    conn.close()
+    deadline = time.time() + stub["events"] * stub["delay"] + 2
+    while time.time() < deadline:
+        with stub_lock:
+            if stub["aborted"]:
+                return True
+        time.sleep(0.05)
+    return False
+
+
+def slow_consumer_check(items=300):
+    """Cola de 1 elemento y un consumidor que bloquea más que PUT_POLL_SECONDS: sin duplicados ni huecos"""
+    from app import stream_bridge
+
+    poll = stream_bridge.PUT_POLL_SECONDS
+    stream_bridge.PUT_POLL_SECONDS = 0.0005
+    received = []
+
+    async def consume():
+        async for item in stream_bridge.iterate_in_thread(lambda: iter(range(items)), maxsize=1):
+            received.append(item)
+            if item % 3 == 0:
+                time.sleep(0.001)
+            await asyncio.sleep(0)
+
+    try:
+        asyncio.run(asyncio.wait_for(consume(), 10))
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        stream_bridge.PUT_POLL_SECONDS = poll
+    return received == list(range(items))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent SSE streams load test")
+    parser.add_argument("--streams", type=int, default=10)
+    parser.add_argument("--events", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=0.1, help="seconds between agent events")
+    parser.add_argument("--put-delay", type=float, default=0.3, help="seconds per chats put_item")
+    parser.add_argument("--before", action="store_true", help="run the previous (blocking) implementation")
+    args = parser.parse_args()
+    stub.update(events=args.events, delay=args.delay)
+
+    agentcore = ThreadingHTTPServer(("127.0.0.1", 0), StubAgentCoreHandler)
+    threading.Thread(target=agentcore.serve_forever, daemon=True).start()
+    os.environ["AGENTCORE_ENDPOINT_URL"] = f"http://127.0.0.1:{agentcore.server_port}"
+    os.environ["ENVIRONMENT"] = "development"
+    os.environ["ARN_BEDROCK_AGENTCORE"] = "arn:aws:bedrock-agentcore:us-east-1:000000000000:runtime/load-agent"
+    os.environ.setdefault("AWS_REGION", "us-east-1")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "load")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "load")
+    # Sin periodo de gracia para reconectar: el turno abandonado se cancela enseguida
+    os.environ.setdefault("STREAM_RESUME_GRACE_SECONDS", "0")
+
+    import uvicorn
+    import main
+    from app.api.v1 import agent
+
+    chats_table = SlowChatsTable(args.put_delay)
+    agent.get_chats_table = lambda: chats_table
+    if args.before:
+        use_previous_implementation(agent)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    stream_seconds = args.events * args.delay
+    single_wall, _ = run_concurrent(port, 1)
+    wall, results = run_concurrent(port, args.streams)
+    first_text = [r["first_text"] for r in results if r["first_text"] is not None]
+    ratio = wall / single_wall
+    print(f"implementation: {'before (blocking)' if args.before else 'thread bridge'}")
+    print(f"agent stream: {args.events} events x {args.delay * 1000:.0f}ms = {stream_seconds:.1f}s, "
+          f"put_item {args.put_delay * 1000:.0f}ms")
+    print(f"1 stream:  {single_wall:.2f}s")
+    print(f"{args.streams} streams: {wall:.2f}s wall ({ratio:.1f}x one stream), "
+          f"completed {sum(r['done'] for r in results)}/{args.streams}")
+    print(f"first text: median {statistics.median(first_text) * 1000:.0f}ms, "
+          f"max {max(first_text) * 1000:.0f}ms")
+    print(f"chats stored: {len(chats_table.items)}")
+
+    disconnected = disconnect_check(port) if not args.before else None
+    if disconnected is not None:
+        print(f"client disconnect closes the agent stream: {disconnected}")
+
+    exactly_once = slow_consumer_check() if not args.before else None
+    if exactly_once is not None:
+        print(f"slow consumer gets every item once, in order: {exactly_once}")
+
+    server.should_exit = True
+    agentcore.shutdown()
+    ok = (ratio < 2 and all(r["done"] for r in results) and disconnected is not False
+          and exactly_once is not False)
+    print("PASSED" if ok else "FAILED: concurrent streams serialized, did not complete or repeated items")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,311 @@
+"""
+Comprueba la reanudación de streams con Last-Event-ID contra un stub local de
+InvokeAgentRuntime (la app corre con uvicorn en este proceso):
+
+1. el cliente corta la conexión a mitad de respuesta y reconecta con el id del
+   último evento recibido: recibe el resto (lo que se perdió y lo nuevo) sin
+   huecos ni duplicados, y el agente se invocó una sola vez
+2. reanudar un turno ya terminado lo reproduce desde el buffer
+3. ids desconocidos o mal formados: 404 / 400
+4. si nadie reconecta durante STREAM_RESUME_GRACE_SECONDS el turno se cancela
+   y se corta el stream del agente
+5. reanudar en otra instancia: dos procesos de la app comparten la tabla de
+   eventos (un endpoint local con el protocolo de DynamoDB) y cada uno se
+   congela con SIGSTOP en cuanto no tiene peticiones en curso, como un entorno
+   de Lambda entre invocaciones. El cliente se desconecta de la instancia que
+   ejecuta el turno y reanuda en la otra: recibe el turno completo hasta `done`
+
+Uso (desde backend/lambda_api):
+    python stream_resume_check.py
+"""
+import argparse
+import http.client
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from stream_load_test import StubAgentCoreHandler, free_port, stub, stub_lock
+
+GRACE_SECONDS = 1.0
+IDLE_SECONDS = 3.0  # STREAM_RESUME_IDLE_SECONDS de las instancias del punto 5
+STREAM_PATH = "/api/v1/agent/message_with_bot_stream"
+EVENTS_TABLE = "stream-events-check"
+
+events_table = {}  # (turn_id, seq) -> item con el formato de DynamoDB
+events_table_lock = threading.Lock()
+
+
+class EventsTableHandler(BaseHTTPRequestHandler):
+    """PutItem, GetItem y Query (turn_id = :v AND seq > :v) de la tabla de eventos, con el protocolo de DynamoDB"""
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        operation = self.headers["X-Amz-Target"].rsplit(".", 1)[1]
+        with events_table_lock:
+            if operation == "PutItem":
+                item = request["Item"]
+                events_table[(item["turn_id"]["S"], int(item["seq"]["N"]))] = item
+                body = {}
+            elif operation == "GetItem":
+                item = events_table.get((request["Key"]["turn_id"]["S"], int(request["Key"]["seq"]["N"])))
+                body = {"Item": item} if item else {}
+            else:
+                names, values = request["ExpressionAttributeNames"], request["ExpressionAttributeValues"]
+                conditions = {names[name]: values[value] for name, _, value in
+                              re.findall(r"(#\w+) (=|>) (:\w+)", request["KeyConditionExpression"])}
+                turn_id, after = conditions["turn_id"]["S"], int(conditions["seq"]["N"])
+                items = [item for (t, seq), item in sorted(events_table.items()) if t == turn_id and seq > after]
+                body = {"Items": items, "Count": len(items), "ScannedCount": len(items)}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-amz-json-1.0")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FrozenWhenIdle:
+    """App ASGI que detiene el proceso (SIGSTOP) cuando no le quedan peticiones en curso"""
+
+    def __init__(self, app):
+        self.app = app
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                os.kill(os.getpid(), signal.SIGSTOP)
+
+
+class Instance:
+    """Proceso de la app con la tabla de eventos compartida; se despierta (SIGCONT) antes de cada petición"""
+
+    def __init__(self, env):
+        self.port = free_port()
+        self.process = subprocess.Popen([sys.executable, __file__, "--instance", str(self.port)], env=env)
+        deadline = time.time() + 30
+        while True:
+            self.thaw()
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+                conn.request("GET", "/health")
+                conn.getresponse().read()
+                conn.close()
+                return
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def thaw(self):
+        self.process.send_signal(signal.SIGCONT)
+
+    def stop(self):
+        self.process.kill()
+        self.process.wait()
+
+
+def read_frames(response, limit=None):
+    """[(id, payload)] de los frames SSE; se detiene tras `limit` frames de texto"""
+    frames, event_id, texts = [], None, 0
+    for line in response:
+        line = line.rstrip(b"\r\n")
+        if line.startswith(b"id: "):
+            event_id = line[4:].decode()
+        elif line.startswith(b"data: "):
+            payload = json.loads(line[6:])
+            frames.append((event_id, payload))
+            texts += payload["type"] == "text"
+            if limit is not None and texts >= limit:
+                break
+    return frames
+
+
+def post_stream(port, chat_id):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    conn.request("POST", STREAM_PATH, body=json.dumps({"query": "hola", "user_id": "resume", "chat_id": chat_id}),
+                 headers={"Content-Type": "application/json"})
+    return conn, conn.getresponse()
+
+
+def resume(port, last_event_id):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Last-Event-ID": last_event_id} if last_event_id is not None else {}
+    conn.request("GET", f"{STREAM_PATH}/resume", headers=headers)
+    return conn, conn.getresponse()
+
+
+def drop(conn):
+    conn.sock.shutdown(socket.SHUT_RDWR)
+    conn.close()
+
+
+def text_of(frames):
+    return "".join(payload.get("content", "") for _, payload in frames if payload["type"] == "text")
+
+
+class Check:
+    def __init__(self, port):
+        self.port = port
+        self.failures = 0
+
+    def expect(self, ok, message):
+        print(f"{'ok  ' if ok else 'FAIL'} {message}")
+        self.failures += not ok
+
+    def run(self):
+        expected_text = "".join(f"token {i} " for i in range(stub["events"]))
+
+        # 1. Corte a mitad de respuesta y reconexión
+        with stub_lock:
+            requests_before = stub["requests"]
+        conn, response = post_stream(self.port, str(uuid.uuid4()))
+        first = read_frames(response, limit=3)
+        drop(conn)
+        time.sleep(stub["delay"] * 2.5)  # el turno sigue produciendo mientras tanto
+        conn, response = resume(self.port, first[-1][0])
+        rest = read_frames(response)
+        conn.close()
+        frames = first + rest
+        seqs = [int(event_id.rsplit(":", 1)[1]) for event_id, _ in frames]
+        self.expect(seqs == list(range(1, len(seqs) + 1)), f"ids are contiguous across the reconnect ({len(seqs)} events)")
+        self.expect(text_of(frames) == expected_text and frames[-1][1]["type"] == "done",
+                    "the reconnected client gets the whole answer and the done event")
+        with stub_lock:
+            invocations = stub["requests"] - requests_before
+        self.expect(invocations == 1, f"the agent ran once (invocations: {invocations})")
+
+        # 2. Turno terminado: se reproduce desde el buffer
+        conn, response = resume(self.port, frames[0][0])
+        replay = read_frames(response)
+        conn.close()
+        self.expect(replay == frames[1:], "resuming a finished turn replays it from the buffer")
+
+        # 3. Ids desconocidos o mal formados
+        for last_event_id, status in ((f"{uuid.uuid4().hex}:3", 404), ("sin-id", 400), (None, 400)):
+            conn, response = resume(self.port, last_event_id)
+            response.read()
+            conn.close()
+            self.expect(response.status == status, f"Last-Event-ID {last_event_id!r} -> {response.status}")
+
+        # 4. Nadie reconecta: el turno se cancela tras el periodo de gracia
+        # (con un stream más largo que el periodo de gracia)
+        with stub_lock:
+            stub.update(aborted=0, events=int(GRACE_SECONDS / stub["delay"]) * 4)
+        conn, response = post_stream(self.port, str(uuid.uuid4()))
+        first = read_frames(response, limit=1)
+        drop(conn)
+        deadline = time.time() + GRACE_SECONDS * 3
+        while time.time() < deadline and not stub["aborted"]:
+            time.sleep(0.05)
+        self.expect(stub["aborted"] == 1, "an abandoned turn is cancelled after the grace period")
+        conn, response = resume(self.port, first[-1][0])
+        tail = read_frames(response)
+        conn.close()
+        self.expect(tail and tail[-1][1]["type"] == "error", "resuming a cancelled turn ends with an error event")
+        return self.failures == 0
+
+    def run_cross_instance(self, env):
+        # 5. Reanudar en otra instancia (un turno más largo que el periodo de gracia)
+        with stub_lock:
+            stub.update(events=int(GRACE_SECONDS / stub["delay"]) * 3)
+            requests_before = stub["requests"]
+        expected_text = "".join(f"token {i} " for i in range(stub["events"]))
+        origin, other = Instance(env), Instance(env)
+        try:
+            origin.thaw()
+            conn, response = post_stream(origin.port, str(uuid.uuid4()))
+            first = read_frames(response, limit=3)
+            drop(conn)
+            started = time.time()
+            other.thaw()
+            conn, response = resume(other.port, first[-1][0])
+            rest = read_frames(response)
+            conn.close()
+        finally:
+            origin.stop()
+            other.stop()
+        frames = first + rest
+        seqs = [int(event_id.rsplit(":", 1)[1]) for event_id, _ in frames if event_id]
+        self.expect(seqs == list(range(1, len(seqs) + 1)),
+                    f"another instance resumes the turn from the table, ids contiguous ({len(seqs)} events)")
+        self.expect(text_of(frames) == expected_text and frames[-1][1]["type"] == "done",
+                    f"the turn keeps running after the disconnect and ends with done "
+                    f"(last event: {frames[-1][1]['type']}, {time.time() - started:.1f}s after resuming)")
+        with stub_lock:
+            invocations = stub["requests"] - requests_before
+        self.expect(invocations == 1, f"the agent ran once across instances (invocations: {invocations})")
+        return self.failures == 0
+
+
+def serve_instance(port):
+    """Modo --instance: la app en este proceso, congelada mientras no atiende peticiones"""
+    import uvicorn
+    import main
+
+    uvicorn.run(FrozenWhenIdle(main.app), host="127.0.0.1", port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Last-Event-ID resume check against a local AgentCore stub")
+    parser.add_argument("--instance", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.instance:
+        serve_instance(args.instance)
+        sys.exit(0)
+
+    stub.update(events=10, delay=0.1)
+    agentcore = ThreadingHTTPServer(("127.0.0.1", 0), StubAgentCoreHandler)
+    threading.Thread(target=agentcore.serve_forever, daemon=True).start()
+    os.environ["AGENTCORE_ENDPOINT_URL"] = f"http://127.0.0.1:{agentcore.server_port}"
+    os.environ["ENVIRONMENT"] = "development"
+    os.environ["ARN_BEDROCK_AGENTCORE"] = "arn:aws:bedrock-agentcore:us-east-1:000000000000:runtime/resume-agent"
+    os.environ["STREAM_RESUME_GRACE_SECONDS"] = str(GRACE_SECONDS)
+    os.environ.pop("DYNAMO_STREAM_EVENTS_TABLE_NAME", None)  # solo el buffer en memoria
+    for key, value in {"AWS_REGION": "us-east-1", "AWS_DEFAULT_REGION": "us-east-1",
+                       "AWS_ACCESS_KEY_ID": "resume", "AWS_SECRET_ACCESS_KEY": "resume"}.items():
+        os.environ.setdefault(key, value)
+
+    import uvicorn
+    import main
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    check = Check(port)
+    ok = check.run()
+
+    table = ThreadingHTTPServer(("127.0.0.1", 0), EventsTableHandler)
+    threading.Thread(target=table.serve_forever, daemon=True).start()
+    instance_env = {**os.environ,
+                    "DYNAMO_STREAM_EVENTS_TABLE_NAME": EVENTS_TABLE,
+                    "AWS_ENDPOINT_URL_DYNAMODB": f"http://127.0.0.1:{table.server_port}",
+                    "STREAM_RESUME_IDLE_SECONDS": str(IDLE_SECONDS),
+                    "STREAM_REPLAY_POLL_SECONDS": "0.1"}
+    ok = check.run_cross_instance(instance_env) and ok
+    table.shutdown()
+
+    server.should_exit = True
+    agentcore.shutdown()
+    print("PASSED" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
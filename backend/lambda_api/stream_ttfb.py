@@ -0,0 +1,166 @@
+"""
+Mide el tiempo hasta el primer byte y los huecos entre eventos del SSE de
+/api/v1/agent/message_with_bot_stream en cada modo de despliegue:
+
+- buffered: main.handler (Mangum) invocado como lo haría la Function URL;
+  la respuesta solo existe cuando el agente termina
+- stream: uvicorn con el mismo comando que dockerfile.stream (lo que Lambda
+  Web Adapter reenvía en modo response_stream)
+- --url: una Function URL ya desplegada
+
+En local el agente es un stub que emite --events eventos cada --delay segundos.
+En modo stream los huecos entre eventos deberían parecerse a --delay y el
+primer byte llegar antes del primer evento del agente.
+
+Uso (desde backend/lambda_api):
+    python stream_ttfb.py
+    python stream_ttfb.py --events 20 --delay 0.2
+    python stream_ttfb.py --url https://xxxx.lambda-url.us-east-1.on.aws --chat-id <chat>
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from stream_load_test import StubAgentCoreHandler, free_port, stub
+
+PATH = "/api/v1/agent/message_with_bot_stream"
+
+
+def request_body(chat_id):
+    return json.dumps({"query": "analiza el mercado", "user_id": "ttfb", "chat_id": chat_id})
+
+
+def read_events(response, started):
+    """(segundos del primer byte, [segundos de cada evento SSE])"""
+    first_byte, events, buffer = None, [], b""
+    while True:
+        chunk = response.read1(65536)
+        if not chunk:
+            break
+        now = time.perf_counter() - started
+        if first_byte is None:
+            first_byte = now
+        buffer += chunk
+        frames = buffer.split(b"\n\n")
+        buffer = frames.pop()
+        events += [now] * sum(1 for frame in frames if b"data:" in frame)
+    return first_byte, events
+
+
+def measure_http(url, chat_id):
+    parsed = urlparse(url)
+    connection_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+    conn = connection_class(parsed.netloc, timeout=900)
+    started = time.perf_counter()
+    conn.request("POST", PATH, body=request_body(chat_id), headers={"Content-Type": "application/json"})
+    first_byte, events = read_events(conn.getresponse(), started)
+    conn.close()
+    return first_byte, events
+
+
+def measure_buffered(chat_id):
+    """Invocar main.handler con un evento de Function URL (payload 2.0)"""
+    import main
+
+    class Context:
+        aws_request_id = "stream-ttfb"
+
+    event = {
+        "version": "2.0", "routeKey": "$default", "rawPath": PATH, "rawQueryString": "",
+        "headers": {"host": "localhost", "content-type": "application/json"},
+        "requestContext": {"http": {"method": "POST", "path": PATH, "sourceIp": "127.0.0.1",
+                                    "protocol": "HTTP/1.1"}, "stage": "$default"},
+        "body": request_body(chat_id), "isBase64Encoded": False,
+    }
+    started = time.perf_counter()
+    response = main.handler(event, Context())
+    elapsed = time.perf_counter() - started
+    body = response["body"]
+    if response.get("isBase64Encoded"):
+        body = base64.b64decode(body).decode("utf-8")
+    # Todo llega en una sola respuesta: primer byte = último evento = fin
+    return elapsed, [elapsed] * body.count("data:")
+
+
+def start_uvicorn(env):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                                "--port", str(port), "--no-access-log", "--log-level", "warning"],
+                               cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                               stdout=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("uvicorn did not start")
+
+
+def report(name, first_byte, events):
+    gaps = [b - a for a, b in zip(events, events[1:])]
+    line = f"{name:<10} events={len(events):<4} first byte={first_byte * 1000:>8.0f}ms"
+    if events:
+        line += f"  first event={events[0] * 1000:>8.0f}ms  last={events[-1] * 1000:>8.0f}ms"
+    if gaps:
+        p95 = sorted(gaps)[int(len(gaps) * 0.95)]
+        line += (f"  gaps median={statistics.median(gaps) * 1000:>6.0f}ms "
+                 f"p95={p95 * 1000:>6.0f}ms max={max(gaps) * 1000:>6.0f}ms")
+    print(line)
+    return gaps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SSE time-to-first-byte and inter-chunk gap harness")
+    parser.add_argument("--events", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=0.2, help="seconds between agent events (stub)")
+    parser.add_argument("--url", help="measure a deployed Function URL instead of the local modes")
+    # runtimeSessionId necesita al menos 33 caracteres
+    parser.add_argument("--chat-id", default="ttfb-chat-00000000-0000-0000-0000-000000000000",
+                        help="existing chat (no chat is created)")
+    args = parser.parse_args()
+
+    if args.url:
+        report("deployed", *measure_http(args.url, args.chat_id))
+        sys.exit(0)
+
+    stub.update(events=args.events, delay=args.delay)
+    agentcore = ThreadingHTTPServer(("127.0.0.1", 0), StubAgentCoreHandler)
+    threading.Thread(target=agentcore.serve_forever, daemon=True).start()
+    os.environ["AGENTCORE_ENDPOINT_URL"] = f"http://127.0.0.1:{agentcore.server_port}"
+    os.environ["ENVIRONMENT"] = "development"
+    os.environ["ARN_BEDROCK_AGENTCORE"] = "arn:aws:bedrock-agentcore:us-east-1:000000000000:runtime/ttfb-agent"
+    for key, value in {"AWS_REGION": "us-east-1", "AWS_DEFAULT_REGION": "us-east-1",
+                       "AWS_ACCESS_KEY_ID": "ttfb", "AWS_SECRET_ACCESS_KEY": "ttfb"}.items():
+        os.environ.setdefault(key, value)
+
+    print(f"agent stub: {args.events} events every {args.delay * 1000:.0f}ms "
+          f"(+ metadata and done events from the API)\n")
+    report("buffered", *measure_buffered(args.chat_id))
+
+    process, url = start_uvicorn(dict(os.environ))
+    try:
+        stream_first_byte, events = measure_http(url, args.chat_id)
+    finally:
+        process.terminate()
+        process.wait()
+    gaps = report("stream", stream_first_byte, events)
+    agentcore.shutdown()
+
+    # En streaming el primer byte (metadata) no espera al agente y los eventos llegan a su ritmo
+    ok = (stream_first_byte < args.delay and len(events) >= args.events + 2
+          and statistics.median(gaps) < args.delay * 2)
+    print("\nPASSED" if ok else "\nFAILED: the stream mode did not deliver events as they were produced")
+    sys.exit(0 if ok else 1)
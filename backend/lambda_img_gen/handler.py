@@ -1,19 +1,70 @@
 import base64
+import io
 import json
 import os
 import random
+import re
+import time
+import uuid
 from string import Template
 import boto3
 
+try:
+    from PIL import Image
+except ImportError:  # Pillow not packaged: originals are still uploaded, just without WebP derivatives
+    Image = None
+
 # Constants
 IMAGE_MODEL_ID = "amazon.nova-canvas-v1:0"
 TEXT_MODEL_ID = "amazon.nova-pro-v1:0"
 BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
 REGION_NAME = os.getenv("AWS_REGION")
 
+# Nova Canvas limits for textToImageParams
+MAX_PROMPT_LENGTH = 1024
+MAX_NEGATIVE_TEXT_LENGTH = 1024
+# Nova Canvas ignores negations in the positive prompt; they belong in negativeText.
+# Only a negation followed by what it excludes counts ("no people", "without text"):
+# compounds such as "no-code" or "No. 1" are ordinary product terms
+NEGATION_PATTERN = re.compile(r"\b(no|not|without|never|avoid|don't|dont|exclude|excluding)\s+\w", re.IGNORECASE)
+
+# Generation tiers: "draft" is a single small image for quick exploration,
+# "final" renders the full-size variations (same seed + prompt to upgrade a draft)
+IMAGE_TIERS = {
+    "draft": {"quality": "standard", "height": 512, "width": 512, "numberOfImages": 1},
+    "final": {"quality": "standard", "height": 1024, "width": 1024, "numberOfImages": 3},
+}
+DEFAULT_TIER = "draft"
+MAX_SEED = 858993459
+
+# WebP derivatives uploaded next to each PNG (longest side in px, never upscaled)
+DERIVATIVE_SIZES = {
+    "thumbnail": 256,
+    "medium": 768,
+}
+WEBP_QUALITY = 80
+PRESIGNED_URL_EXPIRATION = 3600  # 1 hour
+
+# Async jobs: POST /generate-image/jobs answers 202 with a job id and the work runs
+# in an asynchronous self-invocation that records its progress in DynamoDB
+IMAGE_JOBS_TABLE_NAME = os.getenv("IMAGE_JOBS_TABLE_NAME", "deep-market-analyzer-image-jobs")
+JOB_TTL_SECONDS = int(os.getenv("IMAGE_JOB_TTL_SECONDS", "86400"))
+JOB_TERMINAL_STATUSES = ("succeeded", "failed")
+# API Gateway cuts requests at 29s, so long-polls must return before that
+MAX_JOB_WAIT_SECONDS = 20
+JOB_POLL_INTERVAL = 0.5
+JOB_POLL_MAX_INTERVAL = 2.0
+
+class InvalidPromptError(ValueError):
+    """A precomposed prompt that breaks the Nova Canvas rules (the caller can let the Lambda compose one)"""
+    error_code = "invalid_prompt"
+
+
 # Create AWS clients outside the handler (best practice for Lambda)
 client = boto3.client("bedrock-runtime", region_name=REGION_NAME)
 s3_client = boto3.client('s3', region_name=REGION_NAME)
+lambda_client = boto3.client('lambda', region_name=REGION_NAME)
+dynamodb = boto3.resource('dynamodb', region_name=REGION_NAME)
 
 
 
@@ -122,23 +173,76 @@ def generate_image_prompt(use_case: str) -> dict:
         raise ValueError("Failed to parse JSON from model response")
 
 
-def generate_image(use_case: str, user_id: str = "default_user") -> list[str]:
-    seed = random.randint(0, 858993460)
-    # Generate the image prompt
-    prompt_data = generate_image_prompt(use_case)
+def validate_prompt_data(prompt: str, negative_text: str = None) -> dict:
+    """
+    Validate a precomposed prompt against Nova Canvas rules.
+    - prompt: required, caption-style, no negations, at most MAX_PROMPT_LENGTH chars
+    - negative_text: optional, at most MAX_NEGATIVE_TEXT_LENGTH chars
+    Returns the prompt data in the {"prompt", "negativeText"} shape used by generate_image.
+    Raises ValueError when a rule is violated.
+    """
+    if not isinstance(prompt, str) or not prompt.strip():
+        raise ValueError("prompt must be a non-empty string")
+    prompt = prompt.strip()
+    if len(prompt) > MAX_PROMPT_LENGTH:
+        raise ValueError(f"prompt exceeds {MAX_PROMPT_LENGTH} characters ({len(prompt)})")
+
+    negation = NEGATION_PATTERN.search(prompt)
+    if negation:
+        raise ValueError(
+            f"prompt must not contain negations (found '{negation.group(1)}'); "
+            "move exclusions to negativeText"
+        )
+
+    prompt_data = {"prompt": prompt}
+    if negative_text is not None:
+        if not isinstance(negative_text, str):
+            raise ValueError("negativeText must be a string")
+        negative_text = negative_text.strip()
+        if len(negative_text) > MAX_NEGATIVE_TEXT_LENGTH:
+            raise ValueError(f"negativeText exceeds {MAX_NEGATIVE_TEXT_LENGTH} characters ({len(negative_text)})")
+        if negative_text:
+            prompt_data["negativeText"] = negative_text
+    return prompt_data
+
+
+def generate_image(use_case: str,
+                   user_id: str = "default_user",
+                   prompt_data: dict = None,
+                   tier: str = DEFAULT_TIER,
+                   seed: int = None,
+                   on_progress=None) -> dict:
+    """
+    Generate images for a use case and upload them to S3.
+    If prompt_data ({"prompt", "negativeText"}) is provided it is sent to Nova Canvas
+    as-is; otherwise the prompt is composed from the use case with the text model.
+    `tier` selects the size/count from IMAGE_TIERS; passing the seed and prompt of a
+    draft with tier "final" renders final-quality variations of that draft.
+    Returns the presigned URLs together with the seed, prompt and tier used.
+    `on_progress(stage, images_done, images_total)` is called as the work advances.
+    """
+    def report(stage, done=0):
+        if on_progress:
+            on_progress(stage, done, IMAGE_TIERS[tier]["numberOfImages"])
+
+    if tier not in IMAGE_TIERS:
+        raise ValueError(f"Invalid tier: {tier}. Must be one of: {', '.join(IMAGE_TIERS)}")
+    if seed is None:
+        seed = random.randint(0, MAX_SEED)
+    # Generate the image prompt unless the caller already composed it
+    if prompt_data is None:
+        report("composing_prompt")
+        prompt_data = generate_image_prompt(use_case)
+    text_to_image_params = {"text": prompt_data["prompt"]}
+    if prompt_data.get("negativeText"):
+        text_to_image_params["negativeText"] = prompt_data["negativeText"]
     # Format the request payload using the model's native structure.
     native_request = {
         "taskType": "TEXT_IMAGE",
-        "textToImageParams": {
-            "text": prompt_data["prompt"], 
-            "negativeText": prompt_data["negativeText"]
-        },
+        "textToImageParams": text_to_image_params,
         "imageGenerationConfig": {
             "seed": seed,
-            "quality": "standard",
-            "height": 1024,
-            "width": 1024,
-            "numberOfImages": 3
+            **IMAGE_TIERS[tier]
         },
     }
 
@@ -146,33 +250,52 @@ def generate_image(use_case: str, user_id: str = "default_user") -> list[str]:
     request = json.dumps(native_request)
 
     # Invoke the model with the request.
+    report("generating")
     response = client.invoke_model(modelId=IMAGE_MODEL_ID, body=request)
 
     # Decode the response body.
     model_response = json.loads(response["body"].read())
     
     images_paths = []
+    images = []
     for idx, base64_image_data in enumerate(model_response["images"]):
         image_data = base64.b64decode(base64_image_data)
-        image_name = f"generated_image_{seed}_{idx+1}.png"
+        image_name = f"generated_image_{seed}_{tier}_{idx+1}.png"
         image_path = f"{user_id}/{image_name}"
         
         # Save image to S3
         save_image_s3(image_data, image_name, user_id)
-        
-        # Generate presigned URL valid for 1 hour (3600 seconds)
-        presigned_url = s3_client.generate_presigned_url(
-            'get_object',
-            Params={
-                'Bucket': BUCKET_NAME,
-                'Key': image_path
-            },
-            ExpiresIn=3600  # 1 hour
-        )
-        
+        presigned_url = generate_presigned_url(image_path)
         images_paths.append(presigned_url)
+
+        image_info = {"url": presigned_url, "s3_key": image_path}
+        for name, key in save_derivatives_s3(image_data, image_name, user_id).items():
+            image_info[f"{name}_key"] = key
+            image_info[f"{name}_url"] = generate_presigned_url(key)
+        images.append(image_info)
+        report("uploading", idx + 1)
     
-    return images_paths
+    return {
+        "image_urls": images_paths,
+        "images": images,
+        "seed": seed,
+        "tier": tier,
+        "prompt": prompt_data["prompt"],
+        "negativeText": prompt_data.get("negativeText", "")
+    }
+
+def generate_presigned_url(image_path: str) -> str:
+    """
+    Generate a presigned GET URL for an object in the bucket.
+    """
+    return s3_client.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': BUCKET_NAME,
+            'Key': image_path
+        },
+        ExpiresIn=PRESIGNED_URL_EXPIRATION
+    )
 
 def save_image_s3(images_bytes: str, image_name: str, user_id: str) -> None:
     """
@@ -182,6 +305,234 @@ def save_image_s3(images_bytes: str, image_name: str, user_id: str) -> None:
     s3_client.put_object(Bucket=BUCKET_NAME, Key=image_path, Body=images_bytes, ContentType='image/png')
 
 
+def create_derivatives(image_bytes: bytes) -> dict:
+    """
+    Downscale a PNG into the WebP derivatives defined in DERIVATIVE_SIZES.
+    Returns {name: webp_bytes}; empty if Pillow is not available.
+    """
+    if Image is None:
+        print("Pillow not available, skipping WebP derivatives")
+        return {}
+    derivatives = {}
+    with Image.open(io.BytesIO(image_bytes)) as original:
+        original = original.convert("RGB")
+        for name, max_side in DERIVATIVE_SIZES.items():
+            resized = original.copy()
+            resized.thumbnail((max_side, max_side), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+            derivatives[name] = buffer.getvalue()
+    return derivatives
+
+
+def save_derivatives_s3(image_bytes: bytes, image_name: str, user_id: str) -> dict:
+    """
+    Create and upload the WebP derivatives of an image next to the original.
+    Returns {name: s3_key} for the uploaded derivatives.
+    """
+    base_name = image_name.rsplit(".", 1)[0]
+    keys = {}
+    for name, data in create_derivatives(image_bytes).items():
+        key = f"{user_id}/{base_name}_{name}.webp"
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=data, ContentType='image/webp')
+        keys[name] = key
+    return keys
+
+
+def build_response(event, status_code: int, payload: dict):
+    """
+    Shape the response for the invocation type: API Gateway proxy responses
+    wrap the payload in statusCode/headers/body, direct invocations get it as-is.
+    """
+    if 'body' in event:
+        return {
+            "statusCode": status_code,
+            "headers": {
+                "Content-Type": "application/json",
+                "Access-Control-Allow-Origin": "*"
+            },
+            "body": json.dumps(payload)
+        }
+    return payload
+
+
+def parse_request_body(event) -> dict:
+    """
+    Extract the JSON payload from an API Gateway event or a direct invocation.
+    """
+    if 'body' in event:
+        raw = event["body"] or ""
+        if event.get("isBase64Encoded"):
+            raw = base64.b64decode(raw).decode("utf-8", errors="replace")
+        return json.loads(raw) if raw and isinstance(raw, str) else (raw or {})
+    return event
+
+
+def parse_generation_request(body: dict) -> dict:
+    """
+    Validate a generation request and return the generate_image() arguments
+    (use_case, user_id, prompt_data, tier, seed).
+    Raises ValueError with a client-facing message on invalid input.
+    """
+    use_case = body.get('use_case')
+    user_id = body.get('user_id', 'default_user')
+    prompt = body.get('prompt')
+    negative_text = body.get('negativeText')
+    tier = body.get('tier') or DEFAULT_TIER
+    seed = body.get('seed')
+
+    print(f"Use case: {use_case}, User ID: {user_id}, Tier: {tier}, Precomposed prompt: {prompt is not None}")
+    # Validate use_case (not needed when the prompt is precomposed)
+    if not use_case and prompt is None:
+        raise ValueError("Missing required parameter: use_case or prompt")
+    if tier not in IMAGE_TIERS:
+        raise ValueError(f"Invalid tier: {tier}. Must be one of: {', '.join(IMAGE_TIERS)}")
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or not 0 <= seed <= MAX_SEED):
+        raise ValueError(f"Invalid seed: must be an integer between 0 and {MAX_SEED}")
+
+    prompt_data = None
+    if prompt is not None:
+        try:
+            prompt_data = validate_prompt_data(prompt, negative_text)
+        except ValueError as e:
+            raise InvalidPromptError(f"Invalid prompt: {e}")
+        use_case = use_case or prompt_data["prompt"]
+
+    return {
+        "use_case": use_case,
+        "user_id": user_id,
+        "prompt_data": prompt_data,
+        "tier": tier,
+        "seed": seed,
+    }
+
+
+def run_generation(request: dict, on_progress=None) -> dict:
+    """
+    Generate the images for a validated request and build the success payload.
+    """
+    generation = generate_image(on_progress=on_progress, **request)
+    image_urls = generation["image_urls"]
+    return {
+        "image_urls": image_urls,
+        "images": generation["images"],
+        "use_case": request["use_case"],
+        "user_id": request["user_id"],
+        "count": len(image_urls),
+        "tier": generation["tier"],
+        "seed": generation["seed"],
+        "prompt": generation["prompt"],
+        "negativeText": generation["negativeText"]
+    }
+
+
+### Async jobs ###
+def create_job(body: dict, function_name: str) -> dict:
+    """
+    Record a queued job and hand the work to an asynchronous invocation of this
+    same function. Returns the job status payload.
+    """
+    now = int(time.time())
+    job = {
+        "job_id": str(uuid.uuid4()),
+        "status": "queued",
+        "stage": "queued",
+        "images_done": 0,
+        "images_total": IMAGE_TIERS[body.get('tier') or DEFAULT_TIER]["numberOfImages"],
+        "user_id": body.get('user_id', 'default_user'),
+        "created_at": now,
+        "updated_at": now,
+        "expires_at": now + JOB_TTL_SECONDS,
+    }
+    dynamodb.Table(IMAGE_JOBS_TABLE_NAME).put_item(Item=job)
+    lambda_client.invoke(
+        FunctionName=function_name,
+        InvocationType="Event",
+        Payload=json.dumps({"job_worker": True, "job_id": job["job_id"], "request": body}).encode("utf-8"),
+    )
+    print(f"Queued image job {job['job_id']}")
+    return format_job(job)
+
+
+def update_job(job_id: str, **fields) -> None:
+    """
+    Update the given attributes of a job record (and its updated_at).
+    """
+    fields["updated_at"] = int(time.time())
+    names = {f"#{key}": key for key in fields}
+    values = {f":{key}": value for key, value in fields.items()}
+    dynamodb.Table(IMAGE_JOBS_TABLE_NAME).update_item(
+        Key={"job_id": job_id},
+        UpdateExpression="SET " + ", ".join(f"#{key} = :{key}" for key in fields),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+    )
+
+
+def run_job(job_id: str, body: dict) -> dict:
+    """
+    Worker side of an async job: generate the images, recording progress and the
+    final result (or error) in the jobs table.
+    """
+    def on_progress(stage, done, total):
+        update_job(job_id, status="running", stage=stage, images_done=done, images_total=total)
+
+    try:
+        update_job(job_id, status="running", stage="starting")
+        result = run_generation(parse_generation_request(body), on_progress=on_progress)
+        # Stored as a JSON string: DynamoDB would turn the numbers into Decimals
+        update_job(job_id, status="succeeded", stage="done", result=json.dumps(result))
+        print(f"Image job {job_id} succeeded with {result['count']} images")
+        return {"job_id": job_id, "status": "succeeded"}
+    except Exception as e:
+        print(f"Image job {job_id} failed: {e}")
+        update_job(job_id, status="failed", stage="done", error=str(e), error_type=type(e).__name__)
+        return {"job_id": job_id, "status": "failed"}
+
+
+def format_job(job: dict) -> dict:
+    """
+    Public view of a job record.
+    """
+    payload = {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "stage": job.get("stage"),
+        "progress": {
+            "images_done": int(job.get("images_done", 0)),
+            "images_total": int(job.get("images_total", 0)),
+        },
+        "created_at": int(job["created_at"]),
+        "updated_at": int(job["updated_at"]),
+    }
+    if job.get("result"):
+        payload["result"] = json.loads(job["result"])
+    if job.get("error"):
+        payload["error"] = job["error"]
+        payload["error_type"] = job.get("error_type")
+    return payload
+
+
+def get_job(job_id: str, wait: float = 0) -> dict:
+    """
+    Fetch a job. With `wait` > 0 this long-polls (with a growing interval) until the
+    job reaches a terminal status or the wait expires, so clients can make one
+    request instead of many. Returns None if the job does not exist.
+    """
+    table = dynamodb.Table(IMAGE_JOBS_TABLE_NAME)
+    deadline = time.monotonic() + min(max(wait, 0), MAX_JOB_WAIT_SECONDS)
+    interval = JOB_POLL_INTERVAL
+    while True:
+        job = table.get_item(Key={"job_id": job_id}, ConsistentRead=True).get("Item")
+        if job is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if job["status"] in JOB_TERMINAL_STATUSES or remaining <= 0:
+            return format_job(job)
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, JOB_POLL_MAX_INTERVAL)
+
+
 def lambda_handler(event, context):
     """
     AWS Lambda handler function.
@@ -190,86 +541,71 @@ def lambda_handler(event, context):
     Expected input formats:
     - API Gateway: {"body": "{\"use_case\": \"...\", \"user_id\": \"...\"}"}
     - Direct invocation: {"use_case": "...", "user_id": "..."}
+
+    Optionally a precomposed {"prompt": "...", "negativeText": "..."} can be sent
+    (with or without use_case) to skip the Nova Pro prompt composition step.
+    "tier" ("draft" by default, or "final") selects the image size and count, and
+    "seed" reuses the seed of a previous generation (e.g. to upgrade a draft).
+
+    Async jobs (API Gateway):
+    - POST /generate-image/jobs: same body, answers 202 with {"job_id", "status", ...}
+    - GET /generate-image/jobs/{job_id}?wait=N: job status and progress, long-polling
+      up to N seconds; the generation payload is in "result" once "succeeded"
     
     Returns:
     - API Gateway format: {"statusCode": 200, "body": "{\"image_urls\": [...]}"}
     - Direct invocation format: {"image_urls": [...]}
     """
     try:
+        # Asynchronous self-invocation running a queued job
+        if event.get("job_worker"):
+            return run_job(event["job_id"], event["request"])
+
         # Determine if the event is from API Gateway or direct invocation
         print("Decoding event:", event)
-        if 'body' in event:
-            raw = event["body"] or ""
-            if event.get("isBase64Encoded"):
-                raw = base64.b64decode(raw).decode("utf-8", errors="replace")
-            body = json.loads(raw) if isinstance(raw, str) else raw
-        
+        method = event.get("httpMethod", "POST")
+        resource = event.get("resource") or ""
+
+        if method == "GET" and resource.endswith("/jobs/{job_id}"):
+            job_id = (event.get("pathParameters") or {}).get("job_id")
+            query = event.get("queryStringParameters") or {}
+            try:
+                wait = float(query.get("wait", 0))
+            except ValueError:
+                return build_response(event, 400, {
+                    "error": "Invalid wait: must be a number of seconds",
+                    "error_type": "ValidationError"
+                })
+            job = get_job(job_id, wait)
+            if job is None:
+                return build_response(event, 404, {"error": f"Job not found: {job_id}"})
+            return build_response(event, 200, job)
+
+        body = parse_request_body(event)
+
         print("Extracting parameters")
-        # Extract parameters
-        use_case = body.get('use_case')
-        user_id = body.get('user_id', 'default_user')
-        
-        print(f"Use case: {use_case}, User ID: {user_id}")
-        # Validate use_case
-        if not use_case:
-            error_response = {
-                "error": "Missing required parameter: use_case"
-            }
-            if 'body' in event:
-                return {
-                    "statusCode": 400,
-                    "headers": {
-                        "Content-Type": "application/json",
-                        "Access-Control-Allow-Origin": "*"
-                    },
-                    "body": json.dumps(error_response)
-                }
-            else:
-                return error_response
-        
-        # Generate images
-        image_urls = generate_image(use_case, user_id)
-        
-        # Prepare success response
-        success_response = {
-            "image_urls": image_urls,
-            "use_case": use_case,
-            "user_id": user_id,
-            "count": len(image_urls)
-        }
-        
-        # Return response based on invocation type
-        if 'body' in event:
-            # API Gateway response
-            return {
-                "statusCode": 200,
-                "headers": {
-                    "Content-Type": "application/json",
-                    "Access-Control-Allow-Origin": "*"
-                },
-                "body": json.dumps(success_response)
-            }
-        else:
-            # Direct invocation response
-            return success_response
+        try:
+            request = parse_generation_request(body)
+        except ValueError as e:
+            return build_response(event, 400, {
+                "error": str(e),
+                "error_type": "ValidationError",
+                # invalid_prompt: only the precomposed prompt was rejected
+                "error_code": getattr(e, "error_code", "invalid_request")
+            })
+
+        if resource.endswith("/jobs"):
+            return build_response(event, 202, create_job(body, context.function_name))
+
+        # Generate images synchronously
+        return build_response(event, 200, run_generation(request))
             
     except Exception as e:
         error_response = {
             "error": str(e),
             "error_type": type(e).__name__
         }
-        
-        if 'body' in event:
-            return {
-                "statusCode": 500,
-                "headers": {
-                    "Content-Type": "application/json",
-                    "Access-Control-Allow-Origin": "*"
-                },
-                "body": json.dumps(error_response)
-            }
-        else:
-            return error_response
+        return build_response(event, 500, error_response)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+"""
+Local stand-in for the image generation API, for end-to-end tests of the job
+contract without AWS. It answers like the deployed API Gateway + Lambda:
+
+- POST /generate-image/jobs        -> 202 {"job_id", "status": "queued", ...}
+- GET  /generate-image/jobs/{id}   -> job status, long-polling up to ?wait=N seconds
+- POST /generate-image             -> synchronous generation (old contract)
+
+Generation is simulated: each job sleeps through the same stages as the Lambda
+and returns fake S3 presigned URLs.
+
+Usage:
+    python local_job_server.py --port 8787 --delay 3
+    IMG_API_URL=http://localhost:8787/generate-image python -c \\
+        "from tools.gen_img import submit_img_job, wait_img_job; print(wait_img_job(submit_img_job('test')))"
+    (the second command from backend/agent_core)
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Mirrors handler.py (not imported: it creates AWS clients at import time)
+IMAGE_TIERS = {"draft": {"numberOfImages": 1}, "final": {"numberOfImages": 3}}
+DEFAULT_TIER = "draft"
+JOB_TERMINAL_STATUSES = ("succeeded", "failed")
+MAX_JOB_WAIT_SECONDS = 20
+
+BASE_PATH = "/generate-image"
+FAKE_BUCKET_URL = "https://local-image-bucket.s3.amazonaws.com"
+
+jobs = {}
+jobs_changed = threading.Condition()
+generation_delay = 3.0
+failure_rate = 0.0
+
+
+def fake_generation(body: dict, on_progress=None) -> dict:
+    """
+    Simulate generate_image(): walk through its stages and return fake URLs.
+    """
+    tier = body.get("tier") or DEFAULT_TIER
+    total = IMAGE_TIERS[tier]["numberOfImages"]
+    seed = body.get("seed", random.randint(0, 858993459))
+    user_id = body.get("user_id", "default_user")
+    stages = ["composing_prompt", "generating"] if body.get("prompt") is None else ["generating"]
+    for stage in stages:
+        if on_progress:
+            on_progress(stage, 0, total)
+        time.sleep(generation_delay / (len(stages) + 1))
+    if random.random() < failure_rate:
+        raise RuntimeError("Simulated generation failure")
+
+    images = []
+    for idx in range(total):
+        base = f"{user_id}/generated_image_{seed}_{tier}_{idx+1}"
+        image = {"url": f"{FAKE_BUCKET_URL}/{base}.png?X-Amz-Signature=local", "s3_key": f"{base}.png"}
+        for name in ("thumbnail", "medium"):
+            image[f"{name}_key"] = f"{base}_{name}.webp"
+            image[f"{name}_url"] = f"{FAKE_BUCKET_URL}/{base}_{name}.webp?X-Amz-Signature=local"
+        images.append(image)
+        if on_progress:
+            on_progress("uploading", idx + 1, total)
+        time.sleep(generation_delay / (len(stages) + 1) / total)
+
+    return {
+        "image_urls": [image["url"] for image in images],
+        "images": images,
+        "use_case": body.get("use_case") or body.get("prompt"),
+        "user_id": user_id,
+        "count": total,
+        "tier": tier,
+        "seed": seed,
+        "prompt": body.get("prompt") or f"Local test image for: {body.get('use_case')}",
+        "negativeText": body.get("negativeText", ""),
+    }
+
+
+def update_job(job_id: str, **fields) -> None:
+    with jobs_changed:
+        jobs[job_id].update(fields, updated_at=int(time.time()))
+        jobs_changed.notify_all()
+
+
+def run_job(job_id: str, body: dict) -> None:
+    def on_progress(stage, done, total):
+        update_job(job_id, status="running", stage=stage, images_done=done, images_total=total)
+
+    try:
+        result = fake_generation(body, on_progress=on_progress)
+        update_job(job_id, status="succeeded", stage="done", result=result)
+    except Exception as e:
+        update_job(job_id, status="failed", stage="done", error=str(e), error_type=type(e).__name__)
+
+
+def format_job(job: dict) -> dict:
+    payload = {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": {"images_done": job["images_done"], "images_total": job["images_total"]},
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+    for key in ("result", "error", "error_type"):
+        if key in job:
+            payload[key] = job[key]
+    return payload
+
+
+class ImageApiHandler(BaseHTTPRequestHandler):
+    def send_json(self, status_code: int, payload: dict) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip("/")
+        body = self.read_body()
+        if not body.get("use_case") and body.get("prompt") is None:
+            return self.send_json(400, {"error": "Missing required parameter: use_case or prompt",
+                                        "error_type": "ValidationError", "error_code": "invalid_request"})
+        if (body.get("tier") or DEFAULT_TIER) not in IMAGE_TIERS:
+            return self.send_json(400, {"error": f"Invalid tier: {body.get('tier')}",
+                                        "error_type": "ValidationError", "error_code": "invalid_request"})
+
+        if path == BASE_PATH:
+            return self.send_json(200, fake_generation(body))
+        if path == f"{BASE_PATH}/jobs":
+            now = int(time.time())
+            job = {
+                "job_id": str(uuid.uuid4()),
+                "status": "queued",
+                "stage": "queued",
+                "images_done": 0,
+                "images_total": IMAGE_TIERS[body.get("tier") or DEFAULT_TIER]["numberOfImages"],
+                "created_at": now,
+                "updated_at": now,
+            }
+            with jobs_changed:
+                jobs[job["job_id"]] = job
+            threading.Thread(target=run_job, args=(job["job_id"], body), daemon=True).start()
+            return self.send_json(202, format_job(job))
+        self.send_json(404, {"error": f"Not found: {path}"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        prefix = f"{BASE_PATH}/jobs/"
+        if not url.path.startswith(prefix):
+            return self.send_json(404, {"error": f"Not found: {url.path}"})
+        job_id = url.path[len(prefix):]
+        wait = min(float(parse_qs(url.query).get("wait", ["0"])[0]), MAX_JOB_WAIT_SECONDS)
+        deadline = time.monotonic() + wait
+        with jobs_changed:
+            if job_id not in jobs:
+                return self.send_json(404, {"error": f"Job not found: {job_id}"})
+            while jobs[job_id]["status"] not in JOB_TERMINAL_STATUSES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                jobs_changed.wait(remaining)
+            job = format_job(jobs[job_id])
+        self.send_json(200, job)
+
+    def log_message(self, format, *args):
+        print(f"[local-image-api] {self.address_string()} {format % args}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the image generation API")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--delay", type=float, default=3.0, help="simulated generation time in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of jobs that fail")
+    args = parser.parse_args()
+    generation_delay = args.delay
+    failure_rate = args.failure_rate
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), ImageApiHandler)
+    print(f"Local image API listening on http://127.0.0.1:{args.port}{BASE_PATH}")
+    server.serve_forever()
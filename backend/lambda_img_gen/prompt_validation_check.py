@@ -0,0 +1,55 @@
+"""
+Checks validate_prompt_data's negation rule: negations that exclude something
+("no people", "without text") are rejected with invalid_prompt, while product
+terms that merely contain the words ("no-code", "Nokia", "No. 1") pass and do
+not cost an extra composition call.
+
+Usage (from backend/lambda_img_gen):
+    python prompt_validation_check.py
+"""
+import argparse
+import os
+import sys
+
+os.environ.setdefault("AWS_REGION", "us-east-1")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from handler import validate_prompt_data  # noqa: E402
+
+ACCEPTED = [
+    "no-code platform dashboard on a laptop screen, clean modern UI",
+    "Nokia-style rugged phone on a workbench, studio lighting",
+    "No. 1 rated coffee grinder on a kitchen counter",
+    "event check-in app flagging no-show guests, tablet on a reception desk",
+    "knotted rope logo on a notebook cover",
+]
+REJECTED = [
+    "smart water bottle on a desk, no people",
+    "fitness tracker on a wrist without text overlays",
+    "dashboard UI, avoid clutter",
+    "coffee machine, not blurry",
+    "No logos on the packaging",
+]
+
+
+def rejects(prompt):
+    try:
+        validate_prompt_data(prompt)
+        return False
+    except ValueError as e:
+        return getattr(e, "error_code", None) == "invalid_prompt" or "negations" in str(e)
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description="Prompt negation rule check").parse_args()
+    failures = 0
+    for prompt in ACCEPTED:
+        ok = not rejects(prompt)
+        print(f"{'ok  ' if ok else 'FAIL'} accepted: {prompt}")
+        failures += not ok
+    for prompt in REJECTED:
+        ok = rejects(prompt)
+        print(f"{'ok  ' if ok else 'FAIL'} rejected: {prompt}")
+        failures += not ok
+    print("PASSED" if failures == 0 else "FAILED")
+    sys.exit(0 if failures == 0 else 1)
@@ -1,6 +1,20 @@
+import base64
+import datetime
+import gzip
+import hashlib
 import json
 import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+import boto3
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Dict, List, Optional, Any
 from dotenv import load_dotenv
 
@@ -9,7 +23,457 @@ load_dotenv()
 
 # Constants
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
-TAVILY_API_URL = "https://api.tavily.com"
+TAVILY_API_URL = os.getenv("TAVILY_API_URL", "https://api.tavily.com")
+
+# Per-action request timeouts (seconds), capped by the Lambda's remaining time
+ACTION_TIMEOUTS = {
+    "search": 30,
+    "extract": 30,
+    "crawl": 60,
+}
+# Retries for throttling (429) and transient upstream errors
+MAX_RETRIES = int(os.getenv("TAVILY_MAX_RETRIES", "3"))
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_BACKOFF = 0.5  # seconds, doubled per attempt with full jitter
+RETRY_MAX_BACKOFF = 8.0
+# Time kept in reserve to build the response before the Lambda times out
+DEADLINE_MARGIN = 2.0
+
+# Session reused across warm invocations: keeps the TLS connection to Tavily alive
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+session.headers.update({
+    "Authorization": f"Bearer {TAVILY_API_KEY}",
+    "Content-Type": "application/json"
+})
+
+# Hedged requests: a search/extract call still running after the p90 latency
+# observed for its kind gets a duplicate, and the first good response wins.
+# HEDGE_MAX_RATE caps the share of hedged calls to bound the extra spend.
+HEDGE_ENABLED = os.getenv("TAVILY_HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_MAX_RATE = float(os.getenv("TAVILY_HEDGE_MAX_RATE", "0.1"))
+HEDGE_DEFAULT_DELAY = 3.0  # seconds, until HEDGE_MIN_SAMPLES latencies are known
+HEDGE_MIN_DELAY = 0.5
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+# Extract: Tavily accepts 10 URLs per request; larger lists are split into
+# chunks extracted concurrently, within an overall URL cap and deadline (seconds,
+# below API Gateway's 29s integration timeout)
+EXTRACT_CHUNK_SIZE = 10
+MAX_EXTRACT_URLS = int(os.getenv("TAVILY_MAX_EXTRACT_URLS", "50"))
+EXTRACT_CONCURRENCY = int(os.getenv("TAVILY_EXTRACT_CONCURRENCY", "5"))
+EXTRACT_DEADLINE = float(os.getenv("TAVILY_EXTRACT_DEADLINE", "25"))
+
+# Batch search: queries per call and how many run at once (below the session pool size)
+MAX_BATCH_SEARCHES = 10
+BATCH_CONCURRENCY = int(os.getenv("TAVILY_BATCH_CONCURRENCY", "5"))
+
+# Crawl dedup: pages whose SimHash (64-bit, over word shingles) differ in at most
+# SIMHASH_MAX_DISTANCE bits are near-duplicates (unrelated pages differ in ~32 bits,
+# a few edited words in ~3, occasionally up to 8); text blocks present in at least
+# BOILERPLATE_MIN_SHARE of the pages (nav, footers, cookie banners) are stripped
+SHINGLE_SIZE = 4
+SIMHASH_BITS = 64
+SIMHASH_MAX_DISTANCE = 8
+BOILERPLATE_MIN_SHARE = 0.5
+BOILERPLATE_MIN_PAGES = 3
+
+# Response shaping: where each action keeps its per-result items, for the
+# optional `fields` projection and `max_content_length` cap
+RESULT_ITEMS = {
+    "search": "results",
+    "extract": "results",
+    "crawl": "pages",
+    "map": "sources",
+}
+CONTENT_FIELDS = ("content", "raw_content")
+# Responses smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+# Cross-user result cache: in-container LRU in front of a DynamoDB table with TTL
+CACHE_ENABLED = os.getenv("TAVILY_CACHE_ENABLED", "true").lower() == "true"
+CACHE_TABLE_NAME = os.getenv("TAVILY_CACHE_TABLE_NAME", "deep-market-analyzer-tavily-cache")
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("TAVILY_LOCAL_CACHE_MAX_ENTRIES", "256"))
+# TTL in seconds per action (and per topic for search): news goes stale fast
+CACHE_TTLS = {
+    "search:news": int(os.getenv("TAVILY_CACHE_TTL_SEARCH_NEWS", "900")),
+    "search:general": int(os.getenv("TAVILY_CACHE_TTL_SEARCH_GENERAL", "21600")),
+    "extract": int(os.getenv("TAVILY_CACHE_TTL_EXTRACT", "86400")),
+    "crawl": int(os.getenv("TAVILY_CACHE_TTL_CRAWL", "43200")),
+}
+# DynamoDB items are limited to 400 KB; bigger (compressed) results stay in memory only
+MAX_CACHE_ITEM_BYTES = 350_000
+# BatchGetItem takes at most 100 keys per request
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_ATTEMPTS = 3
+
+local_cache = OrderedDict()  # cache_key -> (expires_at, cached_at, value)
+local_cache_lock = threading.Lock()
+# Low-level client: unlike resources it is thread-safe (batch searches run concurrently)
+dynamodb_client = boto3.client("dynamodb") if CACHE_ENABLED else None
+
+# Hedging state, kept across warm invocations
+latencies = {}  # call kind -> recent latencies (seconds)
+hedge_window = deque(maxlen=LATENCY_WINDOW)  # whether each recent call was hedged
+hedge_lock = threading.Lock()
+hedge_executor = ThreadPoolExecutor(max_workers=16)
+
+# Per-invocation state (a container runs one invocation at a time)
+invocation = {
+    "deadline": None,  # time.monotonic() value by which upstream calls must finish
+    "cold": True,
+}
+
+
+def retry_delay(response: Optional[requests.Response], attempt: int) -> float:
+    """
+    Seconds to wait before retrying: the Retry-After header when the upstream
+    sends one, otherwise exponential backoff with full jitter.
+    """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(RETRY_BACKOFF * (2 ** attempt), RETRY_MAX_BACKOFF))
+
+
+def upstream_error_status(e: requests.exceptions.RequestException) -> int:
+    """
+    HTTP status the Lambda answers with when a Tavily call fails: the upstream
+    status for client errors (bad query, invalid key, throttling), so callers
+    do not take them for an outage, 504 for timeouts and 502 otherwise.
+    """
+    response = getattr(e, "response", None)
+    if response is not None and 400 <= response.status_code < 500:
+        return response.status_code
+    if isinstance(e, requests.exceptions.Timeout):
+        return 504
+    return 502
+
+
+def result_status(result: Dict[str, Any]) -> int:
+    """
+    HTTP status of an action result: 200 on success, otherwise the status the
+    failure carries (upstream_error_status), 400 for invalid parameters and 500
+    for anything unexpected. A failed batch takes the status of its first search.
+    """
+    if result.get("success"):
+        return 200
+    results = (result.get("data") or {}).get("results")
+    if results and "error_type" not in result:
+        return result_status(results[0])
+    if "status_code" in result:
+        return result["status_code"]
+    return 400 if result.get("error_type") == "ValueError" else 500
+
+
+def post_tavily(endpoint: str, payload: Dict[str, Any], action: str,
+                deadline: Optional[float] = None) -> requests.Response:
+    """
+    POST to the Tavily API through the pooled session.
+    Retries 429/5xx responses and connection errors up to MAX_RETRIES times, as
+    long as the wait and the next attempt fit in the invocation's remaining time
+    (or the earlier `deadline`, a time.monotonic() value, when given).
+    Raises requests exceptions (HTTPError for non-retryable or exhausted statuses).
+    """
+    url = f"{TAVILY_API_URL}/{endpoint}"
+    deadline = min(invocation["deadline"] or float("inf"), deadline or float("inf"))
+    for attempt in range(MAX_RETRIES + 1):
+        remaining = deadline - time.monotonic() - DEADLINE_MARGIN
+        if remaining <= 0:
+            raise requests.exceptions.Timeout(f"No time left in the invocation for {action}")
+        timeout = min(ACTION_TIMEOUTS[action], remaining)
+
+        response = None
+        try:
+            response = session.post(url, json=payload, timeout=timeout)
+            if response.status_code not in RETRY_STATUS_CODES:
+                response.raise_for_status()
+                return response
+            error = requests.exceptions.HTTPError(
+                f"{response.status_code} Error from Tavily for url: {url}", response=response)
+        except requests.exceptions.HTTPError:
+            raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+
+        delay = retry_delay(response, attempt)
+        if attempt == MAX_RETRIES or time.monotonic() + delay >= deadline - DEADLINE_MARGIN:
+            raise error
+        print(f"Retrying {action} in {delay:.2f}s after attempt {attempt + 1} failed: {error}")
+        time.sleep(delay)
+
+
+### Hedging ###
+def record_latency(kind: str, seconds: float) -> None:
+    with hedge_lock:
+        latencies.setdefault(kind, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+
+def hedge_delay(kind: str) -> float:
+    """
+    Seconds to wait before hedging a call: the p90 latency observed for its kind.
+    """
+    with hedge_lock:
+        samples = sorted(latencies.get(kind, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return max(samples[int(len(samples) * 0.9) - 1], HEDGE_MIN_DELAY)
+
+
+def take_hedge_slot(hedge: bool) -> bool:
+    """
+    Record a call in the hedge-rate window; returns whether it may be hedged
+    (when asked) without exceeding HEDGE_MAX_RATE.
+    """
+    with hedge_lock:
+        allowed = hedge and sum(hedge_window) + 1 <= HEDGE_MAX_RATE * max(len(hedge_window) + 1, 1 / HEDGE_MAX_RATE)
+        hedge_window.append(allowed)
+        return allowed
+
+
+def hedged(kind: str, call):
+    """
+    Run call() and, if it is still running after hedge_delay(kind), a duplicate
+    of it; return the first successful result. The slower request cannot be
+    interrupted mid-flight: it finishes in the background and is discarded.
+    Raises the last error if both fail.
+    """
+    if not HEDGE_ENABLED:
+        return call()
+    
+    def submit():
+        started = time.monotonic()
+        future = hedge_executor.submit(call)
+        future.add_done_callback(
+            lambda f: f.exception() is None and record_latency(kind, time.monotonic() - started))
+        return future
+    
+    delay = hedge_delay(kind)
+    primary = submit()
+    done, _ = wait([primary], timeout=delay)
+    pending = [primary]
+    if not done and take_hedge_slot(True):
+        print(f"[hedge] {kind} still running after {delay:.2f}s, sending a duplicate request")
+        pending.append(submit())
+    elif done:
+        take_hedge_slot(False)
+    
+    error = None
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                if future is not primary:
+                    print(f"[hedge] {kind} duplicate request won")
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+### Cache ###
+def normalize_query(query: str) -> str:
+    """
+    Case- and whitespace-insensitive form of a search query.
+    """
+    return re.sub(r"\s+", " ", query or "").strip().lower()
+
+
+def normalize_domains(domains: Optional[List[str]]) -> List[str]:
+    """
+    Sorted, de-duplicated, lower-cased domain list.
+    """
+    return sorted({d.strip().lower() for d in domains or [] if d and d.strip()})
+
+
+def normalize_url(url: str) -> str:
+    """
+    URL form used as the extract cache key (scheme/host lower-cased, no fragment
+    or trailing slash).
+    """
+    url = (url or "").strip().split("#", 1)[0]
+    match = re.match(r"^([a-zA-Z][a-zA-Z0-9+.-]*://)([^/?]+)(.*)$", url)
+    if match:
+        url = match.group(1).lower() + match.group(2).lower() + match.group(3)
+    return url.rstrip("/")
+
+
+def cache_key(action: str, payload: Dict[str, Any]) -> str:
+    """
+    Key of an action's result: hash of its canonicalized payload.
+    """
+    canonical = dict(payload)
+    if "query" in canonical:
+        canonical["query"] = normalize_query(canonical["query"])
+    for field in ("include_domains", "exclude_domains"):
+        if field in canonical:
+            canonical[field] = normalize_domains(canonical[field])
+    if "exclude_patterns" in canonical:
+        canonical["exclude_patterns"] = sorted(set(canonical["exclude_patterns"] or []))
+    if "url" in canonical:
+        canonical["url"] = normalize_url(canonical["url"])
+    digest = hashlib.sha256(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{action}:{digest}"
+
+
+def url_cache_key(url: str) -> str:
+    """
+    Key of the extracted content of a single URL.
+    """
+    return "extract:" + hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+
+def cache_info(hit: bool, layer: Optional[str] = None, cached_at: Optional[float] = None,
+               ttl: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Cache metadata attached to results so the agent can show their freshness.
+    """
+    info = {"hit": hit, "layer": layer}
+    if cached_at is not None:
+        info["cached_at"] = datetime.datetime.fromtimestamp(cached_at, datetime.timezone.utc).isoformat()
+        info["age_seconds"] = int(time.time() - cached_at)
+    if ttl is not None:
+        info["ttl_seconds"] = ttl
+    return info
+
+
+def cache_get(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Look a key up in the local LRU, then in DynamoDB (promoting hits to the LRU).
+    Returns {"value", "cached_at", "layer"} or None on a miss or an expired entry.
+    """
+    if not CACHE_ENABLED:
+        return None
+    now = time.time()
+    with local_cache_lock:
+        entry = local_cache.get(key)
+        if entry and entry[0] > now:
+            local_cache.move_to_end(key)
+            return {"value": entry[2], "cached_at": entry[1], "layer": "memory"}
+        if entry:
+            del local_cache[key]
+
+    try:
+        item = dynamodb_client.get_item(TableName=CACHE_TABLE_NAME, Key={"cache_key": {"S": key}}).get("Item")
+    except Exception as e:
+        print(f"Cache read failed for {key}: {e}")
+        return None
+    # DynamoDB deletes expired items lazily, so check the TTL here too
+    if not item or int(item["expires_at"]["N"]) <= now:
+        return None
+    value = json.loads(zlib.decompress(item["value"]["B"]).decode("utf-8"))
+    cached_at = float(item["cached_at"]["N"])
+    local_cache_put(key, value, int(item["expires_at"]["N"]), cached_at)
+    return {"value": value, "cached_at": cached_at, "layer": "dynamodb"}
+
+
+def cache_get_many(keys: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Batch version of cache_get: the local LRU first, then the remaining keys in
+    BatchGetItem requests of up to 100 keys. Returns {key: {"value", "cached_at",
+    "layer"}} for the hits only.
+    """
+    if not CACHE_ENABLED:
+        return {}
+    now = time.time()
+    hits = {}
+    with local_cache_lock:
+        for key in keys:
+            entry = local_cache.get(key)
+            if entry and entry[0] > now:
+                local_cache.move_to_end(key)
+                hits[key] = {"value": entry[2], "cached_at": entry[1], "layer": "memory"}
+            elif entry:
+                del local_cache[key]
+    remaining = list(dict.fromkeys(key for key in keys if key not in hits))
+
+    items = []
+    for i in range(0, len(remaining), BATCH_GET_MAX_KEYS):
+        request = {CACHE_TABLE_NAME: {"Keys": [{"cache_key": {"S": key}} for key in remaining[i:i + BATCH_GET_MAX_KEYS]]}}
+        try:
+            # Throttled keys come back in UnprocessedKeys: retry them with a short backoff
+            for attempt in range(BATCH_GET_ATTEMPTS):
+                response = dynamodb_client.batch_get_item(RequestItems=request)
+                items.extend(response.get("Responses", {}).get(CACHE_TABLE_NAME, []))
+                request = response.get("UnprocessedKeys")
+                if not request:
+                    break
+                time.sleep(0.05 * 2 ** attempt)
+        except Exception as e:
+            print(f"Cache batch read failed: {e}")
+
+    for item in items:
+        # DynamoDB deletes expired items lazily, so check the TTL here too
+        if int(item["expires_at"]["N"]) <= now:
+            continue
+        key = item["cache_key"]["S"]
+        value = json.loads(zlib.decompress(item["value"]["B"]).decode("utf-8"))
+        cached_at = float(item["cached_at"]["N"])
+        local_cache_put(key, value, int(item["expires_at"]["N"]), cached_at)
+        hits[key] = {"value": value, "cached_at": cached_at, "layer": "dynamodb"}
+    return hits
+
+
+def local_cache_put(key: str, value: Any, expires_at: float, cached_at: float) -> None:
+    """
+    Store a value in the in-container LRU, evicting the least recently used entries.
+    """
+    with local_cache_lock:
+        local_cache[key] = (expires_at, cached_at, value)
+        local_cache.move_to_end(key)
+        while len(local_cache) > LOCAL_CACHE_MAX_ENTRIES:
+            local_cache.popitem(last=False)
+
+
+def cache_put(key: str, value: Any, ttl: int) -> None:
+    """
+    Store a value in both cache layers for `ttl` seconds. Write failures are
+    logged and ignored: the cache must never fail a request.
+    """
+    if not CACHE_ENABLED or ttl <= 0:
+        return
+    now = time.time()
+    local_cache_put(key, value, now + ttl, now)
+    data = zlib.compress(json.dumps(value).encode("utf-8"))
+    if len(data) > MAX_CACHE_ITEM_BYTES:
+        print(f"Result for {key} too large for the shared cache ({len(data)} bytes)")
+        return
+    try:
+        dynamodb_client.put_item(TableName=CACHE_TABLE_NAME, Item={
+            "cache_key": {"S": key},
+            "value": {"B": data},
+            "cached_at": {"N": str(int(now))},
+            "expires_at": {"N": str(int(now + ttl))},
+        })
+    except Exception as e:
+        print(f"Cache write failed for {key}: {e}")
+
+
+def cached_post(action: str, payload: Dict[str, Any], ttl: int) -> tuple:
+    """
+    Return (data, cache_info) for an action, calling Tavily only on a cache miss.
+    Errors are raised and never cached.
+    """
+    key = cache_key(action, payload)
+    cached = cache_get(key)
+    if cached:
+        print(f"Cache hit ({cached['layer']}) for {action}")
+        return cached["value"], cache_info(True, cached["layer"], cached["cached_at"], ttl)
+    if action == "search":
+        data = hedged(f"search:{payload.get('search_depth')}", lambda: post_tavily(action, payload, action)).json()
+    else:
+        data = post_tavily(action, payload, action).json()
+    cache_put(key, data, ttl)
+    return data, cache_info(False, ttl=ttl)
 
 
 def search(
@@ -40,9 +504,8 @@ def search(
     Returns:
         Dict containing search results
     """
+    started = time.monotonic()
     try:
-        url = f"{TAVILY_API_URL}/search"
-        
         payload = {
             "query": query,
             "search_depth": search_depth,
@@ -58,23 +521,22 @@ def search(
         if exclude_domains:
             payload["exclude_domains"] = exclude_domains
         
-        headers = {
-            "Authorization": f"Bearer {TAVILY_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
-        response.raise_for_status()
+        ttl = CACHE_TTLS.get(f"search:{topic}", CACHE_TTLS["search:general"])
+        data, cache = cached_post("search", payload, ttl)
         
         return {
             "success": True,
-            "data": response.json()
+            "data": data,
+            "cache": cache,
+            # Time spent in the Lambda (also per search in a batch, where the caller only sees the whole batch)
+            "latency_ms": int((time.monotonic() - started) * 1000)
         }
     except requests.exceptions.RequestException as e:
         return {
             "success": False,
             "error": str(e),
-            "error_type": type(e).__name__
+            "error_type": type(e).__name__,
+            "status_code": upstream_error_status(e)
         }
     except Exception as e:
         return {
@@ -84,12 +546,37 @@ def search(
         }
 
 
+def extract_chunk(urls: List[str], deadline: float) -> Dict[str, Any]:
+    """
+    Extract one chunk of (at most 10) URLs. A chunk that fails as a whole is
+    reported as failed_results for its URLs instead of failing the others.
+    """
+    try:
+        response = hedged("extract", lambda: post_tavily("extract", {"urls": urls}, "extract", deadline=deadline))
+        data = response.json()
+        return {
+            "results": data.get("results", []),
+            "failed_results": data.get("failed_results", []),
+            "error": None
+        }
+    except requests.exceptions.RequestException as e:
+        print(f"Extract chunk of {len(urls)} URLs failed: {e}")
+        return {
+            "results": [],
+            "failed_results": [{"url": url, "error": str(e)} for url in urls],
+            "error": e
+        }
+
+
 def extract(urls: List[str]) -> Dict[str, Any]:
     """
     Extract clean content from specific URLs.
     
+    Lists over 10 URLs are de-duplicated and split into chunks of 10 that are
+    extracted concurrently, so 30 URLs take about as long as 10.
+    
     Args:
-        urls: List of URLs to extract content from (max 10 URLs)
+        urls: List of URLs to extract content from (max TAVILY_MAX_EXTRACT_URLS, default 50)
     
     Returns:
         Dict containing extracted content
@@ -100,39 +587,68 @@ def extract(urls: List[str]) -> Dict[str, Any]:
         if not urls or len(urls) == 0:
             raise ValueError("urls parameter is required and must contain at least one URL")
         
-        if len(urls) > 10:
-            raise ValueError("Maximum 10 URLs allowed per request")
-        
-        url = f"{TAVILY_API_URL}/extract"
-        
-        payload = {
-            "urls": urls
-        }
-        
-        headers = {
-            "Authorization": f"Bearer {TAVILY_API_KEY}",
-            "Content-Type": "application/json"
-        }
+        # Same page requested twice (e.g. trailing slash) is extracted once
+        seen = set()
+        unique_urls = []
+        for url in urls:
+            if normalize_url(url) not in seen:
+                seen.add(normalize_url(url))
+                unique_urls.append(url)
         
-        print(f"Making request to {url} with payload: {payload}")
+        if len(unique_urls) > MAX_EXTRACT_URLS:
+            raise ValueError(f"Maximum {MAX_EXTRACT_URLS} URLs allowed per request")
         
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
+        # Extracted content is cached per URL, so only the misses go to Tavily
+        ttl = CACHE_TTLS["extract"]
+        results_by_url = {}
+        oldest_cached_at = None
+        cached_by_key = cache_get_many([url_cache_key(url) for url in unique_urls])
+        for url in unique_urls:
+            cached = cached_by_key.get(url_cache_key(url))
+            if cached:
+                results_by_url[normalize_url(url)] = cached["value"]
+                oldest_cached_at = min(oldest_cached_at or cached["cached_at"], cached["cached_at"])
+        missing = [url for url in unique_urls if normalize_url(url) not in results_by_url]
+        failed_results = []
         
-        print(f"Response status: {response.status_code}")
-        print(f"Response headers: {response.headers}")
+        if missing:
+            chunks = [missing[i:i + EXTRACT_CHUNK_SIZE] for i in range(0, len(missing), EXTRACT_CHUNK_SIZE)]
+            deadline = time.monotonic() + EXTRACT_DEADLINE
+            
+            print(f"Extracting {len(missing)} URLs in {len(chunks)} chunks ({len(unique_urls) - len(missing)} cached)")
+            
+            with ThreadPoolExecutor(max_workers=max(1, min(EXTRACT_CONCURRENCY, len(chunks)))) as executor:
+                chunk_results = list(executor.map(lambda chunk: extract_chunk(chunk, deadline), chunks))
+            
+            # Nothing extracted at all: surface the error as before
+            if all(chunk["error"] for chunk in chunk_results):
+                raise chunk_results[0]["error"]
+            
+            for chunk in chunk_results:
+                for result in chunk["results"]:
+                    results_by_url[normalize_url(result.get("url", ""))] = result
+                    cache_put(url_cache_key(result.get("url", "")), result, ttl)
+                failed_results.extend(chunk["failed_results"])
         
-        response.raise_for_status()
+        # Keep the order of the requested URLs
+        results = []
+        for url in unique_urls:
+            result = results_by_url.pop(normalize_url(url), None)
+            if result is not None:
+                results.append(result)
+        results.extend(results_by_url.values())
         
-        data = response.json()
-        
-        print(f"Response data keys: {list(data.keys()) if isinstance(data, dict) else 'Not dict'}")
+        cache = cache_info(not missing, cached_at=oldest_cached_at, ttl=ttl)
+        cache["hits"] = len(unique_urls) - len(missing)
+        cache["misses"] = len(missing)
         
         return {
             "success": True,
             "data": {
-                "results": data.get("results", []),
-                "failed_results": data.get("failed_results", [])
-            }
+                "results": results,
+                "failed_results": failed_results
+            },
+            "cache": cache
         }
     except requests.exceptions.RequestException as e:
         print(f"RequestException in extract: {str(e)}")
@@ -142,7 +658,8 @@ def extract(urls: List[str]) -> Dict[str, Any]:
         return {
             "success": False,
             "error": str(e),
-            "error_type": type(e).__name__
+            "error_type": type(e).__name__,
+            "status_code": upstream_error_status(e)
         }
     except Exception as e:
         print(f"Exception in extract: {str(e)}")
@@ -153,22 +670,113 @@ def extract(urls: List[str]) -> Dict[str, Any]:
         }
 
 
+### Crawl dedup ###
+def page_text(page: Dict[str, Any]) -> str:
+    """
+    Text of a crawled page (Tavily returns it as raw_content or content).
+    """
+    return page.get("raw_content") or page.get("content") or ""
+
+
+def split_blocks(text: str) -> List[str]:
+    """
+    Split page text into blocks (lines / paragraphs), dropping empty ones.
+    """
+    return [block.strip() for block in re.split(r"\n+", text) if block.strip()]
+
+
+def block_key(block: str) -> str:
+    return re.sub(r"\s+", " ", block).lower()
+
+
+def simhash(text: str) -> int:
+    """
+    64-bit SimHash of the word shingles of a text.
+    """
+    words = re.findall(r"\w+", text.lower())
+    shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))]
+    # Count, for the 64 bit positions at once, how many shingle hashes set each bit:
+    # planes[i] holds bit i of every position's counter (bit-sliced binary counters),
+    # so adding a hash costs O(log n) integer ops instead of 64
+    planes = []
+    for shingle in shingles:
+        carry = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for i in range(len(planes)):
+            planes[i], carry = planes[i] ^ carry, planes[i] & carry
+            if not carry:
+                break
+        if carry:
+            planes.append(carry)
+    # A bit is set in the fingerprint when more than half of the hashes set it
+    fingerprint = 0
+    for bit in range(SIMHASH_BITS):
+        count = sum((plane >> bit & 1) << i for i, plane in enumerate(planes))
+        if count * 2 > len(shingles):
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def dedupe_pages(pages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Strip boilerplate blocks shared by most pages and collapse near-duplicate
+    pages (pagination, tag pages, locale variants) into the first one seen,
+    which lists the dropped URLs under "duplicates".
+    Returns {"pages", "collapsed_pages", "boilerplate_blocks"}.
+    """
+    page_blocks = [split_blocks(page_text(page)) for page in pages]
+    
+    boilerplate = set()
+    if len(pages) >= BOILERPLATE_MIN_PAGES:
+        counts = {}
+        for blocks in page_blocks:
+            for key in {block_key(block) for block in blocks}:
+                counts[key] = counts.get(key, 0) + 1
+        min_pages = max(2, BOILERPLATE_MIN_SHARE * len(pages))
+        boilerplate = {key for key, count in counts.items() if count >= min_pages}
+    
+    kept = []  # (fingerprint, page)
+    collapsed = 0
+    for page, blocks in zip(pages, page_blocks):
+        text = "\n".join(block for block in blocks if block_key(block) not in boilerplate)
+        fingerprint = simhash(text)
+        duplicate_of = next((p for f, p in kept if bin(f ^ fingerprint).count("1") <= SIMHASH_MAX_DISTANCE), None)
+        if duplicate_of is not None:
+            duplicate_of.setdefault("duplicates", []).append(page.get("url"))
+            collapsed += 1
+            continue
+        page = dict(page)
+        if boilerplate:
+            page["raw_content" if "raw_content" in page else "content"] = text
+        kept.append((fingerprint, page))
+    
+    return {
+        "pages": [page for _, page in kept],
+        "collapsed_pages": collapsed,
+        "boilerplate_blocks": len(boilerplate)
+    }
+
+
 def crawl(
     url: str,
     include_subdomains: bool = False,
     max_depth: int = 1,
     max_pages: int = 10,
-    exclude_patterns: Optional[List[str]] = None
+    exclude_patterns: Optional[List[str]] = None,
+    dedupe: bool = True
 ) -> Dict[str, Any]:
     """
     Crawl a website starting from a URL.
     
+    Near-duplicate pages are collapsed and boilerplate shared by most pages is
+    stripped (see dedupe_pages) unless dedupe is False.
+    
     Args:
         url: The starting URL to crawl
         include_subdomains: Whether to include subdomains in crawl (default: False)
         max_depth: Maximum depth to crawl (default: 1, max: 3)
         max_pages: Maximum number of pages to crawl (default: 10, max: 100)
         exclude_patterns: URL patterns to exclude from crawling
+        dedupe: Whether to drop near-duplicate pages and boilerplate (default: True)
     
     Returns:
         Dict containing crawled pages
@@ -185,8 +793,6 @@ def crawl(
         if max_pages > 100:
             raise ValueError("max_pages cannot exceed 100")
         
-        endpoint = f"{TAVILY_API_URL}/crawl"
-        
         payload = {
             "url": url,
             "max_depth": max_depth,
@@ -199,30 +805,33 @@ def crawl(
         if exclude_patterns:
             payload["exclude_patterns"] = exclude_patterns
         
-        headers = {
-            "Authorization": f"Bearer {TAVILY_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        print(f"Making request to {endpoint} with payload: {payload}")
-        
-        response = requests.post(endpoint, json=payload, headers=headers, timeout=60)
+        print(f"Making crawl request with payload: {payload}")
         
-        print(f"Response status: {response.status_code}")
-        print(f"Response headers: {response.headers}")
-        
-        response.raise_for_status()
-        
-        data = response.json()
+        data, cache = cached_post("crawl", payload, CACHE_TTLS["crawl"])
         print(f"Response data keys: {list(data.keys()) if isinstance(data, dict) else 'Not dict'}")
         
+        pages = data.get("pages", [])
+        crawl_data = {
+            "pages": pages,
+            "total_pages": len(pages),
+            "start_url": url
+        }
+        if dedupe and pages:
+            deduped = dedupe_pages(pages)
+            print(f"Crawl dedup: {deduped['collapsed_pages']} of {len(pages)} pages collapsed, "
+                  f"{deduped['boilerplate_blocks']} boilerplate blocks stripped")
+            crawl_data.update({
+                "pages": deduped["pages"],
+                "total_pages": len(deduped["pages"]),
+                "original_pages": len(pages),
+                "collapsed_pages": deduped["collapsed_pages"],
+                "boilerplate_blocks_removed": deduped["boilerplate_blocks"]
+            })
+        
         return {
             "success": True,
-            "data": {
-                "pages": data.get("pages", []),
-                "total_pages": len(data.get("pages", [])),
-                "start_url": url
-            }
+            "data": crawl_data,
+            "cache": cache
         }
     except requests.exceptions.RequestException as e:
         print(f"RequestException in crawl: {str(e)}")
@@ -232,7 +841,8 @@ def crawl(
         return {
             "success": False,
             "error": str(e),
-            "error_type": type(e).__name__
+            "error_type": type(e).__name__,
+            "status_code": upstream_error_status(e)
         }
     except Exception as e:
         print(f"Exception in crawl: {str(e)}")
@@ -306,7 +916,8 @@ def search_map(
         
         return {
             "success": True,
-            "data": mapped_results
+            "data": mapped_results,
+            "cache": search_result.get("cache")
         }
     except Exception as e:
         return {
@@ -316,6 +927,145 @@ def search_map(
         }
 
 
+def batch_search(
+    searches: List[Dict[str, Any]],
+    max_concurrency: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Run several searches concurrently within one invocation.
+    
+    Args:
+        searches: List of search specs, each with the parameters of search() (max 10)
+        max_concurrency: Searches running at once (default: TAVILY_BATCH_CONCURRENCY)
+    
+    Returns:
+        Dict with one result per spec, in input order; each has the shape of a
+        search() result (with its own "latency_ms") plus its "query", so one
+        failing query does not fail the rest
+    """
+    if not isinstance(searches, list) or len(searches) == 0:
+        raise ValueError("searches parameter is required and must contain at least one search")
+    
+    if len(searches) > MAX_BATCH_SEARCHES:
+        raise ValueError(f"Maximum {MAX_BATCH_SEARCHES} searches allowed per request")
+    
+    for spec in searches:
+        if not isinstance(spec, dict) or not spec.get("query"):
+            raise ValueError("Each search must be an object with a query")
+    
+    if max_concurrency is not None and (
+            isinstance(max_concurrency, bool) or not isinstance(max_concurrency, int) or max_concurrency < 1):
+        raise ValueError("max_concurrency must be a positive integer")
+    
+    concurrency = max(1, min(max_concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY, len(searches)))
+    print(f"Starting batch search with {len(searches)} queries, concurrency {concurrency}")
+    
+    def run(spec):
+        try:
+            result = search(**spec)
+        except TypeError as e:
+            # Unknown parameters in this spec
+            result = {"success": False, "error": str(e), "error_type": "ValueError"}
+        return {"query": spec["query"], **result}
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run, searches))
+    
+    failed = sum(1 for r in results if not r.get("success"))
+    return {
+        "success": failed < len(results),
+        "data": {
+            "results": results,
+            "total": len(results),
+            "failed": failed
+        }
+    }
+
+
+### Response shaping ###
+def shape_items(items: List[Dict[str, Any]], fields: Optional[List[str]],
+                max_content_length: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Keep only `fields` of each item and cut its content fields to
+    `max_content_length` characters (marking the item as "truncated").
+    """
+    shaped = []
+    for item in items:
+        if not isinstance(item, dict):
+            shaped.append(item)
+            continue
+        if fields:
+            item = {k: v for k, v in item.items() if k in fields}
+        if max_content_length:
+            for field in CONTENT_FIELDS:
+                value = item.get(field)
+                if isinstance(value, str) and len(value) > max_content_length:
+                    item = {**item, field: value[:max_content_length], "truncated": True}
+        shaped.append(item)
+    return shaped
+
+
+def shape_result(action: str, result: Dict[str, Any], fields: Optional[List[str]],
+                 max_content_length: Optional[int]) -> Dict[str, Any]:
+    """
+    Apply the projection and content cap to an action's result (results of a
+    batch search are shaped one by one). Cached data is never modified.
+    """
+    if not (fields or max_content_length) or not result.get("success"):
+        return result
+    if action == "batch_search":
+        searches = [shape_result("search", r, fields, max_content_length) for r in result["data"]["results"]]
+        return {**result, "data": {**result["data"], "results": searches}}
+    key = RESULT_ITEMS[action]
+    data = result["data"]
+    return {**result, "data": {**data, key: shape_items(data.get(key, []), fields, max_content_length)}}
+
+
+def parse_shaping_parameters(parameters: Dict[str, Any]) -> tuple:
+    """
+    Pop and validate `fields` and `max_content_length` from the action parameters.
+    """
+    fields = parameters.pop("fields", None)
+    max_content_length = parameters.pop("max_content_length", None)
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+        raise ValueError("fields must be a list of field names")
+    if max_content_length is not None and (
+            isinstance(max_content_length, bool) or not isinstance(max_content_length, int) or max_content_length < 1):
+        raise ValueError("max_content_length must be a positive integer")
+    return fields, max_content_length
+
+
+def accepts_gzip(event) -> bool:
+    """
+    Whether the API Gateway request sent Accept-Encoding: gzip.
+    """
+    headers = event.get("headers") or {}
+    accept_encoding = next((v for k, v in headers.items() if k.lower() == "accept-encoding"), "") or ""
+    return "gzip" in accept_encoding.lower()
+
+
+def http_response(event, status_code: int, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    API Gateway proxy response, gzip-compressed (base64, binary media type)
+    when the client accepts it and the body is big enough to benefit.
+    """
+    body = json.dumps(payload)
+    if accepts_gzip(event) and len(body) >= GZIP_MIN_BYTES:
+        compressed = gzip.compress(body.encode("utf-8"), compresslevel=5)
+        print(f"Compressed response {len(body)} -> {len(compressed)} bytes")
+        return {
+            "statusCode": status_code,
+            "headers": {**headers, "Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+            "body": base64.b64encode(compressed).decode("ascii"),
+            "isBase64Encoded": True
+        }
+    return {
+        "statusCode": status_code,
+        "headers": headers,
+        "body": body
+    }
+
+
 def lambda_handler(event, context):
     """
     AWS Lambda handler function for Tavily operations.
@@ -327,6 +1077,7 @@ def lambda_handler(event, context):
        - POST /tavily/extract con body: {"urls": ["...", "..."]}
        - POST /tavily/crawl con body: {"url": "...", "max_depth": 2, ...}
        - POST /tavily/map con body: {"query": "...", "max_results": 5, ...}
+       - POST /tavily/batch_search con body: {"searches": [{"query": "..."}, ...], "max_concurrency": 5}
     
     2. Por parámetro action (alternativo):
        - POST /tavily/search con body: {"action": "search", "parameters": {...}}
@@ -336,13 +1087,27 @@ def lambda_handler(event, context):
     - extract: Extract clean content from specific URLs
     - crawl: Recursively crawl a website
     - map: Map search results with relationships and context
+    - batch_search: Several searches run concurrently, results in input order
     """
+    # Upstream calls must finish within the Lambda's remaining time
+    started = time.monotonic()
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        invocation["deadline"] = started + context.get_remaining_time_in_millis() / 1000
+    else:
+        invocation["deadline"] = None
+    invocation_type = "cold" if invocation["cold"] else "warm"
+    invocation["cold"] = False
+
     try:
         print("Received event:", json.dumps(event))
         
         # Parse body if from API Gateway
         if 'body' in event:
-            body = json.loads(event['body']) if isinstance(event['body'], str) else event['body']
+            raw = event['body'] or "{}"
+            # With binaryMediaTypes '*/*' (gzip responses) API Gateway base64-encodes request bodies
+            if event.get("isBase64Encoded") and isinstance(raw, str):
+                raw = base64.b64decode(raw).decode("utf-8")
+            body = json.loads(raw) if isinstance(raw, str) else raw
         else:
             body = event
         
@@ -353,7 +1118,10 @@ def lambda_handler(event, context):
         # Método 1: Detectar action desde la ruta HTTP
         if 'path' in event:
             path = event['path']
-            if '/search' in path:
+            if '/batch_search' in path:
+                action = 'batch_search'
+                parameters = body
+            elif '/search' in path:
                 action = 'search'
                 parameters = body  # Todo el body son parámetros
             elif '/extract' in path:
@@ -375,7 +1143,11 @@ def lambda_handler(event, context):
         
         # Validate action
         if not action:
-            raise ValueError("Could not determine action from path or body. Use /tavily/search, /tavily/extract, /tavily/crawl, or /tavily/map")
+            raise ValueError("Could not determine action from path or body. Use /tavily/search, /tavily/extract, /tavily/crawl, /tavily/map or /tavily/batch_search")
+        
+        # Optional response shaping, valid for every action
+        parameters = dict(parameters)
+        fields, max_content_length = parse_shaping_parameters(parameters)
         
         # Route to appropriate function
         if action == "search":
@@ -390,10 +1162,16 @@ def lambda_handler(event, context):
         elif action == "map":
             print(f"Executing map with parameters: {parameters}")
             result = search_map(**parameters)
+        elif action == "batch_search":
+            print(f"Executing batch_search with parameters: {parameters}")
+            result = batch_search(**parameters)
         else:
-            raise ValueError(f"Invalid action: {action}. Must be one of: search, extract, crawl, map")
+            raise ValueError(f"Invalid action: {action}. Must be one of: search, extract, crawl, map, batch_search")
         
         print(f"Function {action} completed with result success: {result.get('success', 'unknown')}")
+        result = shape_result(action, result, fields, max_content_length)
+        latency_ms = (time.monotonic() - started) * 1000
+        print(f"[latency] action={action} invocation={invocation_type} latency_ms={latency_ms:.0f}")
         
         # Prepare response
         response_body = {
@@ -403,16 +1181,12 @@ def lambda_handler(event, context):
         
         # Return based on invocation type
         if 'body' in event:
-            return {
-                "statusCode": 200 if result.get("success") else 500,
-                "headers": {
-                    "Content-Type": "application/json",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "Content-Type",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS"
-                },
-                "body": json.dumps(response_body)
-            }
+            return http_response(event, result_status(result), response_body, {
+                "Content-Type": "application/json",
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "Content-Type",
+                "Access-Control-Allow-Methods": "POST, OPTIONS"
+            })
         else:
             return response_body
             
@@ -0,0 +1,130 @@
+"""
+Benchmark of hedged requests against a slow fake upstream.
+
+Starts a local server that answers like Tavily (/search, /extract) and like the
+Tavily API Gateway (/tavily/search, /tavily/extract). Most requests take
+--fast seconds, but a --slow-rate share of them stall for --slow seconds.
+Runs the same sequence of searches with hedging off and on and prints the
+latency percentiles and the share of hedged calls.
+
+Usage (from backend/lambda_tavily):
+    python hedge_bench.py --target lambda   # handler.search() -> fake Tavily
+    python hedge_bench.py --target client   # web_search.tavily_search() -> fake gateway
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+upstream = {"requests": 0, "fast": 0.1, "slow": 2.0, "slow_rate": 0.05}
+upstream_lock = threading.Lock()
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        with upstream_lock:
+            upstream["requests"] += 1
+        slow = random.random() < upstream["slow_rate"]
+        time.sleep(upstream["slow"] if slow else random.uniform(0.5, 1.5) * upstream["fast"])
+
+        if self.path.endswith("/extract"):
+            data = {"results": [{"url": url, "raw_content": "content"} for url in body.get("urls", [])],
+                    "failed_results": []}
+        else:
+            data = {"query": body.get("query"), "results": [{"url": "https://example.com", "title": "Example",
+                                                             "content": "content", "score": 0.9}]}
+        if self.path.startswith("/tavily/"):
+            data = {"action": self.path.rsplit("/", 1)[1], "result": {"success": True, "data": data}}
+
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def run(search, requests_count, warmup):
+    """
+    Time `requests_count` searches after `warmup` unmeasured ones (which let the
+    p90 tracker learn the latency distribution).
+    """
+    for i in range(warmup):
+        search(f"warmup query {i} {random.random()}")
+    with upstream_lock:
+        upstream["requests"] = 0
+    latencies = []
+    for i in range(requests_count):
+        started = time.monotonic()
+        search(f"benchmark query {i} {random.random()}")
+        latencies.append(time.monotonic() - started)
+    with upstream_lock:
+        extra = upstream["requests"] - requests_count
+    return latencies, extra
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hedged request benchmark with a slow fake upstream")
+    parser.add_argument("--target", choices=["lambda", "client"], default="lambda")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=30)
+    parser.add_argument("--fast", type=float, default=0.1, help="typical upstream latency (s)")
+    parser.add_argument("--slow", type=float, default=2.0, help="latency of a stalled request (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="share of stalled requests")
+    args = parser.parse_args()
+    upstream.update(fast=args.fast, slow=args.slow, slow_rate=args.slow_rate)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeUpstreamHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    os.environ.setdefault("TAVILY_API_KEY", "bench")
+    os.environ["TAVILY_CACHE_ENABLED"] = "false"
+
+    if args.target == "lambda":
+        os.environ["TAVILY_API_URL"] = base_url
+        import handler as module
+
+        def search(query):
+            return module.search(query=query, search_depth="basic")
+
+        def reset(enabled):
+            module.HEDGE_ENABLED = enabled
+            module.latencies.clear()
+            module.hedge_window.clear()
+    else:
+        os.environ["TAVILY_GATEWAY_URL"] = base_url
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agent_core"))
+        from tools import web_search as module
+
+        def search(query):
+            return module.tavily_search(query)
+
+        def reset(enabled):
+            module.HEDGE_ENABLED = enabled
+            module._latencies.clear()
+            module._hedge_window.clear()
+
+    print(f"Target: {args.target}, {args.requests} requests, {args.slow_rate:.0%} stalled for {args.slow}s")
+    for enabled in (False, True):
+        reset(enabled)
+        latencies, extra = run(search, args.requests, args.warmup)
+        print(f"hedging {'on ' if enabled else 'off'}: "
+              f"p50={percentile(latencies, 0.5) * 1000:.0f}ms "
+              f"p90={percentile(latencies, 0.9) * 1000:.0f}ms "
+              f"p99={percentile(latencies, 0.99) * 1000:.0f}ms "
+              f"max={max(latencies) * 1000:.0f}ms "
+              f"extra upstream requests={extra} ({extra / args.requests:.1%})")
+    server.shutdown()
@@ -68,18 +68,43 @@ class TavilySearchClient:
         response.raise_for_status()
         return response.json()
     
+    def batch_search(
+        self,
+        searches: List[Dict[str, Any]],
+        max_concurrency: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Run several searches in one request
+        
+        Args:
+            searches: List of search specs ({"query": ..., plus search parameters}), max 10
+            max_concurrency: Searches run at once by the Lambda
+        
+        Returns:
+            Dict with one result per search, in input order
+        """
+        url = f"{self.base_url}/tavily/batch_search"
+        
+        payload = {"searches": searches}
+        if max_concurrency:
+            payload["max_concurrency"] = max_concurrency
+        
+        response = requests.post(url, headers=self.headers, json=payload)
+        response.raise_for_status()
+        return response.json()
+    
     def extract(self, urls: List[str]) -> Dict[str, Any]:
         """
         Extract content from URLs
         
         Args:
-            urls: List of URLs (maximum 10)
+            urls: List of URLs (maximum 50)
         
         Returns:
             Dict with extracted content
         """
-        if len(urls) > 10:
-            raise ValueError("Maximum 10 URLs allowed")
+        if len(urls) > 50:
+            raise ValueError("Maximum 50 URLs allowed")
         
         url = f"{self.base_url}/tavily/extract"
         payload = {"urls": urls}
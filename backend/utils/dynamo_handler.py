@@ -10,6 +10,25 @@ client = boto3.client("dynamodb")
 USERS_TABLE_NAME = "deep-market-analyzer-users"
 USERNAMES_TABLE_NAME = "deep-market-analyzer-usernames"  
 CHATS_TABLE_NAME = "deep-market-analyzer-chats"
+# User's chats, most recently updated first (the API's history listing)
+CHATS_BY_USER_INDEX = "user_id-updated_at-index"
+MESSAGES_TABLE_NAME = "deep-market-analyzer-messages"
+# Chat's messages by date (the API's latest-N message window)
+MESSAGES_BY_CHAT_INDEX = "chat_id-created_at-index"
+
+
+def _chats_by_user_index(read_capacity, write_capacity) -> Dict[str, Any]:
+    return {
+        "IndexName": CHATS_BY_USER_INDEX,
+        "KeySchema": [
+            {"AttributeName": "user_id", "KeyType": "HASH"},
+            {"AttributeName": "updated_at", "KeyType": "RANGE"},
+        ],
+        # Keys are always projected; the listing also needs these
+        "Projection": {"ProjectionType": "INCLUDE", "NonKeyAttributes": ["chat_name", "created_at"]},
+        "ProvisionedThroughput": {"ReadCapacityUnits": read_capacity, "WriteCapacityUnits": write_capacity},
+    }
+
 
 def create_tables(read_capacity=5, write_capacity=5):
     """Create Users, Usernames (helper), and Chats tables if they don't exist."""
@@ -47,6 +66,7 @@ def create_tables(read_capacity=5, write_capacity=5):
             AttributeDefinitions=[
                 {"AttributeName": "chat_id", "AttributeType": "S"},
                 {"AttributeName": "user_id", "AttributeType": "S"},
+                {"AttributeName": "updated_at", "AttributeType": "S"},
             ],
             BillingMode="PROVISIONED",
             ProvisionedThroughput={"ReadCapacityUnits": read_capacity, "WriteCapacityUnits": write_capacity},
@@ -56,7 +76,8 @@ def create_tables(read_capacity=5, write_capacity=5):
                     "KeySchema": [{"AttributeName": "user_id", "KeyType": "HASH"}],
                     "Projection": {"ProjectionType": "ALL"},
                     "ProvisionedThroughput": {"ReadCapacityUnits": read_capacity, "WriteCapacityUnits": write_capacity},
-                }
+                },
+                _chats_by_user_index(read_capacity, write_capacity),
             ],
         )
     else:
@@ -69,6 +90,85 @@ def create_tables(read_capacity=5, write_capacity=5):
     print("All tables available.")
 
 
+def add_chats_by_user_index(read_capacity=5, write_capacity=5):
+    """
+    Add the user_id-updated_at-index GSI to an existing Chats table and backfill
+    updated_at on chats that lack it (the index is sparse: chats without the
+    sort key would not be listed).
+    """
+    description = client.describe_table(TableName=CHATS_TABLE_NAME)["Table"]
+    indexes = {i["IndexName"] for i in description.get("GlobalSecondaryIndexes", [])}
+    if CHATS_BY_USER_INDEX in indexes:
+        print(f"{CHATS_BY_USER_INDEX} exists")
+    else:
+        print(f"Creating index {CHATS_BY_USER_INDEX}...")
+        client.update_table(
+            TableName=CHATS_TABLE_NAME,
+            AttributeDefinitions=[
+                {"AttributeName": "user_id", "AttributeType": "S"},
+                {"AttributeName": "updated_at", "AttributeType": "S"},
+            ],
+            GlobalSecondaryIndexUpdates=[{"Create": _chats_by_user_index(read_capacity, write_capacity)}],
+        )
+    backfill_chat_updated_at()
+
+
+def add_messages_by_chat_index(read_capacity=5, write_capacity=5):
+    """
+    Add the chat_id-created_at-index GSI to the Messages table (created by the
+    agent's stack). Every message already has created_at, so no backfill is needed.
+    """
+    description = client.describe_table(TableName=MESSAGES_TABLE_NAME)["Table"]
+    indexes = {i["IndexName"] for i in description.get("GlobalSecondaryIndexes", [])}
+    if MESSAGES_BY_CHAT_INDEX in indexes:
+        print(f"{MESSAGES_BY_CHAT_INDEX} exists")
+        return
+    print(f"Creating index {MESSAGES_BY_CHAT_INDEX}...")
+    index = {
+        "IndexName": MESSAGES_BY_CHAT_INDEX,
+        "KeySchema": [
+            {"AttributeName": "chat_id", "KeyType": "HASH"},
+            {"AttributeName": "created_at", "KeyType": "RANGE"},
+        ],
+        "Projection": {"ProjectionType": "ALL"},
+    }
+    # On-demand tables reject a throughput on their indexes
+    if description.get("BillingModeSummary", {}).get("BillingMode") != "PAY_PER_REQUEST":
+        index["ProvisionedThroughput"] = {"ReadCapacityUnits": read_capacity, "WriteCapacityUnits": write_capacity}
+    client.update_table(
+        TableName=MESSAGES_TABLE_NAME,
+        AttributeDefinitions=[
+            {"AttributeName": "chat_id", "AttributeType": "S"},
+            {"AttributeName": "created_at", "AttributeType": "S"},
+        ],
+        GlobalSecondaryIndexUpdates=[{"Create": index}],
+    )
+
+
+def backfill_chat_updated_at() -> int:
+    """Set updated_at = created_at on chats without updated_at. Returns the number updated."""
+    table = dynamodb.Table(CHATS_TABLE_NAME)
+    updated = 0
+    params = {
+        "ProjectionExpression": "chat_id, created_at",
+        "FilterExpression": "attribute_not_exists(updated_at)",
+    }
+    while True:
+        resp = table.scan(**params)
+        for item in resp.get("Items", []):
+            table.update_item(
+                Key={"chat_id": item["chat_id"]},
+                UpdateExpression="SET updated_at = if_not_exists(updated_at, :u)",
+                ExpressionAttributeValues={":u": item.get("created_at") or datetime.datetime.now(datetime.timezone.utc).isoformat()},
+            )
+            updated += 1
+        if "LastEvaluatedKey" not in resp:
+            break
+        params["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    print(f"Backfilled updated_at on {updated} chats")
+    return updated
+
+
 
 # User management 
 def create_user(username: str) -> Dict[str, Any]:
@@ -152,10 +252,12 @@ def get_chat(chat_id: str) -> Optional[Dict[str, Any]]:
 
 def list_chats_for_user(user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
     """
-    Query Chats table using the user_id global secondary index to list chats belonging to a user.
+    Query Chats table using the user_id-updated_at global secondary index to list
+    the most recently updated chats belonging to a user.
     """
     table = dynamodb.Table(CHATS_TABLE_NAME)
-    resp = table.query(IndexName="user_id-index", KeyConditionExpression=boto3.dynamodb.conditions.Key("user_id").eq(user_id), Limit=limit)
+    resp = table.query(IndexName=CHATS_BY_USER_INDEX, KeyConditionExpression=boto3.dynamodb.conditions.Key("user_id").eq(user_id),
+                       ScanIndexForward=False, Limit=limit)
     return resp.get("Items", [])
 
 
@@ -1,7 +1,13 @@
-import boto3
 import json
+import os
+import sys
 from typing import Optional
 
+# Same process-wide, tuned client as the FastAPI Lambda
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda_api"))
+from app.agentcore import get_agentcore_client
+from app.sse import iter_sse_events
+
 async def invoke_agent(prompt: str,
                  session_id: str,
                  user_id: str,
@@ -9,8 +15,8 @@ async def invoke_agent(prompt: str,
                  agent_arn:str = "arn:aws:bedrock-agentcore:us-east-1:444184706474:runtime/deep_market_agent-IpktmbCDc9"):
     
     """Invoke the Bedrock AgentCore agent with the given prompt."""
-    # Initialize the AgentCore client
-    agent_core_client = boto3.client('bedrock-agentcore')
+    # Shared AgentCore client (reuses its connections across invocations)
+    agent_core_client = get_agentcore_client()
     
     # Prepare the payload
     payload = json.dumps({"prompt": prompt,
@@ -29,16 +35,9 @@ async def invoke_agent(prompt: str,
     if "text/event-stream" in response.get("contentType", ""):
         print("Streaming response received")
         #print(response)
-        for line in response["response"].iter_lines(chunk_size=1):
-            if line:
-                line = line.decode("utf-8")
-                if line.startswith("data: "):
-                    line = line[6:]
-                    if isinstance(line, dict):
-                        print("DICT DATA:", line)
-                    else:
-                        print("LINE DATA:", line)
-                        yield json.loads(line)
+        for event in iter_sse_events(response["response"]):
+            print("EVENT DATA:", event.data)
+            yield json.loads(event.data)
     else:
         print("Non-streaming response received")
         try:
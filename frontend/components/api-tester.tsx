@@ -81,7 +81,7 @@ export function ApiTester() {
               <div className="grid grid-cols-2 gap-2">
                 <Button
                   onClick={() => handleTest(
-                    () => chatsService.getChatsByUser(userId),
+                    () => chatsService.getChatsByUser(userId, { limit: 10 }),
                     "Get Chats by User"
                   )}
                   disabled={loading}
@@ -103,7 +103,7 @@ export function ApiTester() {
                   <>
                     <Button
                       onClick={() => handleTest(
-                        () => chatsService.getChatById(chatId),
+                        () => chatsService.getChatById(chatId, true),
                         "Get Chat by ID"
                       )}
                       disabled={loading}
@@ -148,7 +148,7 @@ export function ApiTester() {
               
               <Button
                 onClick={() => handleTest(
-                  () => messagesService.getMessagesByChat(chatId),
+                  () => messagesService.getMessagesByChat(chatId, { limit: 10 }),
                   "Get Messages by Chat"
                 )}
                 disabled={loading || !chatId}
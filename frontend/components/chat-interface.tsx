@@ -16,8 +16,12 @@ import { ImageGallery } from "@/components/image-gallery"
 export function ChatInterface() {
   const {
     chats,
+    hasMoreChats,
+    loadingMoreChats,
     activeChat,
     messages,
+    hasOlderMessages,
+    loadingOlderMessages,
     loading,
     sending,
     error,
@@ -26,6 +30,8 @@ export function ChatInterface() {
     deleteChat,
     updateChatName,
     switchToChat,
+    loadMoreChats,
+    loadOlderMessages,
     clearError,
   } = useChats();
 
@@ -130,10 +136,12 @@ export function ChatInterface() {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   }, []);
 
-  // Scroll to bottom when messages change or when sending
+  // Scroll to bottom when the last message changes or when sending
+  // (not when older messages are prepended above)
+  const lastMessage = messages[messages.length - 1];
   useLayoutEffect(() => {
     scrollToBottom();
-  }, [messages, sending, scrollToBottom]);
+  }, [lastMessage, sending, scrollToBottom]);
 
   // Additional effect to ensure smooth scrolling during streaming
   useEffect(() => {
@@ -364,6 +372,17 @@ export function ChatInterface() {
                   </div>
                 ))
               )}
+              {hasMoreChats && (
+                <Button
+                  variant="ghost"
+                  size="sm"
+                  className="w-full mt-1 text-xs text-muted-foreground"
+                  onClick={loadMoreChats}
+                  disabled={loadingMoreChats}
+                >
+                  {loadingMoreChats ? 'Loading...' : 'Load more chats'}
+                </Button>
+              )}
             </div>
           </ScrollArea>
         </div>
@@ -396,6 +415,19 @@ export function ChatInterface() {
         <div className="flex-1 min-h-0 overflow-y-auto">
           <div className="p-4 md:p-6">
             <div className="max-w-3xl mx-auto space-y-6">
+              {hasOlderMessages && (
+                <div className="flex justify-center">
+                  <Button
+                    variant="ghost"
+                    size="sm"
+                    className="text-xs text-muted-foreground"
+                    onClick={loadOlderMessages}
+                    disabled={loadingOlderMessages}
+                  >
+                    {loadingOlderMessages ? 'Loading...' : 'Load earlier messages'}
+                  </Button>
+                </div>
+              )}
               {messages.length === 0 && !loading ? (
                 <div className="text-center text-muted-foreground py-8">
                   <TrendingUp className="w-12 h-12 mx-auto mb-4 opacity-50" />
@@ -18,7 +18,10 @@ interface ChatWithContent {
 
 export function HistoryView() {
   const [loading, setLoading] = useState(false)
-  const [chatsWithContent, setChatsWithContent] = useState<ChatWithContent[]>([])
+  const [chats, setChats] = useState<Chat[]>([])
+  const [chatsCursor, setChatsCursor] = useState<string | null>(null)
+  const [docsByChat, setDocsByChat] = useState<Record<string, Document[]>>({})
+  const [imagesByChat, setImagesByChat] = useState<Record<string, Image[]>>({})
   const [query, setQuery] = useState("")
   const [documentsToShow, setDocumentsToShow] = useState<Record<string, number>>({})
   const [imagesToShow, setImagesToShow] = useState<Record<string, number>>({})
@@ -30,8 +33,8 @@ export function HistoryView() {
       try {
         setLoading(true)
 
-        // Fetch all chats for the default user
-        const chats = await chatsService.getChatsByUser(defaultUser)
+        // Fetch the first page of chats for the default user (most recently updated first)
+        const page = await chatsService.getChatsByUser(defaultUser)
 
         // Try to fetch documents for the default user
         let docs: Document[] = []
@@ -52,45 +55,34 @@ export function HistoryView() {
         }
 
         // Group documents by chat_id
-        const docsByChat: Record<string, Document[]> = {}
+        const docsGrouped: Record<string, Document[]> = {}
         docs.forEach((d) => {
           const key = d.chat_id || "unassigned"
-          if (!docsByChat[key]) docsByChat[key] = []
-          docsByChat[key].push(d)
+          if (!docsGrouped[key]) docsGrouped[key] = []
+          docsGrouped[key].push(d)
         })
 
         // Group images by chat_id and sort by creation date
-        const imagesByChat: Record<string, Image[]> = {}
+        const imagesGrouped: Record<string, Image[]> = {}
         images.forEach((img) => {
           const key = img.chat_id || "unassigned"
-          if (!imagesByChat[key]) imagesByChat[key] = []
-          imagesByChat[key].push(img)
+          if (!imagesGrouped[key]) imagesGrouped[key] = []
+          imagesGrouped[key].push(img)
         })
         
         // Sort images in each chat by creation date (newest first)
-        Object.keys(imagesByChat).forEach(chatId => {
-          imagesByChat[chatId].sort((a, b) => {
+        Object.keys(imagesGrouped).forEach(chatId => {
+          imagesGrouped[chatId].sort((a, b) => {
             const dateA = a.created_at ? new Date(a.created_at).getTime() : 0
             const dateB = b.created_at ? new Date(b.created_at).getTime() : 0
             return dateB - dateA // Newest first
           })
         })
 
-        // Compose chat entries and include documents and images (if any)
-        const entries: ChatWithContent[] = chats.map((c) => ({ 
-          chat: c, 
-          documents: docsByChat[c.chat_id] || [],
-          images: imagesByChat[c.chat_id] || []
-        }))
-
-        // Sort by created_at descending (newest first)
-        entries.sort((a, b) => {
-          const ta = a.chat.created_at ? new Date(a.chat.created_at).getTime() : 0
-          const tb = b.chat.created_at ? new Date(b.chat.created_at).getTime() : 0
-          return tb - ta
-        })
-
-        setChatsWithContent(entries)
+        setDocsByChat(docsGrouped)
+        setImagesByChat(imagesGrouped)
+        setChats(page.items)
+        setChatsCursor(page.next_cursor)
       } catch (err) {
         console.error("Error loading history:", err)
       } finally {
@@ -101,6 +93,27 @@ export function HistoryView() {
     load()
   }, [defaultUser])
 
+  const loadMore = async () => {
+    if (!chatsCursor || loading) return
+    try {
+      setLoading(true)
+      const page = await chatsService.getChatsByUser(defaultUser, { cursor: chatsCursor })
+      setChats(prev => [...prev, ...page.items.filter(c => !prev.some(p => p.chat_id === c.chat_id))])
+      setChatsCursor(page.next_cursor)
+    } catch (err) {
+      console.error("Error loading history:", err)
+    } finally {
+      setLoading(false)
+    }
+  }
+
+  // Compose chat entries (in API order) and include documents and images (if any)
+  const chatsWithContent = useMemo<ChatWithContent[]>(() => chats.map((c) => ({
+    chat: c,
+    documents: docsByChat[c.chat_id] || [],
+    images: imagesByChat[c.chat_id] || []
+  })), [chats, docsByChat, imagesByChat])
+
   const filtered = useMemo(() => {
     if (!query) return chatsWithContent
     const q = query.toLowerCase()
@@ -317,8 +330,9 @@ export function HistoryView() {
                                     onClick={() => window.open(img.image_presigned_url, '_blank')}
                                   >
                                     <img
-                                      src={img.image_presigned_url}
+                                      src={img.thumbnail_presigned_url || img.image_presigned_url}
                                       alt={img.description}
+                                      loading="lazy"
                                       className="w-full h-24 object-cover group-hover:opacity-90 transition-opacity"
                                       onError={(e) => {
                                         const target = e.target as HTMLImageElement;
@@ -392,6 +406,13 @@ export function HistoryView() {
                 </Card>
               ))
             )}
+            {chatsCursor && (
+              <div className="flex justify-center">
+                <Button variant="outline" size="sm" className="bg-background hover:bg-accent border-border" onClick={loadMore} disabled={loading}>
+                  {loading ? 'Loading...' : 'Load more'}
+                </Button>
+              </div>
+            )}
           </div>
         </div>
       </ScrollArea>
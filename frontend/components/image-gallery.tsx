@@ -54,8 +54,9 @@ export function ImageGallery({ images }: ImageGalleryProps) {
             <CardContent className="p-0">
               <div className="relative group">
                 <img
-                  src={image.presigned_url}
+                  src={image.thumbnail_url || image.presigned_url}
                   alt={image.description}
+                  loading="lazy"
                   className="w-full h-32 object-cover cursor-pointer"
                   onClick={() => handleImageClick(image)}
                   onError={(e) => {
@@ -105,7 +106,7 @@ export function ImageGallery({ images }: ImageGalleryProps) {
           {selectedImage && (
             <div className="space-y-4">
               <img
-                src={selectedImage.presigned_url}
+                src={selectedImage.medium_url || selectedImage.presigned_url}
                 alt={selectedImage.description}
                 className="w-full h-auto max-h-[60vh] object-contain rounded-lg"
               />
@@ -18,8 +18,12 @@ import { useStreaming } from './use-streaming';
 
 export const useChats = () => {
   const [chats, setChats] = useState<UIChat[]>([]);
+  const [chatsCursor, setChatsCursor] = useState<string | null>(null);
+  const [loadingMoreChats, setLoadingMoreChats] = useState(false);
   const [activeChat, setActiveChat] = useState<string | null>(null);
   const [messages, setMessages] = useState<UIMessage[]>([]);
+  const [messagesCursor, setMessagesCursor] = useState<string | null>(null);
+  const [loadingOlderMessages, setLoadingOlderMessages] = useState(false);
   const [loading, setLoading] = useState(false);
   const [sending, setSending] = useState(false);
   const [error, setError] = useState<string | null>(null);
@@ -35,25 +39,18 @@ export const useChats = () => {
   }, []);
 
   /**
-   * Load all user chats
+   * Load the first page of user chats (the API returns them most recently updated first)
    */
   const loadChats = useCallback(async () => {
     try {
       setLoading(true);
       setError(null);
       
-      const apiChats = await chatsService.getChatsByUser(userId);
-      
-      // Sort chats by creation date (newest first)
-      const sortedChats = apiChats.sort((a, b) => {
-        const dateA = new Date(a.created_at || '').getTime();
-        const dateB = new Date(b.created_at || '').getTime();
-        return dateB - dateA; // Newest first
-      });
-      
-      const uiChats = sortedChats.map(apiChatToUIChat);
+      const page = await chatsService.getChatsByUser(userId);
+      const uiChats = page.items.map(apiChatToUIChat);
       
       setChats(uiChats);
+      setChatsCursor(page.next_cursor);
       
       // If there's no active chat and chats are available, select the first one
       if (!activeChat && uiChats.length > 0) {
@@ -68,24 +65,42 @@ export const useChats = () => {
   }, [userId, activeChat]);
 
   /**
-   * Load messages from a specific chat
+   * Append the next page of user chats
+   */
+  const loadMoreChats = useCallback(async () => {
+    if (!chatsCursor || loadingMoreChats) return;
+    try {
+      setLoadingMoreChats(true);
+      setError(null);
+
+      const page = await chatsService.getChatsByUser(userId, { cursor: chatsCursor });
+      const uiChats = page.items.map(apiChatToUIChat);
+
+      // A chat updated since the first page may show up again further down
+      setChats(prev => [...prev, ...uiChats.filter(chat => !prev.some(p => p.id === chat.id))]);
+      setChatsCursor(page.next_cursor);
+    } catch (err: any) {
+      setError(err.message || 'Error loading chats');
+      console.error('Error loading chats:', err);
+    } finally {
+      setLoadingMoreChats(false);
+    }
+  }, [userId, chatsCursor, loadingMoreChats]);
+
+  /**
+   * Load the latest messages of a specific chat (the API returns them in chronological order)
    */
   const loadMessages = useCallback(async (chatId: string) => {
     try {
       setLoading(true);
       setError(null);
 
-      const apiMessages = await messagesService.getMessagesByChat(chatId);
-      
-      // Sort by creation date
-      const sortedMessages = apiMessages.sort((a, b) => 
-        new Date(a.created_at).getTime() - new Date(b.created_at).getTime()
-      );
-      
-      const uiMessages = sortedMessages.map(apiMessageToUIMessage);
+      const page = await messagesService.getMessagesByChat(chatId);
+      const uiMessages = page.items.map(apiMessageToUIMessage);
       
       // Replace ALL messages
       setMessages(uiMessages);
+      setMessagesCursor(page.next_cursor);
     } catch (err: any) {
       setError(err.message || 'Error loading messages');
       console.error('❌ Error loading messages:', err);
@@ -94,6 +109,28 @@ export const useChats = () => {
     }
   }, []);
 
+  /**
+   * Prepend the page of messages before the oldest loaded one
+   */
+  const loadOlderMessages = useCallback(async () => {
+    if (!activeChat || !messagesCursor || loadingOlderMessages) return;
+    try {
+      setLoadingOlderMessages(true);
+      setError(null);
+
+      const page = await messagesService.getMessagesByChat(activeChat, { cursor: messagesCursor });
+      const uiMessages = page.items.map(apiMessageToUIMessage);
+
+      setMessages(prev => [...uiMessages, ...prev]);
+      setMessagesCursor(page.next_cursor);
+    } catch (err: any) {
+      setError(err.message || 'Error loading messages');
+      console.error('❌ Error loading messages:', err);
+    } finally {
+      setLoadingOlderMessages(false);
+    }
+  }, [activeChat, messagesCursor, loadingOlderMessages]);
+
   /**
    * Create a new chat
    */
@@ -110,6 +147,7 @@ export const useChats = () => {
       setChats(prev => [uiChat, ...prev]);
       setActiveChat(newChat.chat_id);
       setMessages([]);
+      setMessagesCursor(null);
       
       return newChat.chat_id;
     } catch (err: any) {
@@ -303,6 +341,7 @@ export const useChats = () => {
         } else {
           setActiveChat(null);
           setMessages([]);
+          setMessagesCursor(null);
         }
       }
     } catch (err: any) {
@@ -337,8 +376,12 @@ export const useChats = () => {
   return {
     // State
     chats,
+    hasMoreChats: chatsCursor !== null,
+    loadingMoreChats,
     activeChat,
     messages,
+    hasOlderMessages: messagesCursor !== null,
+    loadingOlderMessages,
     loading,
     sending,
     error,
@@ -350,6 +393,8 @@ export const useChats = () => {
     updateChatName,
     switchToChat,
     refreshChats: loadChats,
+    loadMoreChats,
+    loadOlderMessages,
     clearError: () => setError(null),
   };
 };
\ No newline at end of file
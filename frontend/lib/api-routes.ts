@@ -43,6 +43,7 @@ export const API_ROUTES = {
     BASE: '/api/v1/agent',
     MESSAGE_WITH_BOT: '/api/v1/agent/message_with_bot',
     MESSAGE_WITH_BOT_STREAM: '/api/v1/agent/message_with_bot_stream',
+    MESSAGE_WITH_BOT_STREAM_RESUME: '/api/v1/agent/message_with_bot_stream/resume',
   },
 
   // User routes
@@ -28,6 +28,7 @@ export interface StreamingMessage {
   content?: string;
   chat_id?: string;
   user_id?: string;
+  turn_id?: string; // Agent turn this stream belongs to (event ids are <turn_id>:<seq>)
   message?: string;
   // Document fields
   document?: {
@@ -58,6 +59,129 @@ export interface StreamingCallbacks {
   onUnknownEvent?: (data: StreamingMessage) => void;
 }
 
+// Delays before each attempt to resume a dropped stream with Last-Event-ID
+const STREAM_RESUME_DELAYS_MS = [1000, 2000, 4000];
+
+interface StreamState {
+  lastEventId?: string;
+}
+
+/**
+ * Dispatch one streaming event to the callbacks. Returns true when it ends the turn (done/error)
+ */
+const handleStreamEvent = (data: StreamingMessage, callbacks: StreamingCallbacks): boolean => {
+  switch (data.type) {
+    case 'metadata':
+      console.log('📋 Metadata event:', JSON.stringify(data, null, 2));
+      if (callbacks.onMetadata && data.chat_id && data.user_id) {
+        callbacks.onMetadata({ chat_id: data.chat_id, user_id: data.user_id });
+      }
+      return false;
+    case 'text':
+      if (callbacks.onText && data.content) {
+        // Use requestIdleCallback for better performance, fallback to setTimeout
+        if (window.requestIdleCallback) {
+          window.requestIdleCallback(() => {
+            callbacks.onText!(data.content!);
+          });
+        } else {
+          setTimeout(() => {
+            callbacks.onText!(data.content!);
+          }, 0);
+        }
+      }
+      return false;
+    case 'done':
+      console.log('✅ Done event:', JSON.stringify(data, null, 2));
+      if (callbacks.onDone && data.chat_id) {
+        callbacks.onDone({ chat_id: data.chat_id });
+      }
+      return true; // End the stream
+    case 'error':
+      console.error('❌ Error event:', JSON.stringify(data, null, 2));
+      if (callbacks.onError && data.message) {
+        callbacks.onError(data.message);
+      }
+      return true; // End the stream on error
+    case 'document':
+      console.log('📎 Document event:', JSON.stringify(data, null, 2));
+      if (callbacks.onDocument) {
+        callbacks.onDocument(data);
+      }
+      return false;
+    case 'images':
+      console.log('🖼️ Images event:', JSON.stringify(data, null, 2));
+      if (callbacks.onImages) {
+        callbacks.onImages(data);
+      }
+      return false;
+    default:
+      console.log('❓ Unknown event type:', JSON.stringify(data, null, 2));
+      if (callbacks.onUnknownEvent) {
+        callbacks.onUnknownEvent(data);
+      }
+      return false;
+  }
+};
+
+/**
+ * Read SSE frames from a response body, tracking the id of the last event handled.
+ * Returns true if the turn ended (done/error), false if the body ended before that
+ */
+const readStream = async (
+  body: ReadableStream<Uint8Array>,
+  callbacks: StreamingCallbacks,
+  state: StreamState
+): Promise<boolean> => {
+  const reader = body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let eventId: string | undefined;
+
+  try {
+    while (true) {
+      const { done, value } = await reader.read();
+
+      if (done) {
+        return false;
+      }
+
+      buffer += decoder.decode(value, { stream: true });
+
+      // Process complete lines
+      const lines = buffer.split('\n');
+      buffer = lines.pop() || ''; // Keep incomplete line in buffer
+
+      for (const line of lines) {
+        if (line.startsWith('id: ')) {
+          eventId = line.slice(4).trim();
+        } else if (line.trim() && line.startsWith('data: ')) {
+          let finished = false;
+          try {
+            const jsonStr = line.slice(6).trim(); // Remove 'data: ' prefix
+            if (jsonStr && jsonStr !== '') {
+              const data: StreamingMessage = JSON.parse(jsonStr);
+              finished = handleStreamEvent(data, callbacks);
+            }
+          } catch (parseError) {
+            console.warn('⚠️ Failed to parse SSE message:', line, parseError);
+          }
+          // Only once the event was handled: a resume continues right after it
+          if (eventId) {
+            state.lastEventId = eventId;
+            eventId = undefined;
+          }
+          if (finished) {
+            return true;
+          }
+        }
+      }
+    }
+  } finally {
+    reader.releaseLock();
+  }
+};
+
 export const chatAgentService = {
   /**
    * Send a message to the chatbot/agent using the /api/v1/agent/message_with_bot endpoint
@@ -109,8 +233,9 @@ export const chatAgentService = {
 
 
 
+    const state: StreamState = {};
     try {
-      const response = await fetch(`${API_CONFIG.BASE_URL}${API_ROUTES.AGENT.MESSAGE_WITH_BOT_STREAM}`, {
+      let response: Response | null = await fetch(`${API_CONFIG.BASE_URL}${API_ROUTES.AGENT.MESSAGE_WITH_BOT_STREAM}`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -119,101 +244,55 @@ export const chatAgentService = {
         body: JSON.stringify(payload),
       });
 
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
-
-      if (!response.body) {
-        throw new Error('No response body');
-      }
-
-      const reader = response.body.getReader();
-      const decoder = new TextDecoder();
-      let buffer = '';
-
-      try {
-        while (true) {
-          const { done, value } = await reader.read();
-          
-          if (done) {
-            break;
+      let attempt = 0;
+      while (true) {
+        let interruption: unknown = null;
+        if (response) {
+          if (!response.ok && !(attempt > 0 && response.status >= 500)) {
+            throw new Error(`HTTP error! status: ${response.status}`);
           }
-
-          const chunk = decoder.decode(value, { stream: true });
-          buffer += chunk;
-          
-          // Process complete lines
-          const lines = buffer.split('\n');
-          buffer = lines.pop() || ''; // Keep incomplete line in buffer
-
-          for (const line of lines) {
-            if (line.trim() && line.startsWith('data: ')) {
-              try {
-                const jsonStr = line.slice(6).trim(); // Remove 'data: ' prefix
-                if (jsonStr && jsonStr !== '') {
-                  const data: StreamingMessage = JSON.parse(jsonStr);
-                  
-                  switch (data.type) {
-                    case 'metadata':
-                      console.log('📋 Metadata event:', JSON.stringify(data, null, 2));
-                      if (callbacks.onMetadata && data.chat_id && data.user_id) {
-                        callbacks.onMetadata({ chat_id: data.chat_id, user_id: data.user_id });
-                      }
-                      break;
-                    case 'text':
-                      if (callbacks.onText && data.content) {
-                        // Use requestIdleCallback for better performance, fallback to setTimeout
-                        if (window.requestIdleCallback) {
-                          window.requestIdleCallback(() => {
-                            callbacks.onText!(data.content!);
-                          });
-                        } else {
-                          setTimeout(() => {
-                            callbacks.onText!(data.content!);
-                          }, 0);
-                        }
-                      }
-                      break;
-                    case 'done':
-                      console.log('✅ Done event:', JSON.stringify(data, null, 2));
-                      if (callbacks.onDone && data.chat_id) {
-                        callbacks.onDone({ chat_id: data.chat_id });
-                      }
-                      return; // End the stream
-                    case 'error':
-                      console.error('❌ Error event:', JSON.stringify(data, null, 2));
-                      if (callbacks.onError && data.message) {
-                        callbacks.onError(data.message);
-                      }
-                      return; // End the stream on error
-                    case 'document':
-                      console.log('📎 Document event:', JSON.stringify(data, null, 2));
-                      if (callbacks.onDocument) {
-                        callbacks.onDocument(data);
-                      }
-                      break;
-                    case 'images':
-                      console.log('🖼️ Images event:', JSON.stringify(data, null, 2));
-                      if (callbacks.onImages) {
-                        callbacks.onImages(data);
-                      }
-                      break;
-                    default:
-                      console.log('❓ Unknown event type:', JSON.stringify(data, null, 2));
-                      if (callbacks.onUnknownEvent) {
-                        callbacks.onUnknownEvent(data);
-                      }
-                      break;
-                  }
-                }
-              } catch (parseError) {
-                console.warn('⚠️ Failed to parse SSE message:', line, parseError);
+          if (response.ok) {
+            if (!response.body) {
+              throw new Error('No response body');
+            }
+            const seenEventId = state.lastEventId;
+            try {
+              if (await readStream(response.body, callbacks, state)) {
+                return;
               }
+            } catch (streamError) {
+              console.warn('⚠️ Stream interrupted:', streamError);
+              interruption = streamError;
+            }
+            if (state.lastEventId !== seenEventId) {
+              attempt = 0; // The connection made progress: start the backoff over
             }
           }
         }
-      } finally {
-        reader.releaseLock();
+
+        // The connection dropped before done/error: resume the turn from the last event received
+        if (!state.lastEventId) {
+          // Nothing to resume from (no event received, or a backend without event ids)
+          if (interruption) {
+            throw interruption;
+          }
+          return;
+        }
+        if (attempt >= STREAM_RESUME_DELAYS_MS.length) {
+          throw new Error('The stream was interrupted and could not be resumed');
+        }
+        await new Promise((resolve) => setTimeout(resolve, STREAM_RESUME_DELAYS_MS[attempt++]));
+        console.log(`🔄 Resuming stream after event ${state.lastEventId} (attempt ${attempt})`);
+        response = await fetch(`${API_CONFIG.BASE_URL}${API_ROUTES.AGENT.MESSAGE_WITH_BOT_STREAM_RESUME}`, {
+          method: 'GET',
+          headers: {
+            'Accept': 'text/event-stream',
+            'Last-Event-ID': state.lastEventId,
+          },
+        }).catch((resumeError) => {
+          console.warn('⚠️ Resume request failed:', resumeError);
+          return null;
+        });
       }
     } catch (error) {
       if (callbacks.onError) {
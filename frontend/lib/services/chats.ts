@@ -1,21 +1,25 @@
-import { Chat } from '@/lib/types';
+import { Chat, ChatPage, PageParams } from '@/lib/types';
 import { apiClient } from '@/lib/api-client';
 import { API_ROUTES } from '@/lib/api-routes';
 
 export const chatsService = {
   /**
-   * Get all chats from a user
+   * Get a page of a user's chats, most recently updated first
    */
-  getChatsByUser: async (userId: string): Promise<Chat[]> => {
-    const response = await apiClient.get<Chat[]>(API_ROUTES.CHATS.GET_BY_USER(userId));
+  getChatsByUser: async (userId: string, { limit, cursor }: PageParams = {}): Promise<ChatPage> => {
+    const response = await apiClient.get<ChatPage>(API_ROUTES.CHATS.GET_BY_USER(userId), {
+      params: { limit, cursor: cursor || undefined }
+    });
     return response.data;
   },
 
   /**
-   * Get a specific chat by ID (includes messages)
+   * Get a specific chat by ID (with its latest messages if includeMessages)
    */
-  getChatById: async (chatId: string): Promise<Chat> => {
-    const response = await apiClient.get<Chat>(API_ROUTES.CHATS.GET_BY_ID(chatId));
+  getChatById: async (chatId: string, includeMessages = false): Promise<Chat> => {
+    const response = await apiClient.get<Chat>(API_ROUTES.CHATS.GET_BY_ID(chatId), {
+      params: { include_messages: includeMessages }
+    });
     return response.data;
   },
 
@@ -1,13 +1,15 @@
-import { ChatMessage } from '@/lib/types';
+import { ChatMessage, MessagePage, PageParams } from '@/lib/types';
 import { apiClient } from '@/lib/api-client';
 import { API_ROUTES } from '@/lib/api-routes';
 
 export const messagesService = {
   /**
-   * Get all messages from a chat
+   * Get the latest messages of a chat, or the ones before `cursor` (chronological order)
    */
-  getMessagesByChat: async (chatId: string): Promise<ChatMessage[]> => {
-    const response = await apiClient.get<ChatMessage[]>(API_ROUTES.MESSAGES.GET_BY_CHAT(chatId));
+  getMessagesByChat: async (chatId: string, { limit, cursor }: PageParams = {}): Promise<MessagePage> => {
+    const response = await apiClient.get<MessagePage>(API_ROUTES.MESSAGES.GET_BY_CHAT(chatId), {
+      params: { limit, cursor: cursor || undefined }
+    });
     return response.data;
   },
 
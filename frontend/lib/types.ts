@@ -14,6 +14,23 @@ export interface Chat {
   messages?: ChatMessage[];
   created_at?: string;
   updated_at?: string;
+  messages_next_cursor?: string | null; // With include_messages: cursor of the earlier messages
+}
+
+// One page of a cursor-paginated listing; pass next_cursor back to get the next page
+export interface Page<T> {
+  items: T[];
+  next_cursor: string | null;
+}
+
+export type ChatPage = Page<Chat>;
+
+// Messages in chronological order; next_cursor fetches the earlier ones
+export type MessagePage = Page<ChatMessage>;
+
+export interface PageParams {
+  limit?: number;
+  cursor?: string | null;
 }
 
 export interface User {
@@ -44,6 +61,8 @@ export interface Image {
   s3_bucket: string;
   s3_key: string;
   image_presigned_url: string; // Campo correcto del backend
+  thumbnail_presigned_url?: string; // WebP ~256px for grids
+  medium_presigned_url?: string; // WebP ~768px for previews
   created_at?: string;
   updated_at?: string;
 }
@@ -84,6 +103,9 @@ export interface GeneratedImage {
   s3_bucket: string;
   s3_key: string;
   presigned_url: string; // Para el streaming mantiene este nombre
+  thumbnail_url?: string; // WebP ~256px for grids
+  medium_url?: string; // WebP ~768px for previews
+  tier?: 'draft' | 'final';
 }
 
 // Types for the local UI